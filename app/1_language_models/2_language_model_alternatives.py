@@ -1,14 +1,13 @@
 """
 Alternative Models
 
-Here, we try to use various alternative models to answer questions
+Here, we try to use various alternative models to answer questions.
+Models are created by "provider:model" name, and each provider's package is
+only imported when its first model is created.
 """
 
-from langchain_google_genai import ChatGoogleGenerativeAI
-from langchain_anthropic import ChatAnthropic
-from langchain_fireworks import ChatFireworks
-from langchain_openai import ChatOpenAI
 from dotenv import load_dotenv
+from app.utils.models import create_chat_model
 
 # Setup environment variables and messages
 load_dotenv()
@@ -19,7 +18,7 @@ messages = "What is capital city of France?"
 # ---- OpenAI Chat Model Example ----
 
 # Create a ChatOpenAI model
-model = ChatOpenAI(model="gpt-4o")
+model = create_chat_model("openai:gpt-4o")
 
 # Invoke the model with messages
 result = model.invoke(messages)
@@ -30,7 +29,7 @@ print(f"Answer from OpenAI: {result.content}")
 
 # Create a Anthropic model
 # Anthropic models: https://docs.anthropic.com/en/docs/models-overview
-model = ChatAnthropic(model="claude-3-opus-20240229")
+model = create_chat_model("anthropic:claude-3-opus-20240229")
 
 result = model.invoke(messages)
 print(f"Answer from Anthropic: {result.content}")
@@ -40,14 +39,14 @@ print(f"Answer from Anthropic: {result.content}")
 
 # https://console.cloud.google.com/gen-app-builder/engines
 # https://ai.google.dev/gemini-api/docs/models/gemini
-model = ChatGoogleGenerativeAI(model="gemini-1.5-flash")
+model = create_chat_model("google:gemini-1.5-flash")
 
 result = model.invoke(messages)
 print(f"Answer from Google: {result.content}")
 
 
 # ---- Fireworks with LLAMA Chat Model Example ----
-model = ChatFireworks(model="accounts/fireworks/models/llama-v3p1-70b-instruct")
+model = create_chat_model("fireworks:accounts/fireworks/models/llama-v3p1-70b-instruct")
 
 result = model.invoke(messages)
 print(f"Answer from LLaMA: {result.content}")
\ No newline at end of file
@@ -7,9 +7,6 @@ from langchain_openai import ChatOpenAI
 # Load environment variables from .env
 load_dotenv()
 
-# Create a ChatOpenAI model
-model = ChatOpenAI(model="gpt-3.5-turbo")
-
 # Define pros analysis step
 def analyze_sentiment(feedback):
     pros_template = ChatPromptTemplate.from_messages(
@@ -43,23 +40,36 @@ def combine(sentiment, product):
     return {"sentiment": sentiment, "product": product}
 
 
-# Simplify branches with LCEL
-sentiment_branch_chain = (
-    RunnableLambda(lambda x: analyze_sentiment(x)) | model | StrOutputParser()
-)
+def create_feedback_chain(model):
+    """
+    Build the chain classifying the sentiment and extracting the product of a feedback, in parallel.
+
+    The branches are named `sentiment` and `product`, so their runs can be told apart in callbacks.
+    """
+    # Simplify branches with LCEL
+    sentiment_branch_chain = (
+        RunnableLambda(lambda x: analyze_sentiment(x)) | model | StrOutputParser()
+    ).with_config(run_name="sentiment")
+
+    product_branch_chain = (
+        RunnableLambda(lambda x: analyze_product_name(x)) | model | StrOutputParser()
+    ).with_config(run_name="product")
+
+    # Create the combined chain using LangChain Expression Language (LCEL)
+    return (
+        RunnableParallel(branches={"sentiment": sentiment_branch_chain, "product": product_branch_chain})
+        | RunnableLambda(lambda x: combine(x["branches"]["sentiment"], x["branches"]["product"]))
+    )
+
 
-product_branch_chain = (
-    RunnableLambda(lambda x: analyze_product_name(x)) | model | StrOutputParser()
-)
+if __name__ == "__main__":
+    # Create a ChatOpenAI model
+    model = ChatOpenAI(model="gpt-3.5-turbo")
 
-# Create the combined chain using LangChain Expression Language (LCEL)
-chain = (
-    RunnableParallel(branches={"sentiment": sentiment_branch_chain, "product": product_branch_chain})
-    | RunnableLambda(lambda x: combine(x["branches"]["sentiment"], x["branches"]["product"]))
-)
+    chain = create_feedback_chain(model)
 
-# Run the chain
-result = chain.invoke("laptop is bad!")
+    # Run the chain
+    result = chain.invoke("laptop is bad!")
 
-# Output
-print(result)
+    # Output
+    print(result)
@@ -2,14 +2,12 @@ from dotenv import load_dotenv
 from langchain.prompts import ChatPromptTemplate
 from langchain.schema.output_parser import StrOutputParser
 from langchain.schema.runnable import RunnableBranch
-from langchain_openai import ChatOpenAI
+from langchain_openai import ChatOpenAI, OpenAIEmbeddings
+from app.utils.routing import CentroidClassifier, FastPathRouter, KeywordClassifier
 
 # Load environment variables from .env
 load_dotenv()
 
-# Create a ChatOpenAI model
-model = ChatOpenAI(model="gpt-4o")
-
 # Define prompt templates for different feedback types
 positive_feedback_template = ChatPromptTemplate.from_messages(
     [
@@ -56,37 +54,84 @@ classification_template = ChatPromptTemplate.from_messages(
     ]
 )
 
-# Define the runnable branches for handling feedback
-branches = RunnableBranch(
-    (
-        lambda x: "positive" in x,
-        positive_feedback_template | model | StrOutputParser()  # Positive feedback chain
-    ),
-    (
-        lambda x: "negative" in x,
-        negative_feedback_template | model | StrOutputParser()  # Negative feedback chain
-    ),
-    (
-        lambda x: "neutral" in x,
-        neutral_feedback_template | model | StrOutputParser()  # Neutral feedback chain
-    ),
-    escalate_feedback_template | model | StrOutputParser()
-)
+def create_feedback_router(classification_model, embeddings):
+    """
+    Build the router labelling a feedback positive, negative, neutral or escalate.
+
+    Cheap local classifiers go first: keyword rules, then similarity to a few labelled examples.
+    The model classification only runs when neither is confident, and decisions are cached per input.
+    """
+    # Create the classification chain
+    classification_chain = classification_template | classification_model | StrOutputParser()
+
+    return FastPathRouter(
+        labels=["positive", "negative", "neutral", "escalate"],
+        llm_classifier=classification_chain,
+        classifiers=[
+            KeywordClassifier({
+                "positive": ["excellent", "great", "love", "loved", "enjoyed", "helpful", "amazing", "perfect"],
+                "negative": ["terrible", "broke", "broken", "poor", "awful", "worst", "disappointed", "useless"],
+                "neutral": ["okay", "ok", "fine", "average", "as expected", "nothing exceptional", "decent"],
+                "escalate": ["refund", "lawyer", "manager", "cancel", "complaint", "human"],
+            }),
+            CentroidClassifier(embeddings, {
+                "positive": ["The product is excellent. I really enjoyed using it and found it very helpful.",
+                             "Great quality, works perfectly, I would buy it again."],
+                "negative": ["The product is terrible. It broke after just one use and the quality is very poor.",
+                             "Very disappointed, it stopped working and support did not help."],
+                "neutral": ["The product is okay. It works as expected but nothing exceptional.",
+                            "It is fine for the price, neither good nor bad."],
+                "escalate": ["I'm not sure about the product yet. Can you tell me more about its features and benefits?",
+                             "I want to talk to someone about my order, please contact me."],
+            }),
+        ],
+        min_confidence=0.7,
+    )
+
+
+def create_branched_chain(model, router):
+    """
+    Build the chain routing a feedback with `router`, then answering it with the chain of its label.
+    """
+    # Define the runnable branches for handling feedback, on the label chosen by the router
+    branches = RunnableBranch(
+        (
+            lambda x: x["label"] == "positive",
+            positive_feedback_template | model | StrOutputParser()  # Positive feedback chain
+        ),
+        (
+            lambda x: x["label"] == "negative",
+            negative_feedback_template | model | StrOutputParser()  # Negative feedback chain
+        ),
+        (
+            lambda x: x["label"] == "neutral",
+            neutral_feedback_template | model | StrOutputParser()  # Neutral feedback chain
+        ),
+        escalate_feedback_template | model | StrOutputParser()
+    )
+
+    # Combine routing and response generation into one chain
+    return router.as_runnable(input_key="feedback") | branches
+
+
+if __name__ == "__main__":
+    # Create a ChatOpenAI model
+    model = ChatOpenAI(model="gpt-4o")
 
-# Create the classification chain
-classification_chain = classification_template | model | StrOutputParser()
+    router = create_feedback_router(model, OpenAIEmbeddings(model="text-embedding-3-small"))
+    chain = create_branched_chain(model, router)
 
-# Combine classification and response generation into one chain
-chain = classification_chain | branches
+    # Run the chain with an example review
+    # Good review - "The product is excellent. I really enjoyed using it and found it very helpful."
+    # Bad review - "The product is terrible. It broke after just one use and the quality is very poor."
+    # Neutral review - "The product is okay. It works as expected but nothing exceptional."
+    # Default - "I'm not sure about the product yet. Can you tell me more about its features and benefits?"
 
-# Run the chain with an example review
-# Good review - "The product is excellent. I really enjoyed using it and found it very helpful."
-# Bad review - "The product is terrible. It broke after just one use and the quality is very poor."
-# Neutral review - "The product is okay. It works as expected but nothing exceptional."
-# Default - "I'm not sure about the product yet. Can you tell me more about its features and benefits?"
+    review = "The product is terrible. It broke after just one use and the quality is very poor."
+    result = chain.invoke({"feedback": review})
 
-review = "The product is terrible. It broke after just one use and the quality is very poor."
-result = chain.invoke({"feedback": review})
+    # Output the result
+    print(result)
 
-# Output the result
-print(result)
+    # How the route was decided: cache, local classifier or model, and the model time saved
+    print(router.stats())
@@ -0,0 +1,55 @@
+"""
+Batch Parallel Chains
+
+Runs the sentiment/product chain of `4_pararel_chains.py` over a whole
+feedback export (CSV or JSONL with a `feedback` column) instead of one
+`chain.invoke` at a time. Results are appended to the output JSONL as they
+complete; if the run stops, run the same command again to resume.
+
+    python app/3_chains/6_batch_pararel_chains.py feedback.csv results.jsonl [--fake]
+
+`--fake` uses a local fake chat model, to try the pipeline without API calls.
+"""
+
+import importlib
+import sys
+
+from dotenv import load_dotenv
+from langchain_openai import ChatOpenAI
+from app.utils.batch import BatchRunner
+from app.utils.fake_models import FakeChatModel
+
+# Load environment variables from .env
+load_dotenv()
+
+MAX_CONCURRENCY = 16
+
+parallel_chains = importlib.import_module("app.3_chains.4_pararel_chains")
+
+
+def main():
+    args = [arg for arg in sys.argv[1:] if arg != "--fake"]
+    if len(args) != 2:
+        print(__doc__)
+        sys.exit(1)
+    input_path, output_path = args
+
+    if "--fake" in sys.argv:
+        model = FakeChatModel(latency=0.2, max_in_flight=2 * MAX_CONCURRENCY)
+    else:
+        # Retries are left to the runner, which also lowers the concurrency on rate limits
+        model = ChatOpenAI(model="gpt-3.5-turbo", max_retries=0)
+    chain = parallel_chains.create_feedback_chain(model)
+
+    runner = BatchRunner(
+        chain,
+        input_key="feedback",
+        max_concurrency=MAX_CONCURRENCY,
+        histogram_runs=["sentiment", "product"],
+    )
+    runner.run(input_path, output_path)
+    print(runner.report())
+
+
+if __name__ == "__main__":
+    main()
@@ -2,7 +2,9 @@ import os
 import sys
 from dotenv import load_dotenv
 from langchain_openai import ChatOpenAI
-from langchain_core.messages import HumanMessage, SystemMessage
+from langchain_core.messages import AIMessage, HumanMessage, SystemMessage
+from app.utils.session_store import SessionStore
+from app.utils.streaming import render_stream
 
 """
 Conversation Input
@@ -20,19 +22,21 @@ model = ChatOpenAI(model="gpt-3.5-turbo")
 # Set an initial system message (optional)
 system_message = SystemMessage(content="You are a helpful AI assistant.")
 
-sessions = {} # Use a list to store messages
+# Bounded store of messages per session, the model only sees the most recent ones
+sessions = SessionStore(max_sessions=1000, idle_ttl=3600, max_tokens=2000)
 
-def get_session(session_id: int):
-    if  session_id not in sessions:  
-        sessions[session_id] = [system_message]
-    return sessions[session_id]
+def get_session(session_id: str):
+    return sessions.get_session_history(session_id)
 
 def ask_with_session(session_id, question):
     session = get_session(session_id)
-    session.append(HumanMessage(content=question)) 
-    response = model.invoke(session)
-    session.append(response)
-    return response
+    session.add_message(HumanMessage(content=question))
+    # Yield the tokens as they arrive, the full answer is saved once the stream ends
+    response = None
+    for chunk in model.stream([system_message] + session.messages):
+        response = chunk if response is None else response + chunk
+        yield chunk.content
+    session.add_message(AIMessage(content=response.content))
 
 while True:
     session_id = input("\nEnter Session ID: ")
@@ -46,7 +50,5 @@ while True:
             print("\nSession ended")
             break
 
-        # Get AI response using history
-        response = ask_with_session(session_id, query)
-
-        print(f"\nAI: {response.content}")
+        # Get AI response using history, printed token by token
+        render_stream(ask_with_session(session_id, query), prefix="\nAI: ")
@@ -5,14 +5,11 @@ from dotenv import load_dotenv
 from langchain_openai import ChatOpenAI
 from langchain_core.prompts import ChatPromptTemplate
 from langchain_core.output_parsers import StrOutputParser
-from langchain_core.chat_history import (
-    BaseChatMessageHistory,
-    InMemoryChatMessageHistory,
-)
 from langchain_core.runnables.history import RunnableWithMessageHistory
 
 # We will use Conversation class
 from app.utils.conversation import Conversation
+from app.utils.session_store import SessionStore
 
 load_dotenv()
 
@@ -28,18 +25,15 @@ chain = prompt | model| StrOutputParser()
 
 
 # Session
-store = {}
+# Idle and least recently used sessions are evicted, and the chain only sees the last 20 messages
+store = SessionStore(max_sessions=1000, idle_ttl=3600, max_messages=20)
 
-def get_session_history(session_id: str) -> BaseChatMessageHistory:
-    if session_id not in store:
-        store[session_id] = InMemoryChatMessageHistory()
-    return store[session_id]
-
-app = RunnableWithMessageHistory(chain, get_session_history, input_messages_key="query") # specify the message key
+app = RunnableWithMessageHistory(chain, store.get_session_history, input_messages_key="query") # specify the message key
 
 
 def ask_with_session(session_id: str, query: str):
-    return app.invoke({ "language": "Indonesian", "query": query}, 
+    # Stream the answer, Conversation prints the tokens as they arrive
+    return app.stream({ "language": "Indonesian", "query": query}, 
                config={"configurable": {"session_id": session_id}})
     
 conversation = Conversation(ask_with_session=ask_with_session)
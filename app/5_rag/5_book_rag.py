@@ -1,13 +1,19 @@
 import os
-from typing import List
-from langchain.text_splitter import CharacterTextSplitter
-from langchain_community.document_loaders import TextLoader
-from langchain_chroma import Chroma
-from langchain_openai import OpenAIEmbeddings, ChatOpenAI
+from typing import Callable, Iterator, Optional
 from langchain_core.prompts import ChatPromptTemplate
-from langchain_core.runnables import RunnablePassthrough
+from langchain_core.runnables import Runnable
 from langchain_core.documents import Document
 from langchain_core.embeddings import Embeddings
+from langchain_core.vectorstores import VectorStore
+from app.utils.answer_cache import AnswerCache
+from app.utils.bm25 import BM25Index
+from app.utils.embedding_cache import CachedEmbeddings
+from app.utils.ingestion import LEXICAL_INDEX_DIR, manifest_version, sync_vector_store
+from app.utils.models import create_chat_model, create_embeddings
+from app.utils.rag import RagMetrics, create_parallel_rag_chain
+from app.utils.retrievers import create_retriever
+from app.utils.text_splitters import StreamingCharacterTextSplitter
+from app.utils.vector_stores import NumpyVectorStore
 
 """
 BOOK RAG
@@ -16,46 +22,45 @@ This script creates a simple RAG application, it is a LLM model
 that can answer a question based on the text provided.
 """
 
-def init_vector_store(docs: List[Document], embedding: Embeddings, persist_directory: str) -> Chroma:
+def init_vector_store(file_path: str, embedding: Embeddings, persist_directory: str) -> VectorStore:
     """
-    Initialize the Chroma vector store, either by creating it or loading an existing one.
+    Initialize the Chroma vector store, only embedding chunks of `file_path` that changed since the last run.
     """
-    if not os.path.exists(persist_directory):
-        print("Persistent directory does not exist. Initializing vector store...")
-        print("\n--- Creating vector store ---")
-        db = Chroma.from_documents(docs, embedding, persist_directory=persist_directory)
-        print("\n--- Finished creating vector store ---")
-    else:
-        print("Vector store already exists. Loading vector store...")
-        db = Chroma(persist_directory=persist_directory, embedding_function=embedding)
-    return db
+    return sync_vector_store(file_path, load_documents, embedding, persist_directory)
 
-def load_documents(file_path: str) -> List[Document]:
+def load_documents(file_path: str) -> Iterator[Document]:
     """
-    Load and split text documents from the given file path.
+    Lazily load and split text documents from the given file path, one chunk at a time.
     """
     if not os.path.exists(file_path):
         raise FileNotFoundError(f"The file {file_path} does not exist. Please check the path.")
     
-    loader = TextLoader(file_path)
-    documents = loader.load()
-    text_splitter = CharacterTextSplitter(chunk_size=250, chunk_overlap=20)
-    return text_splitter.split_documents(documents)
+    text_splitter = StreamingCharacterTextSplitter(chunk_size=250, chunk_overlap=20)
+    return text_splitter.lazy_split_file(file_path)
 
-def create_rag_chain(db_dir: str, file_path: str) -> ChatOpenAI:
+def create_rag_chain(db_dir: str, file_path: str,
+                     on_metrics: Optional[Callable[[RagMetrics], None]] = None) -> Runnable:
     """
     Create and return the RAG chain model.
+
+    `on_metrics` receives the retrieval metrics of every question, e.g. `print`.
     """
-    docs = load_documents(file_path)
-    embedding = OpenAIEmbeddings(model="text-embedding-3-small")
-    db = init_vector_store(docs, embedding, db_dir)
+    embedding = CachedEmbeddings(
+        create_embeddings("openai:text-embedding-3-small"),
+        cache_path=os.path.join(os.path.dirname(db_dir), "embedding_cache.sqlite"),
+    )
+    # The story is only a few chunks, so search an in-memory copy instead of going through Chroma
+    db = NumpyVectorStore.from_chroma(init_vector_store(file_path, embedding, db_dir))
     
-    retriever = db.as_retriever(
-        search_type="similarity",
+    # Fuse vector and BM25 results so names in the question are matched exactly
+    retriever = create_retriever(
+        db,
+        search_type="hybrid",
         search_kwargs={"k": 1},
+        lexical_index=BM25Index.load(os.path.join(db_dir, LEXICAL_INDEX_DIR)),
     )
     
-    model = ChatOpenAI(model="gpt-3.5-turbo")
+    model = create_chat_model("openai:gpt-3.5-turbo")
     
     prompt = ChatPromptTemplate.from_messages([("human", """
         Answer this question using the provided context only.
@@ -66,7 +71,18 @@ def create_rag_chain(db_dir: str, file_path: str) -> ChatOpenAI:
         {context}
     """)])
     
-    return {"context": retriever, "question": RunnablePassthrough()} | prompt | model
+    # Retrieval, deduplicated source-tagged context within a token budget, then the model
+    rag_chain = create_parallel_rag_chain(
+        {"hybrid": retriever}, prompt, model, max_context_tokens=500, on_metrics=on_metrics
+    )
+
+    # Serve repeated and near-duplicate questions without retrieval or a model call
+    answer_cache = AnswerCache(
+        embedding=embedding,
+        similarity_threshold=0.95,
+        version_fn=lambda: manifest_version(db_dir),
+    )
+    return answer_cache.wrap(rag_chain)
 
 def main():
     """
@@ -76,7 +92,7 @@ def main():
     db_dir = os.path.join(current_dir, "db", "sangkuriang_db")
     file_path = os.path.join(current_dir, "sources", "sangkuriang.txt")
 
-    rag_chain = create_rag_chain(db_dir, file_path)
+    rag_chain = create_rag_chain(db_dir, file_path, on_metrics=print)
     response = rag_chain.invoke("Why did Sangkuriang kick the boat?")
     print(response.content)
 
@@ -1,15 +1,21 @@
 import os
-from typing import List
-from langchain.text_splitter import TokenTextSplitter
-from langchain_community.document_loaders import TextLoader
-from langchain_chroma import Chroma
-from langchain_openai import OpenAIEmbeddings, ChatOpenAI
+from typing import Callable, Iterator, Optional
 from langchain_core.prompts import ChatPromptTemplate
-from langchain_core.runnables import RunnablePassthrough
+from langchain_core.runnables import Runnable
 from langchain_core.output_parsers import StrOutputParser
 from langchain_core.embeddings import Embeddings
+from langchain_core.vectorstores import VectorStore
 from langchain_core.documents import Document
+from langchain_core.language_models import BaseChatModel
 from app.utils.conversation import Conversation
+from app.utils.answer_cache import AnswerCache
+from app.utils.embedding_cache import CachedEmbeddings
+from app.utils.ingestion import manifest_version, sync_vector_store
+from app.utils.models import create_chat_model, create_embeddings
+from app.utils.rag import RagMetrics, create_parallel_rag_chain
+from app.utils.retrievers import create_retriever
+from app.utils.text_splitters import StreamingTokenTextSplitter
+from app.utils.tracing import Tracer
 
 """
 BOOK RAG QA
@@ -18,42 +24,47 @@ This script creates a conversational RAG application, it is an CLI that
 run LLM model that can answer your questions based on the text provided.
 """
 
-def init_vector_store(docs: List[Document], embedding: Embeddings, persist_directory: str) -> Chroma:
+def init_vector_store(file_path: str, embedding: Embeddings, persist_directory: str) -> VectorStore:
     """
-    Initialize the Chroma vector store, creating it if it doesn't exist.
+    Initialize the Chroma vector store, only embedding chunks of `file_path` that changed since the last run.
     """
-    if not os.path.exists(persist_directory):
-        print("Persistent directory does not exist. Initializing vector store...")
-        db = Chroma.from_documents(docs, embedding, persist_directory=persist_directory)
-        print("\n--- Finished creating vector store ---")
-    else:
-        print("Vector store already exists. Loading vector store...")
-        db = Chroma(persist_directory=persist_directory, embedding_function=embedding)
-    return db
-
-def load_and_split_documents(file_path: str, chunk_size: int, chunk_overlap: int) -> List[Document]:
+    return sync_vector_store(
+        file_path,
+        lambda path: load_and_split_documents(path, chunk_size=1000, chunk_overlap=50),
+        embedding,
+        persist_directory,
+    )
+
+def load_and_split_documents(file_path: str, chunk_size: int, chunk_overlap: int) -> Iterator[Document]:
     """
-    Load and split text documents from the given file path into chunks.
+    Lazily load and split text documents from the given file path into chunks.
     """
-    loader = TextLoader(file_path, encoding='utf-8')
-    documents = loader.load()
-    text_splitter = TokenTextSplitter(chunk_size=chunk_size, chunk_overlap=chunk_overlap)
-    return text_splitter.split_documents(documents)
+    text_splitter = StreamingTokenTextSplitter(chunk_size=chunk_size, chunk_overlap=chunk_overlap)
+    return text_splitter.lazy_split_file(file_path, encoding='utf-8')
 
-def create_rag_chain(persist_dir: str, file_path: str) -> ChatOpenAI:
+def create_rag_chain(persist_dir: str, file_path: str, model: Optional[BaseChatModel] = None,
+                     embeddings: Optional[Embeddings] = None,
+                     on_metrics: Optional[Callable[[RagMetrics], None]] = None) -> Runnable:
     """
     Create and return the RAG chain model.
+
+    `model` and `embeddings` default to new OpenAI clients, the server passes its shared ones.
+    `on_metrics` receives the retrieval metrics of every question, e.g. `print`; otherwise they are
+    only logged at debug level.
     """
-    embedding = OpenAIEmbeddings(model="text-embedding-3-small")
-    docs = load_and_split_documents(file_path, chunk_size=1000, chunk_overlap=50)
-    db = init_vector_store(docs, embedding, persist_directory=persist_dir)
+    embedding = CachedEmbeddings(
+        embeddings or create_embeddings("openai:text-embedding-3-small"),
+        cache_path=os.path.join(os.path.dirname(persist_dir), "embedding_cache.sqlite"),
+    )
+    db = init_vector_store(file_path, embedding, persist_directory=persist_dir)
     
-    retriever = db.as_retriever(
+    retriever = create_retriever(
+        db,
         search_type="similarity",
         search_kwargs={"k": 1},
     )
     
-    model = ChatOpenAI(model="gpt-3.5-turbo")
+    model = model or create_chat_model("openai:gpt-3.5-turbo")
     message = """
     Answer this question using the provided context only.
 
@@ -65,13 +76,32 @@ def create_rag_chain(persist_dir: str, file_path: str) -> ChatOpenAI:
     
     prompt = ChatPromptTemplate.from_messages([("human", message)])
     
-    return {"context": retriever, "question": RunnablePassthrough()} | prompt | model | StrOutputParser()
+    # Retrieval, deduplicated source-tagged context within a token budget, then the model
+    rag_chain = create_parallel_rag_chain(
+        {"similarity": retriever}, prompt, model, max_context_tokens=1500, on_metrics=on_metrics
+    ) | StrOutputParser()
+
+    # Serve repeated and near-duplicate questions without retrieval or a model call
+    answer_cache = AnswerCache(
+        embedding=embedding,
+        similarity_threshold=0.95,
+        version_fn=lambda: manifest_version(persist_dir),
+    )
+    return answer_cache.wrap(rag_chain)
+
+# Spans of retrieval, context building, model call and parsing for every question, appended to a JSONL file
+tracer = Tracer()
+traces_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "db", "rag_traces.jsonl")
 
 def ask_with_session(session_id: str, query: str):
     """
     Function to handle chat queries with session management.
+
+    Returns a stream: retrieval runs first, then the answer is yielded token by token.
     """
-    return rag_chain.invoke(query, config={"configurable": {"session_id": session_id}})
+    yield from rag_chain.stream(query, config={"configurable": {"session_id": session_id}, "callbacks": [tracer]})
+    os.makedirs(os.path.dirname(traces_path), exist_ok=True)
+    tracer.export_jsonl(traces_path)
 
 def main():
     """
@@ -82,7 +112,7 @@ def main():
     file_path = os.path.join(current_dir, "sources", "romeo_and_juliet.txt")
     
     global rag_chain
-    rag_chain = create_rag_chain(persist_dir, file_path)
+    rag_chain = create_rag_chain(persist_dir, file_path, on_metrics=print)
     
     # Chat Loop to interact with the user
     while True:
@@ -103,7 +133,8 @@ def main():
     conversation = Conversation(ask_with_session=ask_with_session, 
                                 welcome_text="--- Welcome to Romeo and Juliet Bot QA app ---",
                                 human_alias='Question',
-                                ai_alias='Answer')
+                                ai_alias='Answer',
+                                show_timings=True)
     conversation.chat()
 
 if __name__ == "__main__":
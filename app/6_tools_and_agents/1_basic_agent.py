@@ -6,7 +6,7 @@ from langchain.agents import (
 from langchain_core.messages import AIMessage, HumanMessage, SystemMessage
 from langchain_core.tools import Tool
 from langchain_openai import ChatOpenAI
-from langgraph.prebuilt import create_react_agent
+from app.utils.tool_execution import create_concurrent_react_agent
 
 # Load environment variables from .env file
 load_dotenv()
@@ -37,7 +37,8 @@ model = ChatOpenAI(
 )
 
 # Create an agent executor from the agent and tools
-agent_executor = create_react_agent(model, tools)
+# Each tool call gives up after 10 seconds, and the model gets an error message instead
+agent_executor = create_concurrent_react_agent(model, tools, default_timeout=10)
 
 # Run the agent with a test query
 response = agent_executor.invoke({"messages": [HumanMessage(content="What time is it?")]})
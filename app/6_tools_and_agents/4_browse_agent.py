@@ -1,11 +1,13 @@
 from dotenv import load_dotenv
-from langgraph.prebuilt import create_react_agent
 from langchain_core.messages import AIMessage, HumanMessage, SystemMessage
 from langchain_core.tools import Tool
 from langchain_openai import ChatOpenAI
-from langgraph.checkpoint.memory import MemorySaver
 import datetime
-from wikipedia import summary
+import os
+from app.utils.checkpointer import DeltaSqliteSaver
+from app.utils.streaming import astream_graph_answer, iter_async, render_stream
+from app.utils.tool_cache import ToolCache
+from app.utils.tool_execution import create_concurrent_react_agent
 
 """
 Browse Agent
@@ -27,11 +29,16 @@ def get_current_time(*args, **kwargs):
 
 def search_wikipedia(query):
     """Searches Wikipedia and returns the summary of the first result."""
+    # Imported here, so importing the script for `create_browse_agent` does not need the package
+    from wikipedia import summary
+    from wikipedia.exceptions import DisambiguationError, PageError
 
     try:
         # Limit to two sentences for brevity
         return summary(query, sentences=2)
-    except:
+    except (PageError, DisambiguationError):
+        # Wikipedia has no single page for the query, which is worth caching. Other errors
+        # (network, timeouts) are raised, so the tool cache does not keep them for a day
         return "I couldn't find any information on that."
 
 
@@ -49,20 +56,56 @@ tools = [
     ),
 ]
 
-# Initialize a ChatOpenAI model
-model = ChatOpenAI(model="gpt-4o")
-
-memory = MemorySaver()
-
-agent_executor = create_react_agent(model, tools, checkpointer=memory)
-
-config = {"configurable": {"thread_id": "0"}}
-
-# Chat Loop to interact with the user
-while True:
-    user_input = input("Question: ")
-    if user_input.lower() == "exit":
-        break
-    # Invoke the agent with the user input and the current chat history
-    response = agent_executor.invoke({"messages": [HumanMessage(content=user_input)]}, config)
-    print("Answer:", response["messages"][-1].content)
\ No newline at end of file
+def create_browse_agent(model, checkpointer, tool_cache_path, tools=tools):
+    """
+    Build the browse agent and the cache of its tools. Returns `(agent, tool_cache)`.
+
+    `tools` defaults to the time and Wikipedia tools above, the benchmarks pass offline stand-ins.
+    """
+    # Cache tool results on disk, so repeated lookups skip Wikipedia, within and across conversations.
+    # The time must always be fresh, so it is never cached
+    tool_cache = ToolCache(cache_path=tool_cache_path, ttls={"Time": 0, "Wikipedia": 24 * 3600})
+    cached_tools = [tool_cache.wrap(tool) for tool in tools]
+
+    # A Wikipedia lookup that hangs gives up after 10 seconds, and the model is told so instead of the turn
+    # waiting on it
+    agent = create_concurrent_react_agent(model, cached_tools, checkpointer=checkpointer,
+                                          timeouts={"Wikipedia": 10})
+    return agent, tool_cache
+
+
+def main():
+    current_dir = os.path.dirname(os.path.abspath(__file__))
+
+    # Initialize a ChatOpenAI model
+    model = ChatOpenAI(model="gpt-4o")
+
+    # Keep the conversation in a SQLite file, so it survives restarts: each step stores only its new messages,
+    # and only the last 20 checkpoints of the thread are kept
+    memory = DeltaSqliteSaver(os.path.join(current_dir, "db", "checkpoints.sqlite"), keep_last=20)
+
+    agent_executor, tool_cache = create_browse_agent(
+        model, memory, os.path.join(current_dir, "db", "tool_cache.sqlite")
+    )
+
+    config = {"configurable": {"thread_id": "0"}}
+
+    # Chat Loop to interact with the user
+    while True:
+        user_input = input("Question: ")
+        if user_input.lower() == "exit":
+            print(f"Tool cache: {tool_cache.stats()}")
+            print(f"Checkpointer: {memory.stats()}")
+            memory.close()
+            break
+        # Run the agent with the user input and the current chat history, printing the answer
+        # tokens as the model writes them; tool calls and tool results are not printed
+        render_stream(
+            iter_async(astream_graph_answer(
+                agent_executor, {"messages": [HumanMessage(content=user_input)]}, config, node="agent")),
+            prefix="Answer: ",
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -3,13 +3,19 @@ import os
 from dotenv import load_dotenv
 from langchain import hub
 from langchain.agents import AgentExecutor, create_react_agent
-from langchain.chains import create_history_aware_retriever, create_retrieval_chain
+from langchain.chains import create_retrieval_chain
 from langchain.chains.combine_documents import create_stuff_documents_chain
+from langchain_community.callbacks import get_openai_callback
 from langchain_community.vectorstores import Chroma
 from langchain_core.messages import AIMessage, HumanMessage
 from langchain_core.prompts import ChatPromptTemplate, MessagesPlaceholder
 from langchain_core.tools import Tool
 from langchain_openai import ChatOpenAI, OpenAIEmbeddings
+from app.utils.embedding_cache import CachedEmbeddings
+from app.utils.retrievers import create_fast_history_aware_retriever, create_retriever
+from app.utils.streaming import astream_agent_answer, iter_async, render_stream
+from app.utils.summary_history import SummarizingChatHistory
+from app.utils.tracing import Tracer
 
 # Load environment variables from .env file
 load_dotenv()
@@ -29,8 +35,11 @@ else:
         f"The directory {persistent_directory} does not exist. Please check the path."
     )
 
-# Define the embedding model
-embeddings = OpenAIEmbeddings(model="text-embedding-3-small")
+# Define the embedding model, cached on disk so repeated queries are embedded only once
+embeddings = CachedEmbeddings(
+    OpenAIEmbeddings(model="text-embedding-3-small"),
+    cache_path=os.path.join(db_dir, "embedding_cache.sqlite"),
+)
 
 # Load the existing vector store with the embedding function
 db = Chroma(persist_directory=persistent_directory,
@@ -39,13 +48,15 @@ db = Chroma(persist_directory=persistent_directory,
 # Create a retriever for querying the vector store
 # `search_type` specifies the type of search (e.g., similarity)
 # `search_kwargs` contains additional arguments for the search (e.g., number of results to return)
-retriever = db.as_retriever(
+retriever = create_retriever(
+    db,
     search_type="similarity",
     search_kwargs={"k": 3},
 )
 
 # Create a ChatOpenAI model
 llm = ChatOpenAI(model="gpt-4o")
+AGENT_LLM_TAG = "agent_llm"
 
 # Contextualize question prompt
 # This system prompt helps the AI understand that it should reformulate the question
@@ -68,8 +79,10 @@ contextualize_q_prompt = ChatPromptTemplate.from_messages(
 )
 
 # Create a history-aware retriever
-# This uses the LLM to help reformulate the question based on chat history
-history_aware_retriever = create_history_aware_retriever(
+# This uses the LLM to help reformulate the question based on chat history.
+# The first turn has no history and retrieves for the question as is; later turns skip the rewrite
+# when the question is self-contained, and otherwise run it in parallel with a retrieval for the raw question
+history_aware_retriever = create_fast_history_aware_retriever(
     llm, retriever, contextualize_q_prompt
 )
 
@@ -108,36 +121,73 @@ rag_chain = create_retrieval_chain(
 # Load the ReAct Docstore Prompt
 react_docstore_prompt = hub.pull("hwchase17/react")
 
+# Recent turns are kept verbatim, older ones are folded into a running summary in the background,
+# so the history sent with every turn stays around 1000 tokens
+chat_history = SummarizingChatHistory(
+    llm=ChatOpenAI(model="gpt-3.5-turbo"),
+    max_tokens=1000,
+    token_counter=llm.get_num_tokens_from_messages,
+)
+
+# The ReAct prompt has no chat history, so the tool reads the managed history itself: the RAG chain's
+# prompts are the ones that use it, to rewrite follow-up questions and to answer them.
+# Only the answer goes back to the agent, not the history and documents the chain returns with it.
+# The agent runs asynchronously, so the tool does too, instead of blocking a worker thread on the chain
+async def answer_question(input: str) -> str:
+    result = await rag_chain.ainvoke({"input": input, "chat_history": chat_history.messages})
+    return result["answer"]
+
+
 tools = [
     Tool(
         name="Answer Question",
         func=lambda input, **kwargs: rag_chain.invoke(
-            {"input": input, "chat_history": kwargs.get("chat_history", [])}
-        ),
+            {"input": input, "chat_history": chat_history.messages}
+        )["answer"],
+        coroutine=answer_question,
         description="useful for when you need to answer questions about the context",
     )
 ]
 
 # Create the ReAct Agent with document store retriever
+# The agent's model is tagged so its final answer can be streamed apart from the tool's model calls
 agent = create_react_agent(
-    llm=llm,
+    llm=llm.with_config(tags=[AGENT_LLM_TAG]),
     tools=tools,
     prompt=react_docstore_prompt,
 )
 
 agent_executor = AgentExecutor.from_agent_and_tools(
-    agent=agent, tools=tools, handle_parsing_errors=True, verbose=True,
+    agent=agent, tools=tools, handle_parsing_errors=True,
 )
 
-chat_history = []
+# Record a span for every step of a turn (agent model calls, the tool, its retrieval and model call),
+# print where the time of each turn went and append the spans to a JSONL file.
+# Set METRICS_PORT to also serve Prometheus metrics at http://localhost:<port>/metrics
+tracer = Tracer()
+traces_path = os.path.join(db_dir, "agent_traces.jsonl")
+if os.environ.get("METRICS_PORT"):
+    tracer.serve_prometheus(port=int(os.environ["METRICS_PORT"]))
+
 while True:
     query = input("You: ")
     if query.lower() == "exit":
         break
-    response = agent_executor.invoke(
-        {"input": query, "chat_history": chat_history})
-    print(f"AI: {response['output']}")
+    with get_openai_callback() as usage:
+        # Print the final answer token by token while the agent writes it
+        answer, first_token, total = render_stream(
+            iter_async(astream_agent_answer(
+                agent_executor, {"input": query}, llm_tag=AGENT_LLM_TAG,
+                config={"callbacks": [tracer]})),
+            prefix="AI: ",
+        )
+    print(f"[history tokens: {chat_history.token_count()}, prompt tokens this turn: {usage.prompt_tokens}, "
+          f"first token {first_token:.1f}s, total {total:.1f}s]")
+    print(tracer.flame())
+    tracer.export_jsonl(traces_path)
 
     # Update history
-    chat_history.append(HumanMessage(content=query))
-    chat_history.append(AIMessage(content=response["output"]))
+    chat_history.add_messages([
+        HumanMessage(content=query),
+        AIMessage(content=answer),
+    ])
@@ -0,0 +1,77 @@
+"""
+ANN Benchmark
+
+Measures recall@k against latency for `IVFVectorStore` at several `n_probe`
+values, with the exact `NumpyVectorStore` scan as the baseline. The corpus is
+synthetic: clustered unit vectors, which is closer to real embeddings than
+uniform noise.
+
+Run from the repository root:
+
+    python -m app.benchmarks.ann
+"""
+
+import time
+
+import numpy as np
+from langchain_core.embeddings import FakeEmbeddings
+
+from app.utils.vector_stores import IVFVectorStore, NumpyVectorStore
+
+N_VECTORS = 200_000
+DIMENSIONS = 256
+N_CLUSTERS = 2_000
+N_QUERIES = 200
+K = 10
+N_PROBES = [1, 2, 4, 8, 16, 32, 64, 128]
+
+
+def clustered_vectors(rng: np.random.Generator, n: int, centers: np.ndarray, spread: float = 1.6) -> np.ndarray:
+    vectors = centers[rng.integers(len(centers), size=n)]
+    vectors = vectors + spread * rng.standard_normal(vectors.shape).astype(np.float32) / np.sqrt(vectors.shape[1])
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+def search_all(store: NumpyVectorStore, queries: np.ndarray):
+    """
+    Return the result rows of every query and the mean latency in milliseconds.
+    """
+    results = []
+    started_at = time.perf_counter()
+    for query in queries:
+        rows, _ = store._search(query, K)
+        results.append(set(rows.tolist()))
+    return results, (time.perf_counter() - started_at) * 1000 / len(queries)
+
+
+def main():
+    rng = np.random.default_rng(0)
+    centers = rng.standard_normal((N_CLUSTERS, DIMENSIONS)).astype(np.float32)
+    centers /= np.linalg.norm(centers, axis=1, keepdims=True)
+    vectors = clustered_vectors(rng, N_VECTORS, centers)
+    queries = clustered_vectors(rng, N_QUERIES, centers)
+    texts = [""] * N_VECTORS
+    embedding = FakeEmbeddings(size=DIMENSIONS)
+
+    exact = NumpyVectorStore(embedding)
+    exact.add_embeddings(texts, vectors)
+    expected, exact_latency = search_all(exact, queries)
+
+    ann = IVFVectorStore(embedding)
+    started_at = time.perf_counter()
+    # Trains the index as the rows are added
+    ann.add_embeddings(texts, vectors)
+    print(f"{N_VECTORS} vectors, {DIMENSIONS} dimensions, {ann.n_lists} lists, "
+          f"added and trained in {time.perf_counter() - started_at:.2f}s")
+
+    print(f"{'search':>12} {'recall@' + str(K):>10} {'latency':>10} {'speedup':>8}")
+    print(f"{'exact':>12} {1.0:>10.3f} {exact_latency:>8.2f}ms {1.0:>7.1f}x")
+    for n_probe in N_PROBES:
+        ann.n_probe = n_probe
+        results, latency = search_all(ann, queries)
+        recall = np.mean([len(found & truth) / K for found, truth in zip(results, expected)])
+        print(f"{'n_probe=' + str(n_probe):>12} {recall:>10.3f} {latency:>8.2f}ms {exact_latency / latency:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
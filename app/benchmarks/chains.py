@@ -0,0 +1,392 @@
+"""
+Chain Benchmark Suite
+
+Runs the chains of the scripts offline, on `FakeChatModel` and
+`FakeEmbeddings`, to measure what our own code costs around the model calls:
+prompt formatting, parsing, routing, retrieval, history handling and agent
+loops. With the default zero model latency the numbers are pure framework
+overhead; `--latency` and `--tokens-per-second` simulate a real API.
+
+For every scenario it reports throughput, wall time percentiles per
+invocation, the peak memory allocated per invocation (tracemalloc, in a
+separate pass so it does not skew the timings) and the wall time per stage,
+i.e. per direct child run of the chain (prompt, model, parser, retriever,
+tool, graph node...).
+
+Results can be saved, tagged with the git commit, and compared with a run
+saved on another commit:
+
+    python -m app.benchmarks.chains
+    python -m app.benchmarks.chains --save before.json
+    python -m app.benchmarks.chains --compare before.json
+    python -m app.benchmarks.chains --only rag session
+"""
+
+import argparse
+import contextlib
+import datetime
+import importlib
+import io
+import json
+import os
+import platform
+import subprocess
+import tempfile
+import time
+import tracemalloc
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from uuid import UUID
+
+import numpy as np
+from langchain.agents import AgentExecutor, create_react_agent as create_react_executor
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.messages import AIMessage, HumanMessage
+from langchain_core.output_parsers import StrOutputParser
+from langchain_core.prompts import ChatPromptTemplate, PromptTemplate
+from langchain_core.runnables import Runnable
+from langchain_core.runnables.history import RunnableWithMessageHistory
+from langchain_core.tools import Tool
+
+from app.utils.checkpointer import DeltaSqliteSaver
+from app.utils.fake_models import FakeChatModel, FakeEmbeddings
+from app.utils.session_store import SessionStore
+
+ITERATIONS = 200
+WARMUP = 5
+ALLOCATION_ITERATIONS = 20
+
+SOURCES_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "5_rag", "sources")
+
+# The hwchase17/react prompt, inlined so the suite does not need the hub
+REACT_PROMPT = """Answer the following questions as best you can. You have access to the following tools:
+
+{tools}
+
+Use the following format:
+
+Question: the input question you must answer
+Thought: you should always think about what to do
+Action: the action to take, should be one of [{tool_names}]
+Action Input: the input to the action
+Observation: the result of the action
+... (this Thought/Action/Action Input/Observation can repeat N times)
+Thought: I now know the final answer
+Final Answer: the final answer to the original input question
+
+Begin!
+
+Question: {input}
+Thought:{agent_scratchpad}"""
+
+FEEDBACKS = [
+    "The product is excellent. I really enjoyed using it and found it very helpful.",
+    "The product is terrible. It broke after just one use and the quality is very poor.",
+    "The product is okay. It works as expected but nothing exceptional.",
+    "I'm not sure about the product yet. Can you tell me more about its features and benefits?",
+]
+
+Scenario = Tuple[Runnable, Callable[[int], Any], Dict[str, Any]]
+
+
+class StageTimer(BaseCallbackHandler):
+    """
+    Callback handler summing the wall time of the direct child runs of each root run, by run name.
+    """
+
+    run_inline = True
+
+    def __init__(self) -> None:
+        self.seconds: Dict[str, float] = {}
+        self._runs: Dict[UUID, Tuple[Optional[UUID], str, float]] = {}
+        self._roots: set = set()
+
+    def _start(self, serialized: Optional[Dict[str, Any]], run_id: UUID, parent_run_id: Optional[UUID],
+               kwargs: Dict[str, Any]) -> None:
+        if parent_run_id is None:
+            self._roots.add(run_id)
+            return
+        serialized = serialized or {}
+        name = kwargs.get("name") or serialized.get("name") or (serialized.get("id") or ["unknown"])[-1]
+        self._runs[run_id] = (parent_run_id, name, time.perf_counter())
+
+    def _end(self, run_id: UUID) -> None:
+        self._roots.discard(run_id)
+        run = self._runs.pop(run_id, None)
+        if run is not None and run[0] in self._roots:
+            self.seconds[run[1]] = self.seconds.get(run[1], 0.0) + time.perf_counter() - run[2]
+
+    def on_chain_start(self, serialized, inputs, *, run_id, parent_run_id=None, **kwargs):
+        self._start(serialized, run_id, parent_run_id, kwargs)
+
+    def on_chat_model_start(self, serialized, messages, *, run_id, parent_run_id=None, **kwargs):
+        self._start(serialized, run_id, parent_run_id, kwargs)
+
+    def on_llm_start(self, serialized, prompts, *, run_id, parent_run_id=None, **kwargs):
+        self._start(serialized, run_id, parent_run_id, kwargs)
+
+    def on_retriever_start(self, serialized, query, *, run_id, parent_run_id=None, **kwargs):
+        self._start(serialized, run_id, parent_run_id, kwargs)
+
+    def on_tool_start(self, serialized, input_str, *, run_id, parent_run_id=None, **kwargs):
+        self._start(serialized, run_id, parent_run_id, kwargs)
+
+    def on_chain_end(self, outputs, *, run_id, **kwargs):
+        self._end(run_id)
+
+    def on_llm_end(self, response, *, run_id, **kwargs):
+        self._end(run_id)
+
+    def on_retriever_end(self, documents, *, run_id, **kwargs):
+        self._end(run_id)
+
+    def on_tool_end(self, output, *, run_id, **kwargs):
+        self._end(run_id)
+
+    def on_chain_error(self, error, *, run_id, **kwargs):
+        self._end(run_id)
+
+    def on_llm_error(self, error, *, run_id, **kwargs):
+        self._end(run_id)
+
+    def on_retriever_error(self, error, *, run_id, **kwargs):
+        self._end(run_id)
+
+    def on_tool_error(self, error, *, run_id, **kwargs):
+        self._end(run_id)
+
+
+def basic_chain(model: FakeChatModel, tmp: str) -> Scenario:
+    """
+    `3_chains/1_basic_chain.py`: prompt | model | parser.
+    """
+    prompt = ChatPromptTemplate.from_messages([
+        ('system', "Translate the following into {language}:"),
+        ('user', '{text}'),
+    ])
+    chain = prompt | model | StrOutputParser()
+    return chain, lambda i: {"language": "Indonesian", "text": f"Good morning number {i}"}, {}
+
+
+def parallel_chain(model: FakeChatModel, tmp: str) -> Scenario:
+    """
+    `3_chains/4_pararel_chains.py`: sentiment and product branches in a `RunnableParallel`.
+    """
+    parallel_chains = importlib.import_module("app.3_chains.4_pararel_chains")
+    chain = parallel_chains.create_feedback_chain(model)
+    return chain, lambda i: f"{FEEDBACKS[i % len(FEEDBACKS)]} ({i})", {}
+
+
+def branched_chain(model: FakeChatModel, tmp: str) -> Scenario:
+    """
+    `3_chains/5_branched_chains.py`: fast path router, then a `RunnableBranch` of response chains.
+
+    Feedbacks repeat, so most routes come from the decision cache, the rest from the local classifiers.
+    """
+    branched_chains = importlib.import_module("app.3_chains.5_branched_chains")
+    router = branched_chains.create_feedback_router(model, FakeEmbeddings())
+    chain = branched_chains.create_branched_chain(model, router)
+    return chain, lambda i: {"feedback": FEEDBACKS[i % len(FEEDBACKS)] + " " * (i % 8)}, {}
+
+
+def session_chat(model: FakeChatModel, tmp: str) -> Scenario:
+    """
+    `4_sessions/2_session_with_in_memory_chat.py`: `RunnableWithMessageHistory` over a windowed `SessionStore`.
+    """
+    prompt = ChatPromptTemplate.from_messages([
+        ('system', "You are a helpful assistant. Reply messages in {language}"),
+        ('user', '{query}'),
+    ])
+    store = SessionStore(max_sessions=1000, idle_ttl=3600, max_messages=20)
+    app = RunnableWithMessageHistory(prompt | model | StrOutputParser(), store.get_session_history,
+                                     input_messages_key="query")
+    return (app, lambda i: {"language": "Indonesian", "query": f"message {i}"},
+            {"configurable": lambda i: {"session_id": f"session-{i % 10}"}})
+
+
+def book_rag(model: FakeChatModel, tmp: str) -> Scenario:
+    """
+    `5_rag/6_book_rag_qa.py`: answer cache, parallel retrieval over Chroma, compact context, model, parser.
+    """
+    book_rag_qa = importlib.import_module("app.5_rag.6_book_rag_qa")
+    with contextlib.redirect_stdout(io.StringIO()):
+        chain = book_rag_qa.create_rag_chain(
+            os.path.join(tmp, "rag_db"), os.path.join(SOURCES_DIR, "sangkuriang.txt"),
+            model=model, embeddings=FakeEmbeddings(),
+        )
+    # Distinct questions, so the answer cache misses and the whole chain runs
+    return chain, lambda i: f"Question {i}: why did Sangkuriang want to marry Dayang Sumbi?", {}
+
+
+def _time_tool(*args, **kwargs) -> str:
+    return "10:00 AM"
+
+
+def react_agent(model: FakeChatModel, tmp: str) -> Scenario:
+    """
+    `6_tools_and_agents/5_vector_store_agent.py` style ReAct `AgentExecutor`: one tool call, then the answer.
+    """
+    model.responses = [
+        "Thought: I should check the time.\nAction: Time\nAction Input: now",
+        "Thought: I now know the final answer\nFinal Answer: It is 10:00 AM.",
+    ]
+    tools = [Tool(name="Time", func=_time_tool, description="Useful for when you need to know the current time.")]
+    agent = create_react_executor(llm=model, tools=tools, prompt=PromptTemplate.from_template(REACT_PROMPT))
+    executor = AgentExecutor.from_agent_and_tools(agent=agent, tools=tools, handle_parsing_errors=True)
+    return executor, lambda i: {"input": f"What time is it? ({i})"}, {}
+
+
+def graph_agent(model: FakeChatModel, tmp: str) -> Scenario:
+    """
+    `6_tools_and_agents/4_browse_agent.py`: concurrent tool node, tool cache and SQLite checkpointer, one tool
+    call per turn.
+    """
+    model.responses = [
+        AIMessage(content="", tool_calls=[{"name": "Time", "args": {"__arg1": "now"}, "id": "call-time"}]),
+        "It is 10:00 AM.",
+    ]
+    tools = [Tool(name="Time", func=_time_tool, description="Useful for when you need to know the current time.")]
+    browse_agent = importlib.import_module("app.6_tools_and_agents.4_browse_agent")
+    checkpointer = DeltaSqliteSaver(os.path.join(tmp, "checkpoints.sqlite"), keep_last=20)
+    agent, _ = browse_agent.create_browse_agent(model, checkpointer, os.path.join(tmp, "tool_cache.sqlite"),
+                                                tools=tools)
+    return (agent, lambda i: {"messages": [HumanMessage(content=f"What time is it? ({i})")]},
+            {"configurable": lambda i: {"thread_id": f"thread-{i % 10}"}})
+
+
+SCENARIOS: Dict[str, Callable[[FakeChatModel, str], Scenario]] = {
+    "basic": basic_chain,
+    "parallel": parallel_chain,
+    "branched": branched_chain,
+    "session": session_chat,
+    "rag": book_rag,
+    "react_agent": react_agent,
+    "graph_agent": graph_agent,
+}
+
+
+def close_scenario(chain: Runnable) -> None:
+    """
+    Close what a scenario opened in its temporary directory, i.e. an agent's SQLite checkpointer.
+    """
+    close = getattr(getattr(chain, "checkpointer", None), "close", None)
+    if close is not None:
+        close()
+
+
+def run_scenario(build: Callable[[FakeChatModel, str], Scenario], latency: float,
+                 tokens_per_second: Optional[float], iterations: int) -> Dict[str, Any]:
+    with tempfile.TemporaryDirectory() as tmp:
+        model = FakeChatModel(latency=latency, tokens_per_second=tokens_per_second)
+        chain, make_input, config_template = build(model, tmp)
+
+        def config(i: int, callbacks: List[BaseCallbackHandler]) -> Dict[str, Any]:
+            result = {"callbacks": callbacks}
+            if "configurable" in config_template:
+                result["configurable"] = config_template["configurable"](i)
+            return result
+
+        # Silences scripts that print per invocation, e.g. the RAG metrics
+        with contextlib.redirect_stdout(io.StringIO()):
+            for i in range(WARMUP):
+                chain.invoke(make_input(-1 - i), config(-1 - i, []))
+
+            timer = StageTimer()
+            timings = []
+            started_at = time.perf_counter()
+            for i in range(iterations):
+                call_started_at = time.perf_counter()
+                chain.invoke(make_input(i), config(i, [timer]))
+                timings.append(time.perf_counter() - call_started_at)
+            elapsed = time.perf_counter() - started_at
+
+            peaks = []
+            tracemalloc.start()
+            for i in range(iterations, iterations + ALLOCATION_ITERATIONS):
+                before, _ = tracemalloc.get_traced_memory()
+                tracemalloc.reset_peak()
+                chain.invoke(make_input(i), config(i, []))
+                peaks.append(tracemalloc.get_traced_memory()[1] - before)
+            tracemalloc.stop()
+        close_scenario(chain)
+
+    timings_ms = np.array(timings) * 1000
+    return {
+        "iterations": iterations,
+        "ops_per_second": iterations / elapsed,
+        "mean_ms": float(timings_ms.mean()),
+        "p50_ms": float(np.percentile(timings_ms, 50)),
+        "p95_ms": float(np.percentile(timings_ms, 95)),
+        "peak_kib": float(np.median(peaks) / 1024),
+        "stages_ms": {name: seconds / iterations * 1000 for name, seconds in
+                      sorted(timer.seconds.items(), key=lambda item: -item[1])},
+    }
+
+
+def git_commit() -> str:
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                                check=True).stdout.strip()
+        dirty = subprocess.run(["git", "status", "--porcelain", "--untracked-files=no"], capture_output=True,
+                               text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+    return commit + ("-dirty" if dirty else "")
+
+
+def print_results(results: Dict[str, Any], baseline: Optional[Dict[str, Any]] = None) -> None:
+    print(f"{'scenario':<12} {'ops/s':>9} {'p50':>9} {'p95':>9} {'peak KiB':>9}"
+          + (f" {'p50 vs ' + baseline['commit']:>18}" if baseline else ""))
+    for name, result in results["scenarios"].items():
+        line = (f"{name:<12} {result['ops_per_second']:>9.1f} {result['p50_ms']:>7.2f}ms {result['p95_ms']:>7.2f}ms "
+                f"{result['peak_kib']:>9.1f}")
+        previous = (baseline or {}).get("scenarios", {}).get(name)
+        if previous:
+            change = (result["p50_ms"] / previous["p50_ms"] - 1) * 100
+            line += f" {previous['p50_ms']:>8.2f}ms {change:>+7.1f}%"
+        print(line)
+        stages = ", ".join(f"{stage} {ms:.2f}ms" for stage, ms in result["stages_ms"].items())
+        print(f"{'':<12} stages per op: {stages}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline benchmark of the chains in app/")
+    parser.add_argument("--only", nargs="+", choices=list(SCENARIOS), help="scenarios to run")
+    parser.add_argument("--iterations", type=int, default=ITERATIONS)
+    parser.add_argument("--latency", type=float, default=0.0, help="fake model latency in seconds")
+    parser.add_argument("--tokens-per-second", type=float, default=None, help="fake model token rate")
+    parser.add_argument("--save", help="write the results to this JSON file")
+    parser.add_argument("--compare", help="JSON file of an earlier run to compare with")
+    args = parser.parse_args()
+
+    results = {
+        "commit": git_commit(),
+        "date": datetime.datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "latency": args.latency,
+        "tokens_per_second": args.tokens_per_second,
+        "scenarios": {},
+    }
+    print(f"commit {results['commit']}, {args.iterations} iterations, model latency {args.latency * 1000:.0f}ms, "
+          f"tokens/s {args.tokens_per_second or 'unlimited'}")
+    for name in args.only or SCENARIOS:
+        try:
+            results["scenarios"][name] = run_scenario(SCENARIOS[name], args.latency, args.tokens_per_second,
+                                                      args.iterations)
+        except Exception as error:
+            # e.g. the RAG splitter needs tiktoken's encoding, downloaded on first use
+            print(f"{name}: failed, {type(error).__name__}: {error}")
+
+    baseline = None
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as file:
+            baseline = json.load(file)
+    print_results(results, baseline)
+
+    if args.save:
+        with open(args.save, "w", encoding="utf-8") as file:
+            json.dump(results, file, indent=2)
+        print(f"saved to {args.save}")
+
+
+if __name__ == "__main__":
+    main()
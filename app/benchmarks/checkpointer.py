@@ -0,0 +1,126 @@
+"""
+Checkpointer Benchmark
+
+Runs the LangGraph ReAct agent of `6_tools_and_agents/4_browse_agent.py` over
+long threads (one tool call and one answer per turn, with a fake model, so
+only the checkpointing is measured) with `MemorySaver` and with
+`DeltaSqliteSaver`, and compares:
+
+- the bytes serialized for the checkpoints, which MemorySaver keeps in memory
+  and the SQLite saver writes to disk
+- the memory still held by the saver after the run, and the database size
+- the time to load the latest state of a thread in a new process, from disk
+
+The run times are measured with tracemalloc on, so only compare them to each
+other. It also checks that both savers give back the same conversation.
+
+Run from the repository root:
+
+    python -m app.benchmarks.checkpointer
+"""
+
+import gc
+import os
+import tempfile
+import time
+import tracemalloc
+
+from langchain.tools import Tool
+from langchain_core.messages import AIMessage, HumanMessage
+from langgraph.checkpoint.memory import MemorySaver
+
+from app.utils.checkpointer import DeltaSqliteSaver
+from app.utils.fake_models import FakeChatModel
+from app.utils.tool_execution import create_concurrent_react_agent
+
+THREADS = 3
+TURNS = 100
+KEEP_LAST = 20
+
+
+def build_agent(checkpointer):
+    model = FakeChatModel(latency=0, responses=[
+        AIMessage(content="", tool_calls=[{"name": "Time", "args": {"__arg1": "now"}, "id": "call-time"}]),
+        "It is 10:00 AM, and here is a reasonably long answer so the messages have a realistic size.",
+    ])
+    tools = [Tool(name="Time", func=lambda *args, **kwargs: "10:00:00",
+                  description="Useful for when you need to know the current time.")]
+    return create_concurrent_react_agent(model, tools, checkpointer=checkpointer)
+
+
+def memory_saver_bytes(saver: MemorySaver) -> int:
+    """
+    Bytes of serialized data held by a `MemorySaver`: checkpoints, channel values and pending writes.
+    """
+    total = 0
+    for namespaces in saver.storage.values():
+        for checkpoints in namespaces.values():
+            for checkpoint, metadata, _ in checkpoints.values():
+                total += len(checkpoint[1]) + len(metadata[1])
+    for type_blob in getattr(saver, "blobs", {}).values():
+        total += len(type_blob[1] or b"")
+    for writes in saver.writes.values():
+        for write in writes.values():
+            total += len(write[2][1])
+    return total
+
+
+def run(saver) -> dict:
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    agent = build_agent(saver)
+    started_at = time.perf_counter()
+    for thread in range(THREADS):
+        config = {"configurable": {"thread_id": f"thread-{thread}"}}
+        for turn in range(TURNS):
+            agent.invoke({"messages": [HumanMessage(content=f"What time is it? (turn {turn})")]}, config)
+    if isinstance(saver, DeltaSqliteSaver):
+        saver.flush()
+    elapsed = time.perf_counter() - started_at
+    del agent
+    gc.collect()
+    retained = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+    return {"seconds": elapsed, "retained": retained}
+
+
+def main():
+    steps = THREADS * TURNS
+    with tempfile.TemporaryDirectory() as tmp:
+        memory_saver = MemorySaver()
+        memory = run(memory_saver)
+        memory_bytes = memory_saver_bytes(memory_saver)
+
+        path = os.path.join(tmp, "checkpoints.sqlite")
+        delta_saver = DeltaSqliteSaver(path, keep_last=KEEP_LAST)
+        delta = run(delta_saver)
+        stats = delta_saver.stats()
+        delta_saver.close()
+        db_size = sum(os.path.getsize(path + suffix) for suffix in ("", "-wal") if os.path.exists(path + suffix))
+
+        print(f"{THREADS} threads x {TURNS} turns ({steps * 4} messages), keep_last={KEEP_LAST}")
+        print(f"{'':>18} {'time':>8} {'serialized':>12} {'retained':>10} {'on disk':>10}")
+        print(f"{'MemorySaver':>18} {memory['seconds']:7.2f}s {memory_bytes / 1e6:10.2f}MB "
+              f"{memory['retained'] / 1e6:8.2f}MB {'-':>10}")
+        print(f"{'DeltaSqliteSaver':>18} {delta['seconds']:7.2f}s {stats['bytes_written'] / 1e6:10.2f}MB "
+              f"{delta['retained'] / 1e6:8.2f}MB {db_size / 1e6:8.2f}MB")
+        print(f"delta encoded values: {stats['delta_values']}, full: {stats['full_values']}, "
+              f"flushes: {stats['flushes']}, pruned checkpoints: {stats['pruned_checkpoints']}, "
+              f"collected values: {stats['collected_values']}")
+
+        # A new process: the latest state comes from disk in one indexed read
+        restarted = DeltaSqliteSaver(path, keep_last=KEEP_LAST)
+        config = {"configurable": {"thread_id": "thread-0"}}
+        started_at = time.perf_counter()
+        loaded = restarted.get_tuple(config)
+        load_ms = (time.perf_counter() - started_at) * 1000
+        expected = memory_saver.get_tuple(config).checkpoint["channel_values"]["messages"]
+        messages = loaded.checkpoint["channel_values"]["messages"]
+        assert [m.content for m in messages] == [m.content for m in expected], "states differ"
+        print(f"cold load of a {len(messages)} message thread: {load_ms:.1f}ms, same messages as MemorySaver")
+        restarted.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+"""
+Conversation Load Test
+
+Drives `AsyncConversation` with the session chat from
+`4_sessions/2_session_with_in_memory_chat.py`, backed by a `FakeChatModel`
+with a fixed latency. Every simulated user sends its messages one after
+another, and all users run concurrently. Reports throughput and latency
+percentiles at 1, 10 and 100 concurrent sessions.
+
+Run from the repository root:
+
+    python -m app.benchmarks.conversation_load
+"""
+
+import asyncio
+import time
+from typing import Dict, List
+
+import numpy as np
+from langchain_core.chat_history import BaseChatMessageHistory, InMemoryChatMessageHistory
+from langchain_core.output_parsers import StrOutputParser
+from langchain_core.prompts import ChatPromptTemplate, MessagesPlaceholder
+from langchain_core.runnables.history import RunnableWithMessageHistory
+
+from app.utils.conversation import AsyncConversation
+from app.utils.fake_models import FakeChatModel
+
+MODEL_LATENCY = 0.05
+MESSAGES_PER_SESSION = 10
+MAX_CONCURRENCY = 32
+SESSION_COUNTS = [1, 10, 100]
+
+
+def build_app(store: Dict[str, BaseChatMessageHistory]) -> RunnableWithMessageHistory:
+    prompt = ChatPromptTemplate.from_messages([
+        ('system', "You are a helpful assistant. Reply messages in {language}"),
+        MessagesPlaceholder(variable_name="history"),
+        ('user', '{query}'),
+    ])
+    chain = prompt | FakeChatModel(latency=MODEL_LATENCY) | StrOutputParser()
+
+    def get_session_history(session_id: str) -> BaseChatMessageHistory:
+        if session_id not in store:
+            store[session_id] = InMemoryChatMessageHistory()
+        return store[session_id]
+
+    return RunnableWithMessageHistory(chain, get_session_history,
+                                      input_messages_key="query", history_messages_key="history")
+
+
+async def simulate_user(conversation: AsyncConversation, session_id: str, latencies: List[float]) -> None:
+    for turn in range(MESSAGES_PER_SESSION):
+        started_at = time.perf_counter()
+        await conversation.ask(session_id, f"message {turn}")
+        latencies.append(time.perf_counter() - started_at)
+
+
+async def run(n_sessions: int) -> None:
+    store: Dict[str, BaseChatMessageHistory] = {}
+    app = build_app(store)
+
+    async def ask_with_session(session_id: str, query: str):
+        return await app.ainvoke({"language": "Indonesian", "query": query},
+                                 config={"configurable": {"session_id": session_id}})
+
+    conversation = AsyncConversation(ask_with_session, max_concurrency=MAX_CONCURRENCY)
+    latencies: List[float] = []
+    started_at = time.perf_counter()
+    await asyncio.gather(*(simulate_user(conversation, f"session-{i}", latencies) for i in range(n_sessions)))
+    elapsed = time.perf_counter() - started_at
+
+    # Per-session ordering must hold: every history alternates human and AI messages
+    for history in store.values():
+        contents = [message.content for message in history.messages]
+        assert contents[::2] == [f"message {turn}" for turn in range(MESSAGES_PER_SESSION)]
+
+    p50, p95, p99 = np.percentile(np.array(latencies) * 1000, [50, 95, 99])
+    print(f"{n_sessions:>9} {len(latencies) / elapsed:>10.1f} {p50:>8.1f}ms {p95:>8.1f}ms {p99:>8.1f}ms "
+          f"{max(latencies) * 1000:>8.1f}ms")
+
+
+def main():
+    print(f"model latency {MODEL_LATENCY * 1000:.0f}ms, {MESSAGES_PER_SESSION} messages per session, "
+          f"max_concurrency={MAX_CONCURRENCY}")
+    print(f"{'sessions':>9} {'msg/s':>10} {'p50':>10} {'p95':>10} {'p99':>10} {'max':>10}")
+    for n_sessions in SESSION_COUNTS:
+        asyncio.run(run(n_sessions))
+
+
+if __name__ == "__main__":
+    main()
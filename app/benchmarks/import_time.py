@@ -0,0 +1,102 @@
+"""
+Import Time Benchmark
+
+Cold start of our scripts and workers is mostly imports. This measures, in
+fresh interpreters, the wall time of importing what a script needs with the
+provider packages imported up front (as the scripts used to) and with the
+lazy registries of `app.utils.models`, where only the provider actually used
+is imported, on its first model:
+
+- the four chat model providers of `1_language_models/2_language_model_alternatives.py`
+  vs `app.utils.models`, and vs creating the first OpenAI model through it
+- Chroma and OpenAI vs the ingestion and RAG QA modules, which now import
+  them on first use
+
+Packages that are not installed are left out of the eager imports. Then the
+slowest imports of the RAG QA module are listed, from `python -X importtime`.
+
+Run from the repository root:
+
+    python -m app.benchmarks.import_time
+"""
+
+import importlib.util
+import os
+import statistics
+import subprocess
+import sys
+
+REPEATS = 5
+ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+PROVIDER_PACKAGES = ["langchain_openai", "langchain_anthropic", "langchain_google_genai", "langchain_fireworks"]
+
+
+def installed(packages):
+    return [package for package in packages if importlib.util.find_spec(package) is not None]
+
+
+def eager(packages):
+    return "; ".join(f"import {package}" for package in installed(packages))
+
+
+TARGETS = [
+    ("eager chat model providers", eager(PROVIDER_PACKAGES)),
+    ("app.utils.models", "import app.utils.models"),
+    ("models + first OpenAI model",
+     "from app.utils.models import create_chat_model; create_chat_model('openai:gpt-4o', api_key='sk-test')"),
+    ("eager Chroma + OpenAI", eager(["langchain_chroma", "langchain_openai"])),
+    ("app.utils.ingestion", "import app.utils.ingestion"),
+    ("5_rag/6_book_rag_qa", "import importlib; importlib.import_module('app.5_rag.6_book_rag_qa')"),
+]
+
+
+def cold_start(code: str) -> float:
+    """
+    Median seconds for a new interpreter to run `code`, interpreter start included.
+    """
+    timings = []
+    for _ in range(REPEATS):
+        result = subprocess.run(
+            [sys.executable, "-c", f"import time; t = time.perf_counter(); {code}; print(time.perf_counter() - t)"],
+            cwd=ROOT, capture_output=True, text=True, env={**os.environ, "PYTHONPATH": ROOT},
+        )
+        if result.returncode != 0:
+            raise RuntimeError(result.stderr.strip().splitlines()[-1])
+        timings.append(float(result.stdout.strip().splitlines()[-1]))
+    return statistics.median(timings)
+
+
+def slowest_imports(code: str, count: int = 10):
+    """
+    The top level packages taking the most import time, summing the self time of their modules from `-X importtime`.
+    """
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", code], cwd=ROOT, capture_output=True,
+                            text=True, env={**os.environ, "PYTHONPATH": ROOT})
+    packages = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        self_time, _, name = [part.strip() for part in line[len("import time:"):].split("|")]
+        package = name.split(".")[0]
+        packages[package] = packages.get(package, 0) + int(self_time)
+    return sorted(packages.items(), key=lambda item: -item[1])[:count]
+
+
+def main():
+    print(f"median of {REPEATS} fresh interpreters")
+    for label, code in TARGETS:
+        if not code:
+            print(f"{label:<30} (packages not installed)")
+            continue
+        try:
+            print(f"{label:<30} {cold_start(code) * 1000:8.0f}ms")
+        except RuntimeError as error:
+            print(f"{label:<30} failed: {error}")
+
+    print("\nslowest packages imported by 5_rag/6_book_rag_qa:")
+    for package, microseconds in slowest_imports(TARGETS[-1][1]):
+        print(f"  {package:<28} {microseconds / 1000:8.0f}ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,55 @@
+"""
+MMR Benchmark
+
+Compares LangChain's `maximal_marginal_relevance` with the vectorized one in
+`app.utils.mmr` on random text-embedding-3-small sized vectors, across the
+`fetch_k` values we want to use for the "mmr" retriever.
+
+Run from the repository root:
+
+    python -m app.benchmarks.mmr
+"""
+
+import time
+
+import numpy as np
+from langchain_community.vectorstores.utils import maximal_marginal_relevance as baseline_mmr
+
+from app.utils.mmr import maximal_marginal_relevance
+
+DIMENSIONS = 1536
+K = 10
+FETCH_KS = [20, 100, 200, 500, 1000]
+
+
+def best_of(fn, repeat: int = 5) -> float:
+    """
+    Return the fastest wall time of `repeat` runs, in seconds.
+    """
+    timings = []
+    for _ in range(repeat):
+        started_at = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - started_at)
+    return min(timings)
+
+
+def main():
+    rng = np.random.default_rng(0)
+    print(f"{'fetch_k':>8} {'baseline':>10} {'vectorized':>11} {'speedup':>8}")
+    for fetch_k in FETCH_KS:
+        query = rng.standard_normal(DIMENSIONS).astype(np.float32)
+        candidates = rng.standard_normal((fetch_k, DIMENSIONS)).astype(np.float32)
+
+        expected = baseline_mmr(query, candidates, lambda_mult=0.5, k=K)
+        if maximal_marginal_relevance(query, candidates, lambda_mult=0.5, k=K) != expected:
+            raise AssertionError(f"Vectorized MMR selected different candidates for fetch_k={fetch_k}")
+
+        baseline_time = best_of(lambda: baseline_mmr(query, candidates, lambda_mult=0.5, k=K))
+        vectorized_time = best_of(lambda: maximal_marginal_relevance(query, candidates, lambda_mult=0.5, k=K))
+        print(f"{fetch_k:>8} {baseline_time * 1000:>8.2f}ms {vectorized_time * 1000:>9.2f}ms "
+              f"{baseline_time / vectorized_time:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
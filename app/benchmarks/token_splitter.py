@@ -0,0 +1,61 @@
+"""
+Token Splitter Benchmark
+
+Compares `TokenTextSplitter` with `FastTokenTextSplitter` on the Romeo and
+Juliet source, for the encodings and chunk sizes used in the RAG chapter.
+
+Run from the repository root:
+
+    python -m app.benchmarks.token_splitter
+"""
+
+import os
+import time
+from typing import Callable, List
+
+from langchain.text_splitter import TokenTextSplitter
+from app.utils.text_splitters import FastTokenTextSplitter
+
+CASES = [
+    ("cl100k_base", 10, 2),
+    ("cl100k_base", 70, 10),
+    ("cl100k_base", 250, 0),
+    ("gpt2", 1000, 50),
+]
+
+
+def best_of(fn: Callable[[], List[str]], repeat: int = 5) -> float:
+    """
+    Return the fastest wall time of `repeat` runs, in seconds.
+    """
+    timings = []
+    for _ in range(repeat):
+        started_at = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - started_at)
+    return min(timings)
+
+
+def main():
+    current_dir = os.path.dirname(os.path.abspath(__file__))
+    file_path = os.path.join(current_dir, "..", "5_rag", "sources", "romeo_and_juliet.txt")
+    with open(file_path, encoding="utf-8") as f:
+        text = f.read()
+
+    print(f"{'encoding':<12} {'chunk':>6} {'overlap':>8} {'chunks':>7} {'baseline':>10} {'fast':>10} {'speedup':>8}")
+    for encoding_name, chunk_size, chunk_overlap in CASES:
+        baseline = TokenTextSplitter(encoding_name=encoding_name, chunk_size=chunk_size, chunk_overlap=chunk_overlap)
+        fast = FastTokenTextSplitter(encoding_name=encoding_name, chunk_size=chunk_size, chunk_overlap=chunk_overlap)
+
+        chunks = fast.split_text(text)
+        if chunks != baseline.split_text(text):
+            raise AssertionError(f"FastTokenTextSplitter differs from TokenTextSplitter for {encoding_name}")
+
+        baseline_time = best_of(lambda: baseline.split_text(text))
+        fast_time = best_of(lambda: fast.split_text(text))
+        print(f"{encoding_name:<12} {chunk_size:>6} {chunk_overlap:>8} {len(chunks):>7} "
+              f"{baseline_time * 1000:>8.1f}ms {fast_time * 1000:>8.1f}ms {baseline_time / fast_time:>7.2f}x")
+
+
+if __name__ == "__main__":
+    main()
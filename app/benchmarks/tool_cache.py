@@ -0,0 +1,137 @@
+"""
+Tool Cache Benchmark
+
+Exercises `ToolCache` with the tools of `6_tools_and_agents/4_browse_agent.py`,
+with a local stub standing in for the Wikipedia backend (fixed latency, call
+counter):
+
+- a skewed stream of lookups, repeated with different case and spacing
+- concurrent identical lookups from threads and from asyncio tasks, which
+  must reach the backend once
+- the Time tool, which must never be cached
+- a new cache on the same file, which must answer from disk
+
+Reports the backend calls, hit rates and time saved per tool.
+
+Run from the repository root:
+
+    python -m app.benchmarks.tool_cache
+"""
+
+import asyncio
+import datetime
+import os
+import random
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from langchain_core.tools import StructuredTool, Tool
+
+from app.utils.tool_cache import ToolCache
+
+BACKEND_LATENCY = 0.05
+LOOKUPS = 300
+TOPICS = [f"Topic {i}" for i in range(30)]
+CONCURRENT_CALLS = 16
+
+
+class StubWikipedia():
+    """
+    Stands in for `wikipedia.summary`: answers after `latency` seconds and counts calls.
+    """
+
+    def __init__(self, latency: float) -> None:
+        self.latency = latency
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    def summary(self, query: str, sentences: int = 2) -> str:
+        with self._lock:
+            self.calls += 1
+        time.sleep(self.latency)
+        return f"{query.strip()} is a topic. It has a summary of {sentences} sentences."
+
+    async def asummary(self, query: str) -> str:
+        with self._lock:
+            self.calls += 1
+        await asyncio.sleep(self.latency)
+        return f"{query.strip()} is a topic."
+
+
+def build_tools(backend: StubWikipedia):
+    return [
+        Tool(
+            name="Time",
+            func=lambda *args, **kwargs: datetime.datetime.now().strftime("%H:%M:%S.%f"),
+            description="Useful for when you need to know the current time.",
+        ),
+        Tool(
+            name="Wikipedia",
+            func=lambda query: backend.summary(query, sentences=2),
+            description="Useful for when you need to know information about a topic.",
+        ),
+        StructuredTool.from_function(
+            coroutine=backend.asummary,
+            name="AsyncWikipedia",
+            description="Async lookup of a topic.",
+        ),
+    ]
+
+
+def main():
+    rng = random.Random(0)
+    with tempfile.TemporaryDirectory() as tmp:
+        cache_path = os.path.join(tmp, "tool_cache.sqlite")
+        backend = StubWikipedia(BACKEND_LATENCY)
+        cache = ToolCache(cache_path=cache_path, ttls={"Time": 0, "Wikipedia": 24 * 3600})
+        time_tool, wikipedia, async_wikipedia = [cache.wrap(tool) for tool in build_tools(backend)]
+
+        # Skewed lookups, as an agent re-asking about the same few topics, with varying case and spacing
+        started_at = time.perf_counter()
+        for _ in range(LOOKUPS):
+            topic = TOPICS[min(int(rng.expovariate(0.2)), len(TOPICS) - 1)]
+            query = rng.choice([topic, topic.lower(), f"  {topic.upper()} "])
+            wikipedia.invoke(query)
+        elapsed = time.perf_counter() - started_at
+        print(f"{LOOKUPS} lookups in {elapsed:.2f}s with {backend.calls} backend calls "
+              f"(uncached: {LOOKUPS * BACKEND_LATENCY:.2f}s)")
+
+        # Identical concurrent lookups reach the backend once
+        calls_before = backend.calls
+        with ThreadPoolExecutor(max_workers=CONCURRENT_CALLS) as executor:
+            results = list(executor.map(lambda _: wikipedia.invoke("Concurrent topic"), range(CONCURRENT_CALLS)))
+        assert len(set(results)) == 1 and backend.calls == calls_before + 1, backend.calls - calls_before
+
+        async def concurrent_async():
+            return await asyncio.gather(*(async_wikipedia.ainvoke({"query": "Async topic"})
+                                          for _ in range(CONCURRENT_CALLS)))
+        calls_before = backend.calls
+        results = asyncio.run(concurrent_async())
+        assert len(set(results)) == 1 and backend.calls == calls_before + 1, backend.calls - calls_before
+        print(f"{CONCURRENT_CALLS} concurrent identical lookups, sync and async: 1 backend call each")
+
+        # The time is never cached
+        first = time_tool.invoke("")
+        time.sleep(0.001)
+        assert time_tool.invoke("") != first
+        print("Time tool: never cached")
+
+        for name, stats in cache.stats().items():
+            print(f"{name:>15}: hit rate {stats['hit_rate']:.0%}, {stats['memory_hits']} memory hits, "
+                  f"{stats['coalesced']} coalesced, {stats['misses']} misses, {stats['uncached']} uncached, "
+                  f"saved {stats['saved_seconds']:.2f}s")
+
+        # A new process reads the results back from disk
+        restarted = ToolCache(cache_path=cache_path, ttls={"Time": 0, "Wikipedia": 24 * 3600})
+        wikipedia = restarted.wrap(build_tools(backend)[1])
+        calls_before = backend.calls
+        for topic in TOPICS[:10]:
+            wikipedia.invoke(topic)
+        print(f"after restart: {restarted.stats()['Wikipedia']['disk_hits']} disk hits, "
+              f"{backend.calls - calls_before} backend calls for 10 known topics")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,101 @@
+"""
+Tool Calls Benchmark
+
+Times agent steps in which the model asks for three Wikipedia lookups and an
+async multiplication at once (stub tools with a fixed latency), with
+LangGraph's own `ToolNode` (`create_react_agent`) and with
+`ConcurrentToolNode` (`create_concurrent_react_agent`), through `invoke` and
+`ainvoke`. Both run the calls of a step concurrently, so a normal step takes
+about as long with either; what differs is:
+
+- a step where one lookup hangs: the stock node waits for it, ours gives up
+  after its timeout with an error message and keeps the other results, in
+  the order of the calls
+- the async-only multiplication under `invoke`, which the stock node cannot
+  run and answers with an error
+
+Run from the repository root:
+
+    python -m app.benchmarks.tool_calls
+"""
+
+import asyncio
+import time
+
+from langchain_core.messages import AIMessage, HumanMessage
+from langchain_core.tools import StructuredTool, Tool
+from langgraph.prebuilt import create_react_agent
+
+from app.utils.fake_models import FakeChatModel
+from app.utils.tool_execution import create_concurrent_react_agent
+
+TOOL_LATENCY = 0.2
+HANG_SECONDS = 3.0
+TIMEOUT = 1.0
+TOPICS = ["Python", "LangChain", "Jakarta"]
+HANGING_TOPICS = ["Python", "hang", "Jakarta"]
+
+
+def search_wikipedia(query: str) -> str:
+    time.sleep(HANG_SECONDS if query == "hang" else TOOL_LATENCY)
+    return f"{query} is a topic."
+
+
+async def amultiply(a: int, b: int) -> int:
+    """Multiply two numbers."""
+    await asyncio.sleep(TOOL_LATENCY)
+    return a * b
+
+
+TOOLS = [
+    Tool(name="Wikipedia", func=search_wikipedia, description="Looks up a topic."),
+    StructuredTool.from_function(coroutine=amultiply, name="Multiply", description="Multiply two numbers."),
+]
+
+
+def step(topics) -> AIMessage:
+    calls = [{"name": "Wikipedia", "args": {"__arg1": topic}, "id": f"call-{i}"} for i, topic in enumerate(topics)]
+    calls.append({"name": "Multiply", "args": {"a": 6, "b": 7}, "id": f"call-{len(topics)}"})
+    return AIMessage(content="", tool_calls=calls)
+
+
+def build_agent(concurrent: bool, topics):
+    model = FakeChatModel(latency=0.0, responses=[step(topics), "Done."])
+    if concurrent:
+        return create_concurrent_react_agent(model, TOOLS, timeouts={"Wikipedia": TIMEOUT})
+    return create_react_agent(model, TOOLS)
+
+
+def run(agent, use_async: bool):
+    """
+    Seconds for the step and its `ToolMessage`s.
+    """
+    inputs = {"messages": [HumanMessage(content="Tell me about these topics")]}
+    started_at = time.perf_counter()
+    result = asyncio.run(agent.ainvoke(inputs)) if use_async else agent.invoke(inputs)
+    elapsed = time.perf_counter() - started_at
+    return elapsed, [message for message in result["messages"] if message.type == "tool"]
+
+
+def errors(tool_messages) -> str:
+    failed = [message.name for message in tool_messages if message.status == "error"]
+    return ", ".join(failed) if failed else "-"
+
+
+def main():
+    print(f"one step: {len(TOPICS)} Wikipedia lookups + 1 async multiply, {TOOL_LATENCY * 1000:.0f}ms each; "
+          f"hanging lookup {HANG_SECONDS:.0f}s, timeout {TIMEOUT:.0f}s")
+    print(f"{'step':<20} {'node':<18} {'time':>8}  errors")
+    for use_async in (False, True):
+        mode = "ainvoke" if use_async else "invoke"
+        for label, topics in (("normal", TOPICS), ("one hanging", HANGING_TOPICS)):
+            for concurrent in (False, True):
+                elapsed, tool_messages = run(build_agent(concurrent, topics), use_async)
+                # Results keep the order of the calls
+                assert [message.tool_call_id for message in tool_messages] == [f"call-{i}" for i in range(4)]
+                node = "ConcurrentToolNode" if concurrent else "ToolNode"
+                print(f"{mode + ' ' + label:<20} {node:<18} {elapsed * 1000:6.0f}ms  {errors(tool_messages)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+"""
+Tracing Benchmark
+
+Measures what `Tracer` costs on the chains of the benchmark suite
+(`app/benchmarks/chains.py`), with a zero latency fake model so the
+overhead is not hidden behind model calls:
+
+- the time per invocation without callbacks, with the tracer, and with the
+  tracer not measuring payload sizes, and the resulting cost per span
+- that the ring buffer stays bounded over many requests
+
+It then prints the flame breakdown of one ReAct agent turn with a 20ms model.
+
+Run from the repository root:
+
+    python -m app.benchmarks.tracing
+"""
+
+import contextlib
+import io
+import tempfile
+import time
+
+from app.benchmarks.chains import SCENARIOS, close_scenario
+from app.utils.fake_models import FakeChatModel
+from app.utils.tracing import Tracer
+
+ITERATIONS = 300
+SCENARIO_NAMES = ["basic", "parallel", "branched", "react_agent", "graph_agent"]
+CAPACITY = 1000
+
+
+def time_invocations(name: str, callbacks) -> float:
+    """
+    Seconds per invocation of a fresh copy of the scenario, so agent threads start empty every time.
+    """
+    with tempfile.TemporaryDirectory() as tmp, contextlib.redirect_stdout(io.StringIO()):
+        chain, make_input, config_template = SCENARIOS[name](FakeChatModel(latency=0), tmp)
+        try:
+            return _time_invocations(chain, make_input, config_template, callbacks)
+        finally:
+            close_scenario(chain)
+
+
+def _time_invocations(chain, make_input, config_template, callbacks) -> float:
+    def config(i):
+        result = {"callbacks": callbacks}
+        if "configurable" in config_template:
+            result["configurable"] = config_template["configurable"](i)
+        return result
+
+    for i in range(5):
+        chain.invoke(make_input(-1 - i), config(-1 - i))
+    started_at = time.perf_counter()
+    for i in range(ITERATIONS):
+        chain.invoke(make_input(i), config(i))
+    return (time.perf_counter() - started_at) / ITERATIONS
+
+
+def main():
+    print(f"{'scenario':<12} {'no tracer':>10} {'tracer':>10} {'no payloads':>12} {'spans/op':>9} {'per span':>9}")
+    for name in SCENARIO_NAMES:
+        baseline = time_invocations(name, [])
+        tracer = Tracer(capacity=CAPACITY)
+        traced = time_invocations(name, [tracer])
+        light = time_invocations(name, [Tracer(measure_payloads=False)])
+        spans_per_op = tracer.recorded / (ITERATIONS + 5)
+        per_span_us = (traced - baseline) / spans_per_op * 1e6
+        print(f"{name:<12} {baseline * 1000:8.3f}ms {traced * 1000:8.3f}ms {light * 1000:10.3f}ms "
+              f"{spans_per_op:9.1f} {per_span_us:7.1f}µs")
+        assert len(tracer.spans) <= CAPACITY
+    print(f"ring buffer: {len(tracer.spans)} spans kept, {tracer.dropped} dropped")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        chain, make_input, _ = SCENARIOS["react_agent"](FakeChatModel(latency=0.02), tmp)
+        tracer = Tracer()
+        chain.invoke(make_input(0), {"callbacks": [tracer]})
+    print("\nReAct agent turn, 20ms model:")
+    print(tracer.flame())
+
+
+if __name__ == "__main__":
+    main()
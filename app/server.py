@@ -0,0 +1,148 @@
+#!/usr/bin/env python
+"""
+LangServe Server
+
+Serves the chains of the tutorial as REST routes, each with LangServe's
+`/invoke`, `/batch`, `/stream` (token streaming over server-sent events) and
+`/playground` endpoints:
+
+- `/translate`: the translation chain of `3_chains/1_basic_chain.py`
+- `/chat`: the session chat of `4_sessions/2_session_with_in_memory_chat.py`,
+  pass the session with `{"config": {"configurable": {"session_id": "..."}}}`
+- `/rag`: the Romeo and Juliet QA chain of `5_rag/6_book_rag_qa.py`
+
+All routes share one pooled HTTP client and one model instance per model name
+(`app.utils.models`). The RAG vector store is synced in a background thread
+started on startup, so the server accepts requests right away; RAG requests
+wait until it is ready and `/health` reports whether it is.
+
+Run from the repository root:
+
+    uvicorn app.server:app --port 8080
+"""
+
+import asyncio
+import importlib
+import os
+from concurrent.futures import Future, ThreadPoolExecutor
+from contextlib import asynccontextmanager
+from typing import Dict, Optional
+
+from dotenv import load_dotenv
+from fastapi import FastAPI
+from langchain_core.output_parsers import StrOutputParser
+from langchain_core.prompts import ChatPromptTemplate, MessagesPlaceholder
+from langchain_core.pydantic_v1 import BaseModel
+from langchain_core.runnables import Runnable, RunnableLambda
+from langchain_core.runnables.history import RunnableWithMessageHistory
+from langserve import add_routes
+
+from app.utils.models import aclose_clients, get_chat_model, get_embeddings
+from app.utils.session_store import SessionStore
+
+load_dotenv()
+
+RAG_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "5_rag")
+RAG_PERSIST_DIR = os.path.join(RAG_DIR, "db", "romeo_and_juliet_db")
+RAG_FILE_PATH = os.path.join(RAG_DIR, "sources", "romeo_and_juliet.txt")
+
+
+def create_translation_chain() -> Runnable:
+    prompt_template = ChatPromptTemplate.from_messages([
+        ('system', "Translate the following into {language}:"),
+        ('user', '{text}')
+    ])
+    return prompt_template | get_chat_model("gpt-4o") | StrOutputParser()
+
+
+class ChatInput(BaseModel):
+    language: str
+    query: str
+
+
+# Session
+store = SessionStore(max_sessions=10_000, idle_ttl=3600, max_memory_bytes=256 << 20, max_messages=20)
+
+def create_session_chain() -> Runnable:
+    prompt = ChatPromptTemplate.from_messages([
+        ('system', "You are a helpful assistant. Reply messages in {language}"),
+        MessagesPlaceholder(variable_name="history"),
+        ('user', '{query}')
+    ])
+    chain = prompt | get_chat_model("gpt-3.5-turbo") | StrOutputParser()
+    with_history = RunnableWithMessageHistory(chain, store.get_session_history,
+                                              input_messages_key="query", history_messages_key="history")
+    # The inferred schemas include message classes LangServe cannot render
+    return with_history.with_types(input_type=ChatInput, output_type=str)
+
+
+class DeferredRunnable():
+    """
+    Builds a runnable in a background thread and serves requests once it is ready.
+    """
+
+    def __init__(self, build) -> None:
+        self.build = build
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="deferred-runnable")
+        self._future: Optional[Future] = None
+
+    @property
+    def ready(self) -> bool:
+        return self._future is not None and self._future.done() and self._future.exception() is None
+
+    def start(self) -> None:
+        if self._future is None:
+            self._future = self._executor.submit(self.build)
+
+    def get(self) -> Runnable:
+        self.start()
+        return self._future.result()
+
+    async def aget(self) -> Runnable:
+        self.start()
+        return await asyncio.wrap_future(self._future)
+
+    def as_runnable(self, name: str) -> Runnable:
+        # Returning the built chain makes RunnableLambda invoke (or stream) it with the same input
+        return RunnableLambda(lambda _: self.get(), afunc=lambda _: self.aget(), name=name)
+
+
+def build_rag_chain() -> Runnable:
+    book_rag_qa = importlib.import_module("app.5_rag.6_book_rag_qa")
+    return book_rag_qa.create_rag_chain(RAG_PERSIST_DIR, RAG_FILE_PATH,
+                                        model=get_chat_model("gpt-3.5-turbo"), embeddings=get_embeddings())
+
+
+rag_chain = DeferredRunnable(build_rag_chain)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Start syncing the vector store without waiting for it
+    rag_chain.start()
+    yield
+    await aclose_clients()
+
+
+app = FastAPI(
+    title="Learn LangChain from Scratch",
+    version="1.0",
+    description="Tutorial chains served with LangServe",
+    lifespan=lifespan,
+)
+
+
+@app.get("/health")
+async def health() -> Dict[str, bool]:
+    return {"ok": True, "rag_ready": rag_chain.ready}
+
+
+add_routes(app, create_translation_chain(), path="/translate")
+add_routes(app, create_session_chain(), path="/chat")
+add_routes(app, rag_chain.as_runnable("RagQA").with_types(input_type=str, output_type=str), path="/rag")
+
+
+if __name__ == "__main__":
+    import uvicorn
+
+    uvicorn.run(app, host="0.0.0.0", port=8080)
@@ -0,0 +1,197 @@
+"""
+Answer Cache
+
+`AnswerCache.wrap(chain)` puts a cache in front of a question-answering chain
+such as the book RAG chains. Exact repeats are served from a normalized
+question key. With `embedding` and `similarity_threshold` set, a question whose
+embedding is close enough to a cached one is served too. Entries expire after
+`ttl` seconds, the least recently used entry is evicted when the cache is full,
+and everything is dropped when `version_fn` reports that the store changed.
+"""
+
+import asyncio
+import re
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, AsyncIterator, Callable, Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+from langchain_core.runnables import Runnable, RunnableConfig, RunnableLambda
+
+
+def normalize_question(question: str) -> str:
+    """
+    Lowercase, collapse whitespace and drop trailing punctuation.
+    """
+    return re.sub(r"\s+", " ", question).strip().lower().rstrip("?!. ")
+
+
+class AnswerCache():
+    """
+    TTL + LRU cache of answers keyed by normalized question, with optional semantic matching.
+    """
+
+    def __init__(self, max_entries: int = 1000, ttl: Optional[float] = 3600,
+                 embedding: Optional[Embeddings] = None, similarity_threshold: float = 0.95,
+                 version_fn: Optional[Callable[[], Any]] = None) -> None:
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.embedding = embedding
+        self.similarity_threshold = similarity_threshold
+        self.version_fn = version_fn
+        self.exact_hits = 0
+        self.semantic_hits = 0
+        self.misses = 0
+        # key -> (answer, created_at, row in the vector matrix)
+        self._entries: "OrderedDict[str, Tuple[Any, float, Optional[int]]]" = OrderedDict()
+        self._vectors: Optional[np.ndarray] = None
+        self._row_keys: List[Optional[str]] = [None] * max_entries
+        self._free_rows = list(range(max_entries - 1, -1, -1))
+        self._version = version_fn() if version_fn else None
+        self._lock = threading.Lock()
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "exact_hits": self.exact_hits,
+            "semantic_hits": self.semantic_hits,
+            "misses": self.misses,
+            "entries": len(self._entries),
+        }
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._row_keys = [None] * self.max_entries
+            self._free_rows = list(range(self.max_entries - 1, -1, -1))
+
+    def _check_version(self) -> None:
+        if self.version_fn is None:
+            return
+        version = self.version_fn()
+        if version != self._version:
+            self.clear()
+            self._version = version
+
+    def _expired(self, created_at: float) -> bool:
+        return self.ttl is not None and time.monotonic() - created_at > self.ttl
+
+    def _remove(self, key: str) -> None:
+        _, _, row = self._entries.pop(key)
+        if row is not None:
+            self._row_keys[row] = None
+            self._free_rows.append(row)
+
+    def _embed(self, question: str) -> np.ndarray:
+        vector = np.asarray(self.embedding.embed_query(question), dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm > 0 else vector
+
+    def _semantic_lookup(self, vector: np.ndarray) -> Optional[str]:
+        """
+        Return the key of the most similar cached question above the threshold.
+        """
+        if self._vectors is None or not self._entries:
+            return None
+        scores = self._vectors @ vector
+        occupied = np.fromiter((key is not None for key in self._row_keys), dtype=bool, count=self.max_entries)
+        scores[~occupied] = -np.inf
+        row = int(np.argmax(scores))
+        if scores[row] >= self.similarity_threshold:
+            return self._row_keys[row]
+        return None
+
+    def lookup(self, question: str) -> Tuple[Optional[Any], Optional[np.ndarray]]:
+        """
+        Return the cached answer for `question` (or None) and its embedding when one was computed.
+        """
+        self._check_version()
+        key = normalize_question(question)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and self._expired(entry[1]):
+                self._remove(key)
+                entry = None
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self.exact_hits += 1
+                return entry[0], None
+
+        if self.embedding is None:
+            with self._lock:
+                self.misses += 1
+            return None, None
+
+        vector = self._embed(question)
+        with self._lock:
+            similar_key = self._semantic_lookup(vector)
+            if similar_key is not None and self._expired(self._entries[similar_key][1]):
+                self._remove(similar_key)
+                similar_key = None
+            if similar_key is not None:
+                self._entries.move_to_end(similar_key)
+                self.semantic_hits += 1
+                return self._entries[similar_key][0], vector
+            self.misses += 1
+        return None, vector
+
+    def store(self, question: str, answer: Any, vector: Optional[np.ndarray] = None) -> None:
+        key = normalize_question(question)
+        if self.embedding is not None and vector is None:
+            vector = self._embed(question)
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            while len(self._entries) >= self.max_entries:
+                self._remove(next(iter(self._entries)))
+
+            row = None
+            if vector is not None:
+                if self._vectors is None:
+                    self._vectors = np.zeros((self.max_entries, len(vector)), dtype=np.float32)
+                row = self._free_rows.pop()
+                self._vectors[row] = vector
+                self._row_keys[row] = key
+            self._entries[key] = (answer, time.monotonic(), row)
+
+    async def alookup(self, question: str) -> Tuple[Optional[Any], Optional[np.ndarray]]:
+        """
+        `lookup` in a worker thread, so the embedding call and `version_fn` don't block the event loop.
+        """
+        return await asyncio.to_thread(self.lookup, question)
+
+    async def astore(self, question: str, answer: Any, vector: Optional[np.ndarray] = None) -> None:
+        await asyncio.to_thread(self.store, question, answer, vector)
+
+    def wrap(self, chain: Runnable) -> Runnable:
+        """
+        Return a runnable that answers from the cache and falls back to `chain` on a miss.
+
+        The runnable streams: a miss yields the chain's chunks as they arrive
+        and caches the combined answer once the stream is complete, a hit
+        yields the cached answer as a single chunk.
+        """
+        def stream(question: str, config: RunnableConfig) -> Iterator[Any]:
+            answer, vector = self.lookup(question)
+            if answer is not None:
+                yield answer
+                return
+            for chunk in chain.stream(question, config):
+                answer = chunk if answer is None else answer + chunk
+                yield chunk
+            if answer is not None:
+                self.store(question, answer, vector)
+
+        async def astream(question: str, config: RunnableConfig) -> AsyncIterator[Any]:
+            answer, vector = await self.alookup(question)
+            if answer is not None:
+                yield answer
+                return
+            async for chunk in chain.astream(question, config):
+                answer = chunk if answer is None else answer + chunk
+                yield chunk
+            if answer is not None:
+                await self.astore(question, answer, vector)
+
+        return RunnableLambda(stream, afunc=astream, name="AnswerCache")
@@ -0,0 +1,238 @@
+"""
+BM25 Index
+
+A persisted BM25 inverted index that lives next to the Chroma persist
+directory and is kept in sync by the ingestion pipeline. Postings are stored
+as compact CSR arrays (one int32 doc array and one int32 term-frequency array,
+sliced per term through an offsets array) and saved with `np.savez`.
+
+Top-k search is term-at-a-time with MaxScore-style early termination: terms
+are scored in decreasing order of their maximum possible contribution, and
+once the current top k can no longer be overtaken by any other document, the
+remaining terms only rescore those k documents.
+"""
+
+import json
+import os
+import re
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+INDEX_FILE = "index.npz"
+META_FILE = "index.json"
+
+TOKEN_PATTERN = re.compile(r"\w+")
+
+
+def tokenize(text: str) -> List[str]:
+    return TOKEN_PATTERN.findall(text.lower())
+
+
+class BM25Index():
+    """
+    Incrementally updatable BM25 index keyed by document id.
+
+    Additions and removals are buffered and merged into the CSR arrays on the
+    next search or save.
+    """
+
+    def __init__(self, directory: Optional[str] = None, k1: float = 1.5, b: float = 0.75) -> None:
+        self.directory = directory
+        self.k1 = k1
+        self.b = b
+        self.doc_ids: List[str] = []
+        self.terms: List[str] = []
+        self._doc_index: Dict[str, int] = {}
+        self._term_index: Dict[str, int] = {}
+        self._doc_lengths = np.zeros(0, dtype=np.int32)
+        self._offsets = np.zeros(1, dtype=np.int64)
+        self._postings_docs = np.zeros(0, dtype=np.int32)
+        self._postings_tfs = np.zeros(0, dtype=np.int32)
+        self._max_scores = np.zeros(0, dtype=np.float64)
+        # Buffered updates, merged by _compact()
+        self._pending: List[Tuple[int, Dict[int, int]]] = []
+        self._pending_lengths: List[int] = []
+        self._deleted: set = set()
+
+    def __len__(self) -> int:
+        return len(self._doc_index)
+
+    def __contains__(self, doc_id: str) -> bool:
+        return doc_id in self._doc_index
+
+    @property
+    def _dirty(self) -> bool:
+        return bool(self._pending or self._deleted)
+
+    def add(self, doc_id: str, text: str) -> None:
+        if doc_id in self._doc_index:
+            self.remove(doc_id)
+        counts: Dict[int, int] = {}
+        tokens = tokenize(text)
+        for token in tokens:
+            term = self._term_index.get(token)
+            if term is None:
+                term = self._term_index[token] = len(self.terms)
+                self.terms.append(token)
+            counts[term] = counts.get(term, 0) + 1
+
+        self._doc_index[doc_id] = len(self.doc_ids)
+        self.doc_ids.append(doc_id)
+        self._pending.append((self._doc_index[doc_id], counts))
+        self._pending_lengths.append(len(tokens))
+
+    def add_many(self, items: Iterable[Tuple[str, str]]) -> None:
+        for doc_id, text in items:
+            self.add(doc_id, text)
+
+    def remove(self, doc_id: str) -> None:
+        index = self._doc_index.pop(doc_id, None)
+        if index is not None:
+            self._deleted.add(index)
+
+    def _compact(self) -> None:
+        """
+        Merge buffered updates into fresh CSR arrays, dropping removed documents and unused terms.
+        """
+        if not self._dirty:
+            return
+        n_terms = len(self.terms)
+        base_terms = np.repeat(np.arange(len(self._offsets) - 1, dtype=np.int64), np.diff(self._offsets))
+        pending_terms = [term for _, counts in self._pending for term in counts]
+        pending_docs = [doc for doc, counts in self._pending for _ in counts]
+        pending_tfs = [tf for _, counts in self._pending for tf in counts.values()]
+        all_terms = np.concatenate((base_terms, np.asarray(pending_terms, dtype=np.int64)))
+        all_docs = np.concatenate((self._postings_docs, np.asarray(pending_docs, dtype=np.int32)))
+        all_tfs = np.concatenate((self._postings_tfs, np.asarray(pending_tfs, dtype=np.int32)))
+        doc_lengths = np.concatenate((self._doc_lengths, np.asarray(self._pending_lengths, dtype=np.int32)))
+
+        # Renumber the surviving documents densely, in insertion order
+        alive = np.ones(len(self.doc_ids), dtype=bool)
+        alive[list(self._deleted)] = False
+        new_doc_numbers = np.cumsum(alive) - 1
+        keep = alive[all_docs]
+        all_terms, all_docs, all_tfs = all_terms[keep], new_doc_numbers[all_docs[keep]].astype(np.int32), all_tfs[keep]
+        self.doc_ids = [doc_id for doc_id, is_alive in zip(self.doc_ids, alive) if is_alive]
+        self._doc_index = {doc_id: index for index, doc_id in enumerate(self.doc_ids)}
+        self._doc_lengths = doc_lengths[alive]
+
+        # Drop terms that no longer occur anywhere
+        used = np.zeros(n_terms, dtype=bool)
+        used[all_terms] = True
+        new_term_numbers = np.cumsum(used) - 1
+        all_terms = new_term_numbers[all_terms]
+        self.terms = [term for term, is_used in zip(self.terms, used) if is_used]
+        self._term_index = {term: index for index, term in enumerate(self.terms)}
+
+        order = np.lexsort((all_docs, all_terms))
+        all_terms, self._postings_docs, self._postings_tfs = all_terms[order], all_docs[order], all_tfs[order]
+        self._offsets = np.zeros(len(self.terms) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(all_terms, minlength=len(self.terms)), out=self._offsets[1:])
+        self._pending, self._pending_lengths, self._deleted = [], [], set()
+        self._update_max_scores()
+
+    def _idf(self, document_frequency: np.ndarray) -> np.ndarray:
+        n_docs = len(self.doc_ids)
+        return np.log(1.0 + (n_docs - document_frequency + 0.5) / (document_frequency + 0.5))
+
+    def _contributions(self, term: int, docs: np.ndarray, tfs: np.ndarray, average_length: float) -> np.ndarray:
+        document_frequency = self._offsets[term + 1] - self._offsets[term]
+        norm = self.k1 * (1 - self.b + self.b * self._doc_lengths[docs] / max(average_length, 1e-9))
+        return self._idf(np.float64(document_frequency)) * tfs * (self.k1 + 1) / (tfs + norm)
+
+    def _update_max_scores(self) -> None:
+        """
+        Precompute every term's highest contribution to any document, the bound used for early termination.
+        """
+        self._max_scores = np.zeros(len(self.terms), dtype=np.float64)
+        if not len(self._postings_docs):
+            return
+        average_length = float(self._doc_lengths.mean())
+        document_frequency = np.diff(self._offsets).astype(np.float64)
+        idf = np.repeat(self._idf(document_frequency), np.diff(self._offsets))
+        tfs = self._postings_tfs.astype(np.float64)
+        norm = self.k1 * (1 - self.b + self.b * self._doc_lengths[self._postings_docs] / max(average_length, 1e-9))
+        contributions = idf * tfs * (self.k1 + 1) / (tfs + norm)
+        non_empty = np.diff(self._offsets) > 0
+        self._max_scores[non_empty] = np.maximum.reduceat(contributions, self._offsets[:-1][non_empty])
+
+    def search(self, query: str, k: int = 4) -> List[Tuple[str, float]]:
+        """
+        Return up to `k` `(doc_id, score)` pairs, best first.
+        """
+        self._compact()
+        terms = sorted(
+            {self._term_index[token] for token in tokenize(query) if token in self._term_index},
+            key=lambda term: -self._max_scores[term],
+        )
+        if not terms or k <= 0:
+            return []
+
+        average_length = float(self._doc_lengths.mean())
+        scores = np.zeros(len(self.doc_ids), dtype=np.float64)
+        touched = np.zeros(len(self.doc_ids), dtype=bool)
+        remaining_bound = float(sum(self._max_scores[term] for term in terms))
+        top: Optional[np.ndarray] = None
+        for term in terms:
+            start, end = self._offsets[term], self._offsets[term + 1]
+            docs, tfs = self._postings_docs[start:end], self._postings_tfs[start:end].astype(np.float64)
+            remaining_bound -= float(self._max_scores[term])
+            if top is None:
+                scores[docs] += self._contributions(term, docs, tfs, average_length)
+                touched[docs] = True
+                candidates = np.flatnonzero(touched)
+                if len(candidates) > k:
+                    ranked = candidates[np.argpartition(-scores[candidates], k)]
+                    kth, next_best = scores[ranked[:k]].min(), scores[ranked[k]]
+                    # No document outside the current top k can catch up on the remaining terms
+                    if kth >= next_best + remaining_bound:
+                        top = ranked[:k]
+            else:
+                # Only rescore the top k: look them up in this term's sorted postings
+                positions = np.searchsorted(docs, top)
+                positions = np.minimum(positions, len(docs) - 1)
+                hit = docs[positions] == top
+                scores[top[hit]] += self._contributions(term, top[hit], tfs[positions[hit]], average_length)
+
+        candidates = top if top is not None else np.flatnonzero(touched)
+        candidates = candidates[np.argsort(-scores[candidates], kind="stable")][:k]
+        return [(self.doc_ids[i], float(scores[i])) for i in candidates]
+
+    def save(self, directory: Optional[str] = None) -> None:
+        directory = directory or self.directory
+        self._compact()
+        os.makedirs(directory, exist_ok=True)
+        np.savez(
+            os.path.join(directory, INDEX_FILE),
+            doc_lengths=self._doc_lengths,
+            offsets=self._offsets,
+            postings_docs=self._postings_docs,
+            postings_tfs=self._postings_tfs,
+            max_scores=self._max_scores,
+        )
+        with open(os.path.join(directory, META_FILE), "w", encoding="utf-8") as f:
+            json.dump({"k1": self.k1, "b": self.b, "doc_ids": self.doc_ids, "terms": self.terms}, f)
+
+    @classmethod
+    def load(cls, directory: str) -> "BM25Index":
+        """
+        Load the index saved in `directory`, or return an empty one bound to it.
+        """
+        meta_path = os.path.join(directory, META_FILE)
+        if not os.path.exists(meta_path):
+            return cls(directory)
+        with open(meta_path, "r", encoding="utf-8") as f:
+            meta = json.load(f)
+        index = cls(directory, k1=meta["k1"], b=meta["b"])
+        index.doc_ids = meta["doc_ids"]
+        index.terms = meta["terms"]
+        index._doc_index = {doc_id: i for i, doc_id in enumerate(index.doc_ids)}
+        index._term_index = {term: i for i, term in enumerate(index.terms)}
+        with np.load(os.path.join(directory, INDEX_FILE)) as arrays:
+            index._doc_lengths = arrays["doc_lengths"]
+            index._offsets = arrays["offsets"]
+            index._postings_docs = arrays["postings_docs"]
+            index._postings_tfs = arrays["postings_tfs"]
+            index._max_scores = arrays["max_scores"]
+        return index
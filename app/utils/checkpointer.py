@@ -0,0 +1,475 @@
+"""
+Checkpointer
+
+`DeltaSqliteSaver` is a LangGraph checkpointer backed by a SQLite file, to
+replace `MemorySaver` for agent threads that should survive restarts and
+grow for a long time:
+
+- list channels such as `messages` are delta encoded: a step stores only the
+  items it appended, pointing at the version it extends, instead of the whole
+  list again; other channel values (and lists that were edited rather than
+  appended to) are stored in full
+- a thread's state is loaded lazily, when the graph asks for it, with one
+  indexed recursive query that follows the deltas of every channel back to
+  their full value; the latest state of recently used threads is also kept in
+  memory, so the next turn usually needs no read at all
+- writes are buffered and flushed in one transaction every `batch_size`
+  operations, before every read, and at most `flush_interval` seconds after
+  the first buffered one; a crash can lose at most that window
+- only the `keep_last` most recent checkpoints of each thread are kept, and
+  channel values no remaining checkpoint needs are garbage collected
+"""
+
+import os
+import random
+import sqlite3
+import threading
+from collections import OrderedDict
+from typing import Any, AsyncIterator, Dict, Iterator, List, Optional, Sequence, Tuple
+
+from langchain_core.runnables import RunnableConfig
+from langgraph.checkpoint.base import (
+    BaseCheckpointSaver,
+    ChannelVersions,
+    Checkpoint,
+    CheckpointMetadata,
+    CheckpointTuple,
+    get_checkpoint_id,
+)
+
+try:
+    from langgraph.checkpoint.base import WRITES_IDX_MAP
+except ImportError:
+    # Older langgraph-checkpoint releases have no special write channels
+    WRITES_IDX_MAP: Dict[str, int] = {}
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS checkpoints (
+    thread_id TEXT NOT NULL,
+    checkpoint_ns TEXT NOT NULL DEFAULT '',
+    checkpoint_id TEXT NOT NULL,
+    parent_checkpoint_id TEXT,
+    type TEXT NOT NULL,
+    checkpoint BLOB NOT NULL,
+    metadata_type TEXT NOT NULL,
+    metadata BLOB NOT NULL,
+    PRIMARY KEY (thread_id, checkpoint_ns, checkpoint_id)
+);
+CREATE TABLE IF NOT EXISTS blobs (
+    thread_id TEXT NOT NULL,
+    checkpoint_ns TEXT NOT NULL DEFAULT '',
+    channel TEXT NOT NULL,
+    version TEXT NOT NULL,
+    kind TEXT NOT NULL,
+    base_version TEXT,
+    type TEXT NOT NULL,
+    blob BLOB,
+    PRIMARY KEY (thread_id, checkpoint_ns, channel, version)
+);
+CREATE TABLE IF NOT EXISTS writes (
+    thread_id TEXT NOT NULL,
+    checkpoint_ns TEXT NOT NULL DEFAULT '',
+    checkpoint_id TEXT NOT NULL,
+    task_id TEXT NOT NULL,
+    idx INTEGER NOT NULL,
+    channel TEXT NOT NULL,
+    type TEXT NOT NULL,
+    blob BLOB NOT NULL,
+    task_path TEXT NOT NULL DEFAULT '',
+    PRIMARY KEY (thread_id, checkpoint_ns, checkpoint_id, task_id, idx)
+);
+"""
+
+# Follows every requested (channel, version) back through its deltas to the full value
+LOAD_CHANNELS_QUERY = """
+WITH RECURSIVE chain(channel, kind, base_version, type, blob, depth) AS (
+    SELECT channel, kind, base_version, type, blob, 0 FROM blobs
+    WHERE thread_id = ? AND checkpoint_ns = ? AND (channel, version) IN (VALUES {placeholders})
+    UNION ALL
+    SELECT blobs.channel, blobs.kind, blobs.base_version, blobs.type, blobs.blob, chain.depth + 1
+    FROM chain JOIN blobs
+    ON blobs.thread_id = ? AND blobs.checkpoint_ns = ? AND blobs.channel = chain.channel
+       AND blobs.version = chain.base_version
+    WHERE chain.kind = 'append'
+)
+SELECT channel, kind, type, blob FROM chain ORDER BY channel, depth DESC
+"""
+
+ThreadKey = Tuple[str, str]
+
+
+def _extends(previous: List[Any], value: List[Any]) -> bool:
+    """
+    Whether `value` is `previous` with items appended. Unchanged items are usually the same objects.
+    """
+    return len(value) >= len(previous) and all(a is b or a == b for a, b in zip(previous, value))
+
+
+class DeltaSqliteSaver(BaseCheckpointSaver):
+    """
+    SQLite checkpointer storing appended list items instead of full snapshots, with batched writes and retention.
+
+    `keep_last=None` keeps every checkpoint.
+    """
+
+    def __init__(self, path: str, keep_last: Optional[int] = 20, batch_size: int = 64,
+                 flush_interval: float = 1.0, max_cached_threads: int = 128, serde: Any = None) -> None:
+        super().__init__(serde=serde)
+        self.path = path
+        self.keep_last = keep_last
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_cached_threads = max_cached_threads
+        self.bytes_written = 0
+        self.full_values = 0
+        self.delta_values = 0
+        self.flushes = 0
+        self.pruned_checkpoints = 0
+        self.collected_values = 0
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(SCHEMA)
+        self._lock = threading.RLock()
+        self._pending_checkpoints: List[tuple] = []
+        self._pending_blobs: List[tuple] = []
+        self._pending_writes: List[Tuple[bool, tuple]] = []
+        self._pending_threads: set = set()
+        self._timer: Optional[threading.Timer] = None
+        # Latest known value of every channel of recently used threads: {channel: (version, value)}
+        self._latest: "OrderedDict[ThreadKey, Dict[str, Tuple[str, Any]]]" = OrderedDict()
+        self._pruned_since_gc: Dict[ThreadKey, int] = {}
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "bytes_written": self.bytes_written,
+            "full_values": self.full_values,
+            "delta_values": self.delta_values,
+            "flushes": self.flushes,
+            "pruned_checkpoints": self.pruned_checkpoints,
+            "collected_values": self.collected_values,
+            "cached_threads": len(self._latest),
+        }
+
+    def _thread_cache(self, key: ThreadKey) -> Dict[str, Tuple[str, Any]]:
+        cache = self._latest.get(key)
+        if cache is None:
+            cache = self._latest[key] = {}
+        self._latest.move_to_end(key)
+        while len(self._latest) > self.max_cached_threads:
+            self._latest.popitem(last=False)
+        return cache
+
+    # Writing
+
+    def put(self, config: RunnableConfig, checkpoint: Checkpoint, metadata: CheckpointMetadata,
+            new_versions: ChannelVersions) -> RunnableConfig:
+        thread_id = config["configurable"]["thread_id"]
+        checkpoint_ns = config["configurable"].get("checkpoint_ns", "")
+        stored = checkpoint.copy()
+        values = stored.pop("channel_values")
+        with self._lock:
+            cache = self._thread_cache((thread_id, checkpoint_ns))
+            for channel, version in new_versions.items():
+                version = str(version)
+                if channel not in values:
+                    self._pending_blobs.append((thread_id, checkpoint_ns, channel, version, "empty", None, "empty", None))
+                    cache.pop(channel, None)
+                    continue
+                value = values[channel]
+                previous = cache.get(channel)
+                if (isinstance(value, list) and previous is not None and isinstance(previous[1], list)
+                        and _extends(previous[1], value)):
+                    type_, blob = self.serde.dumps_typed(value[len(previous[1]):])
+                    row = (thread_id, checkpoint_ns, channel, version, "append", previous[0], type_, blob)
+                    self.delta_values += 1
+                else:
+                    type_, blob = self.serde.dumps_typed(value)
+                    row = (thread_id, checkpoint_ns, channel, version, "full", None, type_, blob)
+                    self.full_values += 1
+                self._pending_blobs.append(row)
+                self.bytes_written += len(blob)
+                cache[channel] = (version, value)
+
+            type_, serialized = self.serde.dumps_typed(stored)
+            metadata_type, serialized_metadata = self.serde.dumps_typed(metadata)
+            self._pending_checkpoints.append((
+                thread_id, checkpoint_ns, checkpoint["id"], config["configurable"].get("checkpoint_id"),
+                type_, serialized, metadata_type, serialized_metadata,
+            ))
+            self.bytes_written += len(serialized) + len(serialized_metadata)
+            self._pending_threads.add((thread_id, checkpoint_ns))
+            self._buffered()
+        return {
+            "configurable": {
+                "thread_id": thread_id,
+                "checkpoint_ns": checkpoint_ns,
+                "checkpoint_id": checkpoint["id"],
+            }
+        }
+
+    def put_writes(self, config: RunnableConfig, writes: Sequence[Tuple[str, Any]], task_id: str,
+                   task_path: str = "") -> None:
+        thread_id = config["configurable"]["thread_id"]
+        checkpoint_ns = config["configurable"].get("checkpoint_ns", "")
+        checkpoint_id = config["configurable"]["checkpoint_id"]
+        # Special writes (errors, interrupts) replace earlier ones, regular writes are only stored once
+        replace = all(channel in WRITES_IDX_MAP for channel, _ in writes)
+        with self._lock:
+            for idx, (channel, value) in enumerate(writes):
+                type_, blob = self.serde.dumps_typed(value)
+                self._pending_writes.append((replace, (
+                    thread_id, checkpoint_ns, checkpoint_id, task_id, WRITES_IDX_MAP.get(channel, idx),
+                    channel, type_, blob, task_path,
+                )))
+                self.bytes_written += len(blob)
+            self._buffered()
+
+    def _buffered(self) -> None:
+        pending = len(self._pending_checkpoints) + len(self._pending_blobs) + len(self._pending_writes)
+        if pending >= self.batch_size:
+            self.flush()
+        elif self._timer is None and pending:
+            self._timer = threading.Timer(self.flush_interval, self.flush)
+            self._timer.daemon = True
+            self._timer.start()
+
+    def flush(self) -> None:
+        """
+        Write everything buffered in one transaction, then apply the retention policy to the threads written.
+        """
+        with self._lock:
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+            if not (self._pending_checkpoints or self._pending_blobs or self._pending_writes):
+                return
+            with self._conn:
+                self._conn.executemany("INSERT OR IGNORE INTO blobs VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                                       self._pending_blobs)
+                self._conn.executemany("INSERT OR REPLACE INTO checkpoints VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                                       self._pending_checkpoints)
+                self._conn.executemany("INSERT OR REPLACE INTO writes VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                                       [row for replace, row in self._pending_writes if replace])
+                self._conn.executemany("INSERT OR IGNORE INTO writes VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                                       [row for replace, row in self._pending_writes if not replace])
+                if self.keep_last is not None:
+                    for thread_id, checkpoint_ns in self._pending_threads:
+                        self._prune(thread_id, checkpoint_ns)
+            self._pending_checkpoints, self._pending_blobs, self._pending_writes = [], [], []
+            self._pending_threads = set()
+            self.flushes += 1
+
+    def _prune(self, thread_id: str, checkpoint_ns: str) -> None:
+        stale = [row[0] for row in self._conn.execute(
+            "SELECT checkpoint_id FROM checkpoints WHERE thread_id = ? AND checkpoint_ns = ? "
+            "ORDER BY checkpoint_id DESC LIMIT -1 OFFSET ?",
+            (thread_id, checkpoint_ns, self.keep_last),
+        )]
+        if not stale:
+            return
+        for start in range(0, len(stale), 500):
+            batch = stale[start:start + 500]
+            placeholders = ",".join("?" * len(batch))
+            for table in ("checkpoints", "writes"):
+                self._conn.execute(
+                    f"DELETE FROM {table} WHERE thread_id = ? AND checkpoint_ns = ? "
+                    f"AND checkpoint_id IN ({placeholders})",
+                    (thread_id, checkpoint_ns, *batch),
+                )
+        self.pruned_checkpoints += len(stale)
+        key = (thread_id, checkpoint_ns)
+        self._pruned_since_gc[key] = self._pruned_since_gc.get(key, 0) + len(stale)
+        # Collecting reads the thread's value headers, so it is amortized over keep_last pruned checkpoints
+        if self._pruned_since_gc[key] >= self.keep_last:
+            self._pruned_since_gc[key] = 0
+            self._collect(thread_id, checkpoint_ns)
+
+    def _collect(self, thread_id: str, checkpoint_ns: str) -> None:
+        """
+        Delete the channel values that neither a remaining checkpoint nor the cache can reach through deltas.
+        """
+        roots = set()
+        for type_, serialized in self._conn.execute(
+            "SELECT type, checkpoint FROM checkpoints WHERE thread_id = ? AND checkpoint_ns = ?",
+            (thread_id, checkpoint_ns),
+        ):
+            versions = self.serde.loads_typed((type_, serialized))["channel_versions"]
+            roots.update((channel, str(version)) for channel, version in versions.items())
+        roots.update((channel, version) for channel, (version, _) in
+                     self._latest.get((thread_id, checkpoint_ns), {}).items())
+        bases = {
+            (channel, version): base_version for channel, version, base_version in self._conn.execute(
+                "SELECT channel, version, base_version FROM blobs WHERE thread_id = ? AND checkpoint_ns = ?",
+                (thread_id, checkpoint_ns),
+            )
+        }
+        reachable = set()
+        for channel, version in roots:
+            while version is not None and (channel, version) not in reachable and (channel, version) in bases:
+                reachable.add((channel, version))
+                version = bases[(channel, version)]
+        unreachable = [key for key in bases if key not in reachable]
+        self._conn.executemany(
+            "DELETE FROM blobs WHERE thread_id = ? AND checkpoint_ns = ? AND channel = ? AND version = ?",
+            [(thread_id, checkpoint_ns, channel, version) for channel, version in unreachable],
+        )
+        self.collected_values += len(unreachable)
+
+    def get_next_version(self, current: Optional[str], channel: Any) -> str:
+        if current is None:
+            current_v = 0
+        elif isinstance(current, int):
+            current_v = current
+        else:
+            current_v = int(current.split(".")[0])
+        # Zero padded, so versions sort as strings
+        return f"{current_v + 1:032}.{random.random():016}"
+
+    # Reading
+
+    def _load_values(self, thread_id: str, checkpoint_ns: str, channel_versions: ChannelVersions) -> Dict[str, Any]:
+        versions = {channel: str(version) for channel, version in channel_versions.items()}
+        cache = self._latest.get((thread_id, checkpoint_ns), {})
+        values = {}
+        missing = []
+        for channel, version in versions.items():
+            cached = cache.get(channel)
+            if cached is not None and cached[0] == version:
+                values[channel] = cached[1]
+            else:
+                missing.append((channel, version))
+        if not missing:
+            return values
+
+        loaded: Dict[str, Any] = {}
+        query = LOAD_CHANNELS_QUERY.format(placeholders=",".join("(?, ?)" for _ in missing))
+        params = [thread_id, checkpoint_ns, *[item for pair in missing for item in pair], thread_id, checkpoint_ns]
+        for channel, kind, type_, blob in self._conn.execute(query, params):
+            if kind == "empty":
+                continue
+            value = self.serde.loads_typed((type_, blob))
+            if kind == "full":
+                # a fresh list the appends below can extend in place
+                loaded[channel] = list(value) if isinstance(value, list) else value
+            else:
+                loaded[channel].extend(value)
+        cache = self._thread_cache((thread_id, checkpoint_ns))
+        for channel, version in missing:
+            if channel in loaded:
+                values[channel] = loaded[channel]
+                current = cache.get(channel)
+                if current is None or current[0] < version:
+                    cache[channel] = (version, loaded[channel])
+        return values
+
+    def _tuple(self, thread_id: str, checkpoint_ns: str, row: tuple) -> CheckpointTuple:
+        checkpoint_id, parent_checkpoint_id, type_, serialized, metadata_type, serialized_metadata = row
+        checkpoint = self.serde.loads_typed((type_, serialized))
+        checkpoint["channel_values"] = self._load_values(thread_id, checkpoint_ns, checkpoint["channel_versions"])
+        pending_writes = [
+            (task_id, channel, self.serde.loads_typed((write_type, blob)))
+            for task_id, channel, write_type, blob in self._conn.execute(
+                "SELECT task_id, channel, type, blob FROM writes "
+                "WHERE thread_id = ? AND checkpoint_ns = ? AND checkpoint_id = ? ORDER BY task_id, idx",
+                (thread_id, checkpoint_ns, checkpoint_id),
+            )
+        ]
+        return CheckpointTuple(
+            config={"configurable": {
+                "thread_id": thread_id, "checkpoint_ns": checkpoint_ns, "checkpoint_id": checkpoint_id,
+            }},
+            checkpoint=checkpoint,
+            metadata=self.serde.loads_typed((metadata_type, serialized_metadata)),
+            parent_config={"configurable": {
+                "thread_id": thread_id, "checkpoint_ns": checkpoint_ns, "checkpoint_id": parent_checkpoint_id,
+            }} if parent_checkpoint_id else None,
+            pending_writes=pending_writes,
+        )
+
+    def get_tuple(self, config: RunnableConfig) -> Optional[CheckpointTuple]:
+        thread_id = config["configurable"]["thread_id"]
+        checkpoint_ns = config["configurable"].get("checkpoint_ns", "")
+        checkpoint_id = get_checkpoint_id(config)
+        with self._lock:
+            self.flush()
+            columns = "checkpoint_id, parent_checkpoint_id, type, checkpoint, metadata_type, metadata"
+            if checkpoint_id:
+                row = self._conn.execute(
+                    f"SELECT {columns} FROM checkpoints WHERE thread_id = ? AND checkpoint_ns = ? AND checkpoint_id = ?",
+                    (thread_id, checkpoint_ns, checkpoint_id),
+                ).fetchone()
+            else:
+                row = self._conn.execute(
+                    f"SELECT {columns} FROM checkpoints WHERE thread_id = ? AND checkpoint_ns = ? "
+                    "ORDER BY checkpoint_id DESC LIMIT 1",
+                    (thread_id, checkpoint_ns),
+                ).fetchone()
+            return self._tuple(thread_id, checkpoint_ns, row) if row is not None else None
+
+    def list(self, config: Optional[RunnableConfig], *, filter: Optional[Dict[str, Any]] = None,
+             before: Optional[RunnableConfig] = None, limit: Optional[int] = None) -> Iterator[CheckpointTuple]:
+        with self._lock:
+            self.flush()
+            query = ("SELECT thread_id, checkpoint_ns, checkpoint_id, parent_checkpoint_id, type, checkpoint, "
+                     "metadata_type, metadata FROM checkpoints")
+            conditions, params = [], []
+            if config is not None:
+                conditions.append("thread_id = ?")
+                params.append(config["configurable"]["thread_id"])
+                if config["configurable"].get("checkpoint_ns") is not None:
+                    conditions.append("checkpoint_ns = ?")
+                    params.append(config["configurable"]["checkpoint_ns"])
+            if before is not None and get_checkpoint_id(before):
+                conditions.append("checkpoint_id < ?")
+                params.append(get_checkpoint_id(before))
+            if conditions:
+                query += " WHERE " + " AND ".join(conditions)
+            rows = self._conn.execute(query + " ORDER BY checkpoint_id DESC", params).fetchall()
+        count = 0
+        for thread_id, checkpoint_ns, *row in rows:
+            if limit is not None and count >= limit:
+                return
+            if filter:
+                metadata = self.serde.loads_typed((row[4], row[5]))
+                if not all(metadata.get(key) == value for key, value in filter.items()):
+                    continue
+            with self._lock:
+                yield self._tuple(thread_id, checkpoint_ns, tuple(row))
+            count += 1
+
+    def delete_thread(self, thread_id: str) -> None:
+        with self._lock:
+            self.flush()
+            with self._conn:
+                for table in ("checkpoints", "blobs", "writes"):
+                    self._conn.execute(f"DELETE FROM {table} WHERE thread_id = ?", (thread_id,))
+            for key in [key for key in self._latest if key[0] == thread_id]:
+                del self._latest[key]
+
+    def close(self) -> None:
+        self.flush()
+        self._conn.close()
+
+    # Async versions, SQLite calls are short enough to run on the event loop like MemorySaver does
+
+    async def aget_tuple(self, config: RunnableConfig) -> Optional[CheckpointTuple]:
+        return self.get_tuple(config)
+
+    async def alist(self, config: Optional[RunnableConfig], *, filter: Optional[Dict[str, Any]] = None,
+                    before: Optional[RunnableConfig] = None, limit: Optional[int] = None
+                    ) -> AsyncIterator[CheckpointTuple]:
+        for item in self.list(config, filter=filter, before=before, limit=limit):
+            yield item
+
+    async def aput(self, config: RunnableConfig, checkpoint: Checkpoint, metadata: CheckpointMetadata,
+                   new_versions: ChannelVersions) -> RunnableConfig:
+        return self.put(config, checkpoint, metadata, new_versions)
+
+    async def aput_writes(self, config: RunnableConfig, writes: Sequence[Tuple[str, Any]], task_id: str,
+                          task_path: str = "") -> None:
+        self.put_writes(config, writes, task_id, task_path)
+
+    async def adelete_thread(self, thread_id: str) -> None:
+        self.delete_thread(thread_id)
@@ -1,12 +1,26 @@
-from typing import Callable
+import asyncio
+import inspect
+from typing import Any, Callable, Dict, Optional
+
+from app.utils.streaming import is_stream, render_stream
 
 class Conversation():
+    """
+    CLI chat loop over `ask_with_session(session_id, query)`.
+
+    `ask_with_session` may return the answer, or an iterator / async iterator
+    of chunks (e.g. `chain.stream(...)`), which is printed token by token.
+    With `show_timings` the time to the first token and the total time of
+    streamed answers are printed after them.
+    """
+
     def __init__(self, ask_with_session: Callable[[str, str], any], welcome_text: str = "Welcome to Bot App", 
-                 human_alias: str = 'You', ai_alias: str = 'AI') -> None:
+                 human_alias: str = 'You', ai_alias: str = 'AI', show_timings: bool = False) -> None:
         self.ask_with_session = ask_with_session
         self.welcome_text = welcome_text
         self.human_alias = human_alias
         self.ai_alias = ai_alias
+        self.show_timings = show_timings
     
     def chat(self):
         print("\n\n")
@@ -26,4 +40,111 @@ class Conversation():
                 # Get AI response using history
                 response = self.ask_with_session(session_id, query)
 
-                print(f"\n{self.ai_alias}: {response}")
\ No newline at end of file
+                if not is_stream(response):
+                    print(f"\n{self.ai_alias}: {response}")
+                    continue
+                # Streams are lazy, the chain only runs while its chunks are rendered
+                _, first_token, total = render_stream(response, prefix=f"\n{self.ai_alias}: ")
+                if self.show_timings:
+                    print(f"[first token {first_token * 1000:.0f}ms, total {total * 1000:.0f}ms]")
+
+
+class AsyncConversation():
+    """
+    Asyncio engine that serves messages for many sessions at once.
+
+    Messages of one session run one after another in the order they were
+    submitted, so its history stays consistent; different sessions run in
+    parallel, at most `max_concurrency` at a time. At most `max_pending`
+    messages are admitted (running or waiting), beyond that `submit` waits,
+    which pushes back on the producer instead of queueing without bound.
+
+    `ask_with_session` is typically an `async def` that awaits `app.ainvoke(...)`;
+    a plain function is run in a worker thread.
+    """
+
+    def __init__(self, ask_with_session: Callable[[str, str], Any], max_concurrency: int = 32,
+                 max_pending: int = 1000, welcome_text: str = "Welcome to Bot App",
+                 human_alias: str = 'You', ai_alias: str = 'AI') -> None:
+        self.ask_with_session = ask_with_session
+        self.max_concurrency = max_concurrency
+        self.max_pending = max_pending
+        self.welcome_text = welcome_text
+        self.human_alias = human_alias
+        self.ai_alias = ai_alias
+        self.completed = 0
+        self.failed = 0
+        self.pending = 0
+        self._is_async = inspect.iscoroutinefunction(ask_with_session)
+        self._workers = asyncio.Semaphore(max_concurrency)
+        self._admission = asyncio.Semaphore(max_pending)
+        # Last admitted message of every session with work in flight
+        self._tails: Dict[str, asyncio.Task] = {}
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "completed": self.completed,
+            "failed": self.failed,
+            "pending": self.pending,
+            "active_sessions": len(self._tails),
+        }
+
+    async def _call(self, session_id: str, query: str) -> Any:
+        if self._is_async:
+            return await self.ask_with_session(session_id, query)
+        result = await asyncio.to_thread(self.ask_with_session, session_id, query)
+        if inspect.isawaitable(result):
+            result = await result
+        return result
+
+    async def _run(self, session_id: str, query: str, previous: Optional[asyncio.Task]) -> Any:
+        if previous is not None:
+            # Wait for the session's previous message, whatever its outcome
+            await asyncio.wait([previous])
+        try:
+            async with self._workers:
+                response = await self._call(session_id, query)
+        except Exception:
+            self.failed += 1
+            raise
+        self.completed += 1
+        return response
+
+    def _finished(self, session_id: str, task: asyncio.Task) -> None:
+        self.pending -= 1
+        self._admission.release()
+        if self._tails.get(session_id) is task:
+            del self._tails[session_id]
+
+    async def submit(self, session_id: str, query: str) -> asyncio.Task:
+        """
+        Admit a message, waiting while `max_pending` messages are in flight, and return the task answering it.
+        """
+        await self._admission.acquire()
+        self.pending += 1
+        task = asyncio.create_task(self._run(session_id, query, self._tails.get(session_id)))
+        self._tails[session_id] = task
+        task.add_done_callback(lambda done: self._finished(session_id, done))
+        return task
+
+    async def ask(self, session_id: str, query: str) -> Any:
+        return await (await self.submit(session_id, query))
+
+    async def chat(self):
+        """
+        Async version of `Conversation.chat`, reading input without blocking the event loop.
+        """
+        print("\n\n")
+        print(self.welcome_text)
+        while True:
+            session_id = await asyncio.to_thread(input, "\nEnter Session ID: ")
+            if session_id.lower() == "exit":
+                print("\n--- App ended ---")
+                break
+            while True:
+                query = await asyncio.to_thread(input, f"\n{self.human_alias}: ")
+                if query.lower() == "exit":
+                    print("\n--- Session ended ---")
+                    break
+                response = await self.ask(session_id, query)
+                print(f"\n{self.ai_alias}: {response}")
@@ -0,0 +1,151 @@
+"""
+Embedding Cache
+
+`CachedEmbeddings` wraps any LangChain `Embeddings` (e.g. `OpenAIEmbeddings`)
+so the same text is never embedded twice. Vectors are kept in a SQLite file
+keyed by (model, sha256 of text), with a bounded in-memory LRU in front of it.
+
+Documents and queries share the cache, which assumes the wrapped model embeds
+a text the same way in `embed_documents` and `embed_query` (true for OpenAI).
+"""
+
+import hashlib
+import os
+import sqlite3
+import threading
+from array import array
+from collections import OrderedDict
+from typing import Dict, List, Optional
+
+from langchain_core.embeddings import Embeddings
+
+
+def _text_key(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def _to_blob(vector: List[float]) -> bytes:
+    return array("f", vector).tobytes()
+
+
+def _from_blob(blob: bytes) -> List[float]:
+    vector = array("f")
+    vector.frombytes(blob)
+    return vector.tolist()
+
+
+class CachedEmbeddings(Embeddings):
+    """
+    Embeddings wrapper backed by an LRU and a persistent SQLite store.
+
+    `hits` counts texts served from memory or disk, `misses` counts texts sent
+    to the wrapped model.
+    """
+
+    def __init__(self, embeddings: Embeddings, cache_path: Optional[str] = None,
+                 max_memory_items: int = 10_000, model: Optional[str] = None) -> None:
+        self.embeddings = embeddings
+        self.model = model or getattr(embeddings, "model", None) or type(embeddings).__name__
+        self.max_memory_items = max_memory_items
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self._memory: "OrderedDict[str, List[float]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._conn = None
+        if cache_path is not None:
+            os.makedirs(os.path.dirname(os.path.abspath(cache_path)), exist_ok=True)
+            self._conn = sqlite3.connect(cache_path, check_same_thread=False)
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS embeddings ("
+                "model TEXT NOT NULL, text_hash TEXT NOT NULL, vector BLOB NOT NULL, "
+                "PRIMARY KEY (model, text_hash))"
+            )
+            self._conn.commit()
+
+    @property
+    def hits(self) -> int:
+        return self.memory_hits + self.disk_hits
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "memory_hits": self.memory_hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "memory_items": len(self._memory),
+        }
+
+    def _remember(self, key: str, vector: List[float]) -> None:
+        self._memory[key] = vector
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_memory_items:
+            self._memory.popitem(last=False)
+
+    def _lookup(self, keys: List[str]) -> Dict[str, List[float]]:
+        """
+        Return the cached vectors for `keys`, checking memory first and then disk.
+        """
+        found = {}
+        with self._lock:
+            for key in keys:
+                if key in self._memory:
+                    self._memory.move_to_end(key)
+                    found[key] = self._memory[key]
+            self.memory_hits += len(found)
+
+            missing = [key for key in keys if key not in found]
+            if self._conn is not None and missing:
+                # Stay below SQLite's limit on bound parameters
+                for start in range(0, len(missing), 500):
+                    batch = missing[start:start + 500]
+                    placeholders = ",".join("?" * len(batch))
+                    rows = self._conn.execute(
+                        f"SELECT text_hash, vector FROM embeddings WHERE model = ? AND text_hash IN ({placeholders})",
+                        [self.model, *batch],
+                    ).fetchall()
+                    for key, blob in rows:
+                        vector = _from_blob(blob)
+                        found[key] = vector
+                        self._remember(key, vector)
+                    self.disk_hits += len(rows)
+        return found
+
+    def _store(self, vectors: Dict[str, List[float]]) -> None:
+        with self._lock:
+            self.misses += len(vectors)
+            for key, vector in vectors.items():
+                self._remember(key, vector)
+            if self._conn is not None:
+                self._conn.executemany(
+                    "INSERT OR REPLACE INTO embeddings (model, text_hash, vector) VALUES (?, ?, ?)",
+                    [(self.model, key, _to_blob(vector)) for key, vector in vectors.items()],
+                )
+                self._conn.commit()
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        keys = [_text_key(text) for text in texts]
+        # Ask the model once per distinct text, even when a batch repeats texts
+        unique_texts = dict(zip(keys, texts))
+        found = self._lookup(list(unique_texts))
+
+        missing = [key for key in unique_texts if key not in found]
+        if missing:
+            vectors = self.embeddings.embed_documents([unique_texts[key] for key in missing])
+            computed = dict(zip(missing, vectors))
+            self._store(computed)
+            found.update(computed)
+        return [found[key] for key in keys]
+
+    def embed_query(self, text: str) -> List[float]:
+        key = _text_key(text)
+        found = self._lookup([key])
+        if key not in found:
+            vector = self.embeddings.embed_query(text)
+            self._store({key: vector})
+            return vector
+        return found[key]
+
+    def close(self) -> None:
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
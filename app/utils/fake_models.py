@@ -0,0 +1,190 @@
+"""
+Fake Models
+
+Offline stand-ins for `ChatOpenAI` and `OpenAIEmbeddings` with a configurable
+latency and token rate, used by the load tests and benchmarks so they measure
+our own overhead and concurrency instead of the network. Their answers and
+vectors are deterministic, so runs can be compared. The sync path sleeps the thread, the async path
+awaits `asyncio.sleep`, like a real HTTP client would. With `max_in_flight`
+set, requests beyond that many at once fail with `FakeRateLimitError`, like an
+API answering HTTP 429, to exercise rate limit handling.
+"""
+
+import asyncio
+import json
+import re
+import threading
+import time
+import zlib
+from typing import Any, AsyncIterator, Iterator, List, Optional, Sequence, Union
+
+import numpy as np
+
+from langchain_core.callbacks import AsyncCallbackManagerForLLMRun, CallbackManagerForLLMRun
+from langchain_core.embeddings import Embeddings
+from langchain_core.language_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk, BaseMessage
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+from langchain_core.pydantic_v1 import PrivateAttr
+
+
+class FakeRateLimitError(Exception):
+    """
+    Raised by `FakeChatModel` over its `max_in_flight`, with the status code of `openai.RateLimitError`.
+    """
+
+    status_code = 429
+
+
+class FakeChatModel(BaseChatModel):
+    """
+    Chat model that answers after `latency` seconds, with `response` or an echo of the last message.
+
+    `responses` are answered in turn instead (strings or `AIMessage`s, e.g.
+    with `tool_calls` to drive an agent), cycling when exhausted. With
+    `tokens_per_second` set, the answer also takes one word per
+    `1 / tokens_per_second` seconds, and streams word by word after `latency`.
+    """
+
+    latency: float = 0.05
+    tokens_per_second: Optional[float] = None
+    response: Optional[str] = None
+    responses: List[Union[str, AIMessage]] = []
+    max_in_flight: Optional[int] = None
+    _in_flight: int = PrivateAttr(default=0)
+    _calls: int = PrivateAttr(default=0)
+    _lock: threading.Lock = PrivateAttr(default_factory=threading.Lock)
+
+    @property
+    def _llm_type(self) -> str:
+        return "fake-chat"
+
+    def bind_tools(self, tools: Sequence[Any], **kwargs: Any) -> "FakeChatModel":
+        # Tool calls come from `responses`, the tools themselves are not needed
+        return self
+
+    def _message(self, messages: List[BaseMessage]) -> AIMessage:
+        with self._lock:
+            call = self._calls
+            self._calls += 1
+        if self.responses:
+            response = self.responses[call % len(self.responses)]
+            return AIMessage(content=response) if isinstance(response, str) else response.copy()
+        content = self.response if self.response is not None else f"Echo: {messages[-1].content}"
+        return AIMessage(content=content)
+
+    def _tokens(self, message: AIMessage) -> List[str]:
+        return re.findall(r"\s*\S+", message.content) if isinstance(message.content, str) else []
+
+    def _generation_seconds(self, message: AIMessage) -> float:
+        if not self.tokens_per_second:
+            return self.latency
+        return self.latency + len(self._tokens(message)) / self.tokens_per_second
+
+    def _chunks(self, message: AIMessage) -> Iterator[ChatGenerationChunk]:
+        tokens = self._tokens(message) or [""]
+        for i, token in enumerate(tokens):
+            tool_call_chunks = [
+                {"name": call["name"], "args": json.dumps(call["args"]), "id": call["id"], "index": index}
+                for index, call in enumerate(message.tool_calls)
+            ] if i == len(tokens) - 1 else []
+            yield ChatGenerationChunk(message=AIMessageChunk(content=token, tool_call_chunks=tool_call_chunks))
+
+    def _enter(self) -> None:
+        with self._lock:
+            if self.max_in_flight is not None and self._in_flight >= self.max_in_flight:
+                raise FakeRateLimitError(f"Rate limit reached: {self.max_in_flight} requests in flight")
+            self._in_flight += 1
+
+    def _exit(self) -> None:
+        with self._lock:
+            self._in_flight -= 1
+
+    def _generate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                  run_manager: Optional[CallbackManagerForLLMRun] = None, **kwargs: Any) -> ChatResult:
+        message = self._message(messages)
+        self._enter()
+        try:
+            time.sleep(self._generation_seconds(message))
+        finally:
+            self._exit()
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+    async def _agenerate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                         run_manager: Optional[AsyncCallbackManagerForLLMRun] = None, **kwargs: Any) -> ChatResult:
+        message = self._message(messages)
+        self._enter()
+        try:
+            await asyncio.sleep(self._generation_seconds(message))
+        finally:
+            self._exit()
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+    def _stream(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                run_manager: Optional[CallbackManagerForLLMRun] = None, **kwargs: Any) -> Iterator[ChatGenerationChunk]:
+        message = self._message(messages)
+        self._enter()
+        try:
+            time.sleep(self.latency)
+            for chunk in self._chunks(message):
+                if self.tokens_per_second:
+                    time.sleep(1 / self.tokens_per_second)
+                if run_manager:
+                    run_manager.on_llm_new_token(chunk.text, chunk=chunk)
+                yield chunk
+        finally:
+            self._exit()
+
+    async def _astream(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                       run_manager: Optional[AsyncCallbackManagerForLLMRun] = None,
+                       **kwargs: Any) -> AsyncIterator[ChatGenerationChunk]:
+        message = self._message(messages)
+        self._enter()
+        try:
+            await asyncio.sleep(self.latency)
+            for chunk in self._chunks(message):
+                if self.tokens_per_second:
+                    await asyncio.sleep(1 / self.tokens_per_second)
+                if run_manager:
+                    await run_manager.on_llm_new_token(chunk.text, chunk=chunk)
+                yield chunk
+        finally:
+            self._exit()
+
+
+class FakeEmbeddings(Embeddings):
+    """
+    Deterministic offline embeddings: hashed bag of words, so texts sharing words are similar.
+
+    Every call takes `latency` seconds, like a request to an embedding API.
+    """
+
+    def __init__(self, size: int = 256, latency: float = 0.0) -> None:
+        self.size = size
+        self.latency = latency
+
+    def _embed(self, text: str) -> List[float]:
+        vector = np.zeros(self.size, dtype=np.float32)
+        for word in re.findall(r"\w+", text.lower()):
+            digest = zlib.crc32(word.encode("utf-8"))
+            vector[digest % self.size] += 1.0 if digest & 0x80000000 else -1.0
+        norm = np.linalg.norm(vector)
+        if norm == 0:
+            vector[0], norm = 1.0, 1.0
+        return (vector / norm).tolist()
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        time.sleep(self.latency)
+        return [self._embed(text) for text in texts]
+
+    def embed_query(self, text: str) -> List[float]:
+        time.sleep(self.latency)
+        return self._embed(text)
+
+    async def aembed_documents(self, texts: List[str]) -> List[List[float]]:
+        await asyncio.sleep(self.latency)
+        return [self._embed(text) for text in texts]
+
+    async def aembed_query(self, text: str) -> List[float]:
+        await asyncio.sleep(self.latency)
+        return self._embed(text)
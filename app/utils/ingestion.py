@@ -0,0 +1,283 @@
+"""
+Incremental Ingestion
+
+Keeps a Chroma vector store in sync with its source file. A manifest stored
+inside the persist directory records the hash of every ingested file and the
+content hash of every chunk, so a changed file only embeds its new chunks and
+deletes the stale ones instead of rebuilding the whole store.
+
+New chunks go through `embed_and_upsert`, which embeds them in fixed-size
+batches on a bounded thread pool and writes them to Chroma in bulk upserts.
+
+A BM25 index of the same chunks is kept in the `bm25` folder of the persist
+directory and updated in the same pass, for hybrid retrieval.
+"""
+
+import hashlib
+import json
+import os
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from itertools import islice
+from typing import TYPE_CHECKING, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+
+from app.utils.bm25 import BM25Index
+from app.utils.models import create_vector_store
+
+if TYPE_CHECKING:
+    from langchain_chroma import Chroma
+
+MANIFEST_FILE = "ingestion_manifest.json"
+LEXICAL_INDEX_DIR = "bm25"
+
+
+def hash_file(file_path: str, block_size: int = 1 << 20) -> str:
+    """
+    Return the sha256 hex digest of a file without reading it into memory at once.
+    """
+    digest = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        for block in iter(lambda: f.read(block_size), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def hash_document(doc: Document) -> str:
+    """
+    Return a content hash of a chunk, used as its id in the vector store.
+    """
+    payload = json.dumps(
+        {"content": doc.page_content, "metadata": doc.metadata},
+        sort_keys=True,
+        default=str,
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class IngestionManifest():
+    """
+    JSON manifest of ingested sources: file hash and chunk ids per source.
+    """
+
+    def __init__(self, persist_directory: str) -> None:
+        self.path = os.path.join(persist_directory, MANIFEST_FILE)
+        self.sources: Dict[str, Dict] = {}
+        if os.path.exists(self.path):
+            with open(self.path, "r", encoding="utf-8") as f:
+                self.sources = json.load(f).get("sources", {})
+
+    def __contains__(self, source: str) -> bool:
+        return source in self.sources
+
+    def get_file_hash(self, source: str) -> Optional[str]:
+        return self.sources.get(source, {}).get("sha256")
+
+    def get_chunk_ids(self, source: str) -> List[str]:
+        return list(self.sources.get(source, {}).get("chunk_ids", []))
+
+    def update(self, source: str, file_hash: str, chunk_ids: List[str]) -> None:
+        self.sources[source] = {"sha256": file_hash, "chunk_ids": chunk_ids}
+
+    def save(self) -> None:
+        """
+        Write the manifest atomically so a crash never leaves it half written.
+        """
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"sources": self.sources}, f)
+        os.replace(tmp_path, self.path)
+
+
+def manifest_version(persist_directory: str) -> Optional[int]:
+    """
+    Return a value that changes whenever the manifest is rewritten, i.e. whenever the store changed.
+    """
+    path = os.path.join(persist_directory, MANIFEST_FILE)
+    return os.stat(path).st_mtime_ns if os.path.exists(path) else None
+
+
+class IngestionStats():
+    """
+    Progress and throughput of one `embed_and_upsert` run.
+    """
+
+    def __init__(self) -> None:
+        self.started_at = time.perf_counter()
+        self.chunks = 0
+        self.batches = 0
+        self.upserts = 0
+        self.embedding_seconds = 0.0
+
+    @property
+    def elapsed(self) -> float:
+        return time.perf_counter() - self.started_at
+
+    @property
+    def chunks_per_second(self) -> float:
+        return self.chunks / self.elapsed if self.elapsed > 0 else 0.0
+
+    def __str__(self) -> str:
+        return (f"{self.chunks} chunks in {self.batches} batches, {self.upserts} upserts, "
+                f"{self.elapsed:.2f}s ({self.chunks_per_second:.1f} chunks/s)")
+
+
+def _batched(items: Iterable, size: int) -> Iterator[List]:
+    iterator = iter(items)
+    while batch := list(islice(iterator, size)):
+        yield batch
+
+
+def embed_and_upsert(db: "Chroma", chunks: Iterable[Tuple[str, Document]], batch_size: int = 64,
+                     max_workers: int = 4, upsert_size: int = 1024, verbose: bool = True) -> IngestionStats:
+    """
+    Embed `(id, document)` pairs in batches on a thread pool and upsert them into `db`.
+
+    At most `2 * max_workers` batches are in flight, so `chunks` is consumed
+    lazily and memory stays bounded however long the stream is. Embedded
+    batches are buffered and written with one upsert per `upsert_size` chunks.
+    """
+    embedding = db.embeddings
+    stats = IngestionStats()
+    pending_writes: List[Tuple[List[str], List[Document], List[List[float]]]] = []
+
+    def embed(batch: List[Tuple[str, Document]]):
+        started_at = time.perf_counter()
+        vectors = embedding.embed_documents([doc.page_content for _, doc in batch])
+        return batch, vectors, time.perf_counter() - started_at
+
+    def flush() -> None:
+        if not pending_writes:
+            return
+        ids = [chunk_id for batch_ids, _, _ in pending_writes for chunk_id in batch_ids]
+        docs = [doc for _, batch_docs, _ in pending_writes for doc in batch_docs]
+        vectors = [vector for _, _, batch_vectors in pending_writes for vector in batch_vectors]
+        db._collection.upsert(
+            ids=ids,
+            embeddings=vectors,
+            documents=[doc.page_content for doc in docs],
+            metadatas=[doc.metadata or None for doc in docs],
+        )
+        pending_writes.clear()
+        stats.upserts += 1
+
+    def collect(done) -> None:
+        for future in done:
+            batch, vectors, seconds = future.result()
+            pending_writes.append(([chunk_id for chunk_id, _ in batch], [doc for _, doc in batch], vectors))
+            stats.chunks += len(batch)
+            stats.batches += 1
+            stats.embedding_seconds += seconds
+        if sum(len(batch_ids) for batch_ids, _, _ in pending_writes) >= upsert_size:
+            flush()
+        if verbose:
+            print(f"Embedded {stats}")
+
+    # Chroma writes stay on this thread, only the embedding calls run in the pool
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        in_flight = set()
+        for batch in _batched(chunks, batch_size):
+            if len(in_flight) >= 2 * max_workers:
+                done, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+                collect(done)
+            in_flight.add(executor.submit(embed, batch))
+        while in_flight:
+            done, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+            collect(done)
+    flush()
+    if verbose and stats.chunks:
+        print(f"Finished embedding {stats}")
+    return stats
+
+
+def sync_documents(db: "Chroma", docs: Iterable[Document], previous_ids: List[str],
+                   batch_size: int = 64, max_workers: int = 4,
+                   lexical_index: Optional[BM25Index] = None) -> Tuple[List[str], List[str], List[str]]:
+    """
+    Make the store hold exactly `docs`, given the ids it held for them before.
+
+    `docs` may be a lazy iterator; new chunks are embedded while it is consumed.
+    When `lexical_index` is given it receives the same additions and removals.
+    Returns the current chunk ids, the ids that were added and the ids that were removed.
+    """
+    previous = set(previous_ids)
+    current_ids: List[str] = []
+    added: List[str] = []
+    seen = set()
+
+    def new_chunks() -> Iterator[Tuple[str, Document]]:
+        for doc in docs:
+            chunk_id = hash_document(doc)
+            if chunk_id in seen:
+                continue
+            seen.add(chunk_id)
+            current_ids.append(chunk_id)
+            if chunk_id not in previous:
+                added.append(chunk_id)
+                if lexical_index is not None:
+                    lexical_index.add(chunk_id, doc.page_content)
+                yield chunk_id, doc
+
+    embed_and_upsert(db, new_chunks(), batch_size=batch_size, max_workers=max_workers)
+
+    removed = sorted(previous.difference(seen))
+    if removed:
+        db.delete(ids=removed)
+        if lexical_index is not None:
+            for chunk_id in removed:
+                lexical_index.remove(chunk_id)
+    return current_ids, added, removed
+
+
+def sync_vector_store(file_path: str, load_documents: Callable[[str], Iterable[Document]],
+                      embedding: Embeddings, persist_directory: str,
+                      batch_size: int = 64, max_workers: int = 4) -> "Chroma":
+    """
+    Load the Chroma vector store and bring it up to date with `file_path`.
+
+    The file is only loaded and split when its hash differs from the one in
+    the manifest, and only new or changed chunks are embedded. The BM25 index
+    in `persist_directory/bm25` is updated alongside, or built from the stored
+    chunks when it is missing.
+    """
+    if not os.path.exists(file_path):
+        raise FileNotFoundError(f"The file {file_path} does not exist. Please check the path.")
+
+    manifest = IngestionManifest(persist_directory)
+    # langchain_chroma and chromadb are imported on this first use, not with this module
+    db = create_vector_store("chroma", persist_directory=persist_directory, embedding_function=embedding)
+    lexical_index = BM25Index.load(os.path.join(persist_directory, LEXICAL_INDEX_DIR))
+
+    if len(lexical_index) == 0:
+        # Stores ingested before the BM25 index existed, index what is already stored
+        stored = db.get(include=["documents"])
+        if stored["ids"]:
+            print("Building BM25 index from the stored chunks...")
+            lexical_index.add_many(zip(stored["ids"], stored["documents"]))
+            lexical_index.save()
+
+    file_hash = hash_file(file_path)
+    if manifest.get_file_hash(file_path) == file_hash:
+        print("Vector store is up to date. Loading vector store...")
+        return db
+
+    print("Source changed or not ingested yet. Syncing vector store...")
+    if file_path in manifest:
+        previous_ids = manifest.get_chunk_ids(file_path)
+    else:
+        # Stores created before the manifest existed use random ids, drop them once
+        previous_ids = db.get(where={"source": file_path}, include=[])["ids"]
+
+    docs = load_documents(file_path)
+    chunk_ids, added, removed = sync_documents(db, docs, previous_ids,
+                                               batch_size=batch_size, max_workers=max_workers,
+                                               lexical_index=lexical_index)
+    lexical_index.save()
+    manifest.update(file_path, file_hash, chunk_ids)
+    manifest.save()
+    print(f"\n--- Finished syncing vector store: {len(added)} added, {len(removed)} removed, "
+          f"{len(chunk_ids) - len(added)} unchanged ---")
+    return db
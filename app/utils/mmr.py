@@ -0,0 +1,52 @@
+"""
+Vectorized MMR
+
+Maximal marginal relevance as usually implemented recomputes the similarity of
+every candidate to the whole selected set in a Python loop, for every selected
+item. Here a running "max similarity to anything selected" vector is updated
+incrementally with one row of the candidate-candidate similarity matrix per
+selected item, so selecting k of n candidates is O(k * n) vectorized work.
+Only the k rows that are needed are computed, never the full n x n matrix.
+
+Selection order is identical to LangChain's `maximal_marginal_relevance`.
+"""
+
+from typing import List, Sequence, Union
+
+import numpy as np
+
+
+def _normalize(matrix: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(matrix, axis=-1, keepdims=True)
+    return matrix / np.where(norms > 0, norms, 1.0)
+
+
+def maximal_marginal_relevance(query_embedding: Union[np.ndarray, Sequence[float]],
+                               embedding_list: Union[np.ndarray, Sequence[Sequence[float]]],
+                               lambda_mult: float = 0.5, k: int = 4) -> List[int]:
+    """
+    Return the indices of `k` candidates chosen by maximal marginal relevance, in selection order.
+    """
+    candidates = np.asarray(embedding_list, dtype=np.float32)
+    n_candidates = len(candidates)
+    k = min(k, n_candidates)
+    if k <= 0:
+        return []
+
+    candidates = _normalize(candidates)
+    query = _normalize(np.asarray(query_embedding, dtype=np.float32).reshape(-1))
+    similarity_to_query = candidates @ query
+
+    selected = [int(np.argmax(similarity_to_query))]
+    max_similarity_to_selected = candidates @ candidates[selected[0]]
+    is_selected = np.zeros(n_candidates, dtype=bool)
+    is_selected[selected[0]] = True
+
+    while len(selected) < k:
+        scores = lambda_mult * similarity_to_query - (1 - lambda_mult) * max_similarity_to_selected
+        scores[is_selected] = -np.inf
+        best = int(np.argmax(scores))
+        selected.append(best)
+        is_selected[best] = True
+        np.maximum(max_similarity_to_selected, candidates @ candidates[best], out=max_similarity_to_selected)
+    return selected
@@ -0,0 +1,221 @@
+"""
+Shared Models
+
+Models, embeddings and vector stores are resolved by name, `"provider:name"`,
+through registries that import a provider's package only when the first
+object of that provider is created. Importing this module costs almost
+nothing, and a script or worker that only uses OpenAI never imports the
+Anthropic, Google or Chroma packages:
+
+    get_chat_model("openai:gpt-4o")
+    get_chat_model("anthropic:claude-3-opus-20240229")
+    get_embeddings("openai:text-embedding-3-small")
+    create_vector_store("chroma:romeo", embedding_function=..., persist_directory=...)
+
+A model name without a provider is an OpenAI one. New providers are added with
+`CHAT_MODELS.register(...)` (likewise `EMBEDDINGS`, `VECTOR_STORES`).
+
+Every script builds its own `ChatOpenAI`, which means its own HTTP client and
+connection pool. In a long-running process such as `app.server`, use
+`get_chat_model` and `get_embeddings` instead: they return one instance per
+model name, OpenAI ones all sharing one pooled sync and one pooled async HTTP
+client, so connections (and their TLS handshakes) are reused across routes and
+requests.
+"""
+
+import importlib
+import threading
+from typing import TYPE_CHECKING, Any, Callable, Dict, Optional, Tuple
+
+if TYPE_CHECKING:
+    import httpx
+    from langchain_core.embeddings import Embeddings
+    from langchain_core.language_models import BaseChatModel
+    from langchain_core.vectorstores import VectorStore
+
+HTTP_MAX_CONNECTIONS = 100
+HTTP_MAX_KEEPALIVE_CONNECTIONS = 20
+HTTP_TIMEOUT_SECONDS = 60.0
+HTTP_CONNECT_TIMEOUT_SECONDS = 5.0
+
+_lock = threading.Lock()
+_http_client: Optional["httpx.Client"] = None
+_http_async_client: Optional["httpx.AsyncClient"] = None
+_chat_models: Dict[str, "BaseChatModel"] = {}
+_embeddings: Dict[str, "Embeddings"] = {}
+
+
+def _httpx_options() -> Dict[str, Any]:
+    import httpx
+    return {
+        "limits": httpx.Limits(max_connections=HTTP_MAX_CONNECTIONS,
+                               max_keepalive_connections=HTTP_MAX_KEEPALIVE_CONNECTIONS),
+        "timeout": httpx.Timeout(HTTP_TIMEOUT_SECONDS, connect=HTTP_CONNECT_TIMEOUT_SECONDS),
+    }
+
+
+def get_http_client() -> "httpx.Client":
+    global _http_client
+    with _lock:
+        if _http_client is None:
+            import httpx
+            _http_client = httpx.Client(**_httpx_options())
+        return _http_client
+
+
+def get_http_async_client() -> "httpx.AsyncClient":
+    global _http_async_client
+    with _lock:
+        if _http_async_client is None:
+            import httpx
+            _http_async_client = httpx.AsyncClient(**_httpx_options())
+        return _http_async_client
+
+
+def _shared_http_clients() -> Dict[str, Any]:
+    return {"http_client": get_http_client(), "http_async_client": get_http_async_client()}
+
+
+class ProviderRegistry():
+    """
+    Classes of one kind of object (chat model, embeddings, vector store) by provider, imported on first use.
+
+    `name_arg` is the constructor argument the name of a spec goes to (None to
+    drop it), `defaults` returns extra constructor arguments, e.g. shared clients.
+    """
+
+    def __init__(self, kind: str, default_provider: Optional[str] = None) -> None:
+        self.kind = kind
+        self.default_provider = default_provider
+        self._providers: Dict[str, Tuple[str, str, Optional[str], Optional[Callable[[], Dict[str, Any]]]]] = {}
+        self._classes: Dict[str, Any] = {}
+
+    def register(self, provider: str, module: str, attribute: str, name_arg: Optional[str] = "model",
+                 defaults: Optional[Callable[[], Dict[str, Any]]] = None) -> None:
+        self._providers[provider] = (module, attribute, name_arg, defaults)
+        self._classes.pop(provider, None)
+
+    def providers(self) -> Dict[str, str]:
+        return {provider: f"{module}.{attribute}" for provider, (module, attribute, _, _) in self._providers.items()}
+
+    def parse(self, spec: str) -> Tuple[str, str]:
+        """
+        Split `"provider:name"`. A spec without a colon is a provider if one has that name, else a name of the default.
+        """
+        provider, separator, name = spec.partition(":")
+        if separator or spec in self._providers:
+            return provider, name
+        if self.default_provider is None:
+            raise ValueError(f"{self.kind.capitalize()} spec {spec!r} has no provider, use 'provider:name'")
+        return self.default_provider, spec
+
+    def resolve(self, provider: str) -> Any:
+        """
+        Import and return the class of `provider`.
+        """
+        cls = self._classes.get(provider)
+        if cls is not None:
+            return cls
+        if provider not in self._providers:
+            raise ValueError(f"Unknown {self.kind} provider {provider!r}, expected one of {sorted(self._providers)}")
+        module, attribute, _, _ = self._providers[provider]
+        try:
+            cls = getattr(importlib.import_module(module), attribute)
+        except ImportError as error:
+            raise ImportError(f"The {self.kind} provider {provider!r} needs the {module.split('.')[0]!r} "
+                              f"package: {error}") from error
+        self._classes[provider] = cls
+        return cls
+
+    def create(self, spec: str, **kwargs: Any) -> Any:
+        """
+        Create a new object for `spec`, e.g. `"anthropic:claude-3-opus-20240229"`, with `kwargs` passed on.
+        """
+        provider, name = self.parse(spec)
+        cls = self.resolve(provider)
+        _, _, name_arg, defaults = self._providers[provider]
+        arguments = defaults() if defaults is not None else {}
+        if name_arg is not None and name:
+            arguments[name_arg] = name
+        return cls(**{**arguments, **kwargs})
+
+
+CHAT_MODELS = ProviderRegistry("chat model", default_provider="openai")
+CHAT_MODELS.register("openai", "langchain_openai", "ChatOpenAI", defaults=_shared_http_clients)
+CHAT_MODELS.register("anthropic", "langchain_anthropic", "ChatAnthropic")
+CHAT_MODELS.register("google", "langchain_google_genai", "ChatGoogleGenerativeAI")
+CHAT_MODELS.register("fireworks", "langchain_fireworks", "ChatFireworks")
+CHAT_MODELS.register("fake", "app.utils.fake_models", "FakeChatModel", name_arg="response")
+
+EMBEDDINGS = ProviderRegistry("embeddings", default_provider="openai")
+EMBEDDINGS.register("openai", "langchain_openai", "OpenAIEmbeddings", defaults=_shared_http_clients)
+EMBEDDINGS.register("huggingface", "langchain_community.embeddings", "HuggingFaceEmbeddings", name_arg="model_name")
+EMBEDDINGS.register("fake", "app.utils.fake_models", "FakeEmbeddings", name_arg=None)
+
+VECTOR_STORES = ProviderRegistry("vector store")
+VECTOR_STORES.register("chroma", "langchain_chroma", "Chroma", name_arg="collection_name")
+VECTOR_STORES.register("pinecone", "langchain_pinecone", "PineconeVectorStore", name_arg="index_name")
+VECTOR_STORES.register("numpy", "app.utils.vector_stores", "NumpyVectorStore", name_arg=None)
+
+
+def get_chat_model(model: str) -> "BaseChatModel":
+    """
+    Return the shared chat model for `model` ("gpt-4o", "anthropic:claude-3-opus-20240229"...), created on first use.
+    """
+    key = ":".join(CHAT_MODELS.parse(model))
+    chat_model = _chat_models.get(key)
+    if chat_model is None:
+        chat_model = CHAT_MODELS.create(key)
+        with _lock:
+            chat_model = _chat_models.setdefault(key, chat_model)
+    return chat_model
+
+
+def get_embeddings(model: str = "text-embedding-3-small") -> "Embeddings":
+    """
+    Return the shared embeddings for `model`, created on first use.
+    """
+    key = ":".join(EMBEDDINGS.parse(model))
+    embeddings = _embeddings.get(key)
+    if embeddings is None:
+        embeddings = EMBEDDINGS.create(key)
+        with _lock:
+            embeddings = _embeddings.setdefault(key, embeddings)
+    return embeddings
+
+
+def create_chat_model(spec: str, **kwargs: Any) -> "BaseChatModel":
+    """
+    Create a new, unshared chat model for `spec`, e.g. with its own `temperature`.
+    """
+    return CHAT_MODELS.create(spec, **kwargs)
+
+
+def create_embeddings(spec: str, **kwargs: Any) -> "Embeddings":
+    """
+    Create new, unshared embeddings for `spec`.
+    """
+    return EMBEDDINGS.create(spec, **kwargs)
+
+
+def create_vector_store(spec: str, **kwargs: Any) -> "VectorStore":
+    """
+    Create a vector store for `spec`, e.g. `"chroma:<collection>"` with `embedding_function` and `persist_directory`.
+    """
+    return VECTOR_STORES.create(spec, **kwargs)
+
+
+async def aclose_clients() -> None:
+    """
+    Close the pooled HTTP clients, e.g. on server shutdown. Later calls create new ones.
+    """
+    global _http_client, _http_async_client
+    with _lock:
+        http_client, http_async_client = _http_client, _http_async_client
+        _http_client, _http_async_client = None, None
+        _chat_models.clear()
+        _embeddings.clear()
+    if http_client is not None:
+        http_client.close()
+    if http_async_client is not None:
+        await http_async_client.aclose()
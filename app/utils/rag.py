@@ -0,0 +1,218 @@
+"""
+RAG Chain Builder
+
+`create_parallel_rag_chain` replaces the `{"context": retriever, "question": RunnablePassthrough()}`
+map step of the book RAG scripts:
+
+- the question is sent to every retriever at once, each with a timeout, so a
+  slow store cannot stall the answer; whatever arrived in time is used
+- the documents are merged rank by rank, deduplicated, tagged with their
+  source and cut to a token budget, instead of stringifying `Document` lists
+- every invocation reports its `RagMetrics` (per-retriever latency, timeouts,
+  documents kept, context and prompt tokens) to `on_metrics`, and logs them at
+  debug level
+
+When some retrievers fail or time out the answer uses the others; when none
+of them answered, the chain raises `RetrievalError` rather than letting the
+model answer without context.
+"""
+
+import asyncio
+import logging
+import os
+import re
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+from typing import Callable, Dict, List, Optional, Sequence, Tuple, Union
+
+from langchain_core.documents import Document
+from langchain_core.language_models import BaseLanguageModel
+from langchain_core.prompt_values import PromptValue
+from langchain_core.prompts import BasePromptTemplate
+from langchain_core.runnables import Runnable, RunnableConfig, RunnableLambda
+
+logger = logging.getLogger(__name__)
+
+
+def approximate_tokens(text: str) -> int:
+    return len(text) // 4 + 1
+
+
+class RagMetrics():
+    """
+    What one invocation of a `create_parallel_rag_chain` chain retrieved and sent to the model.
+    """
+
+    def __init__(self) -> None:
+        self.retrieval_seconds: Dict[str, float] = {}
+        self.timed_out: List[str] = []
+        self.failed: List[str] = []
+        self.retrieved = 0
+        self.duplicates = 0
+        self.documents = 0
+        self.context_tokens = 0
+        self.prompt_tokens = 0
+        self.elapsed = 0.0
+
+    def __str__(self) -> str:
+        parts = [f"{name} {seconds * 1000:.0f}ms" for name, seconds in self.retrieval_seconds.items()]
+        if self.timed_out:
+            parts.append(f"timed out: {', '.join(self.timed_out)}")
+        if self.failed:
+            parts.append(f"failed: {', '.join(self.failed)}")
+        return (f"[retrieval {self.elapsed * 1000:.0f}ms ({', '.join(parts)}); "
+                f"{self.documents}/{self.retrieved} documents, {self.duplicates} duplicates; "
+                f"context {self.context_tokens} tokens, prompt {self.prompt_tokens} tokens]")
+
+
+class RetrievalError(RuntimeError):
+    """
+    Raised when every retriever of a `create_parallel_rag_chain` chain failed or timed out.
+    """
+
+    def __init__(self, metrics: RagMetrics) -> None:
+        super().__init__(f"No retriever answered: {metrics}")
+        self.metrics = metrics
+
+
+def _normalize_content(text: str) -> str:
+    return re.sub(r"\s+", " ", text).strip().lower()
+
+
+def _source_tag(doc: Document) -> str:
+    source = doc.metadata.get("source")
+    tag = os.path.basename(str(source)) if source else "unknown"
+    if "start_index" in doc.metadata:
+        tag += f"@{doc.metadata['start_index']}"
+    return tag
+
+
+def merge_documents(results: Sequence[List[Document]]) -> Tuple[List[Document], int]:
+    """
+    Interleave ranked lists rank by rank, dropping repeated content. Returns the documents and the duplicate count.
+    """
+    merged, seen, duplicates = [], set(), 0
+    for rank in range(max((len(docs) for docs in results), default=0)):
+        for docs in results:
+            if rank >= len(docs):
+                continue
+            key = _normalize_content(docs[rank].page_content)
+            if key in seen:
+                duplicates += 1
+                continue
+            seen.add(key)
+            merged.append(docs[rank])
+    return merged, duplicates
+
+
+def format_context(docs: Sequence[Document], max_tokens: Optional[int] = None,
+                   token_counter: Callable[[str], int] = approximate_tokens) -> Tuple[str, int]:
+    """
+    Format documents as numbered, source-tagged passages within `max_tokens`. Returns the text and passage count.
+
+    Passages that do not fit are skipped, except the first one, which is truncated.
+    """
+    passages, used = [], 0
+    for doc in docs:
+        content = re.sub(r"\s+", " ", doc.page_content).strip()
+        passage = f"[{len(passages) + 1}] ({_source_tag(doc)}) {content}"
+        tokens = token_counter(passage)
+        if max_tokens is not None and used + tokens > max_tokens:
+            if passages:
+                # Skip it, a shorter passage further down may still fit
+                continue
+            # Truncate the best passage rather than sending no context
+            passage = passage[:max(0, len(passage) * max_tokens // tokens)]
+            tokens = token_counter(passage)
+        passages.append(passage)
+        used += tokens
+    return "\n\n".join(passages), len(passages)
+
+
+def create_parallel_rag_chain(retrievers: Union[Runnable, Sequence[Runnable], Dict[str, Runnable]],
+                              prompt: BasePromptTemplate, model: BaseLanguageModel,
+                              max_context_tokens: Optional[int] = 1500, retriever_timeout: Optional[float] = 5.0,
+                              token_counter: Callable[[str], int] = approximate_tokens,
+                              on_metrics: Optional[Callable[[RagMetrics], None]] = None) -> Runnable:
+    """
+    Build `question -> prompt(context, question) -> model` with parallel retrieval and compact context.
+
+    `prompt` must take `context` and `question`. Retrievers that fail or take
+    longer than `retriever_timeout` seconds are skipped for that invocation,
+    and if that is all of them the invocation raises `RetrievalError`.
+    """
+    if isinstance(retrievers, Runnable):
+        retrievers = [retrievers]
+    if not isinstance(retrievers, dict):
+        retrievers = {f"retriever_{i}": retriever for i, retriever in enumerate(retrievers)}
+    names = list(retrievers)
+    executor = ThreadPoolExecutor(max_workers=max(len(names), 1) * 4, thread_name_prefix="rag-retrieval")
+
+    def timed_invoke(name: str, question: str, config: RunnableConfig) -> Tuple[List[Document], float]:
+        started_at = time.perf_counter()
+        docs = retrievers[name].invoke(question, config)
+        return docs, time.perf_counter() - started_at
+
+    async def timed_ainvoke(name: str, question: str, config: RunnableConfig) -> Tuple[List[Document], float]:
+        started_at = time.perf_counter()
+        docs = await retrievers[name].ainvoke(question, config)
+        return docs, time.perf_counter() - started_at
+
+    def assemble(question: str, results: Dict[str, Tuple[List[Document], float]],
+                 metrics: RagMetrics, errors: List[BaseException]) -> PromptValue:
+        if not results:
+            raise RetrievalError(metrics) from (errors[0] if errors else None)
+        for name in names:
+            if name in results:
+                metrics.retrieval_seconds[name] = results[name][1]
+        ranked = [results[name][0] for name in names if name in results]
+        metrics.retrieved = sum(len(docs) for docs in ranked)
+        docs, metrics.duplicates = merge_documents(ranked)
+        context, metrics.documents = format_context(docs, max_context_tokens, token_counter)
+        metrics.context_tokens = token_counter(context) if context else 0
+        prompt_value = prompt.invoke({"context": context, "question": question})
+        metrics.prompt_tokens = token_counter(prompt_value.to_string())
+        if metrics.failed or metrics.timed_out:
+            logger.warning("Answering without some retrievers: %s", metrics)
+        else:
+            logger.debug("%s", metrics)
+        if on_metrics is not None:
+            on_metrics(metrics)
+        return prompt_value
+
+    def retrieve(question: str, config: RunnableConfig) -> PromptValue:
+        metrics = RagMetrics()
+        started_at = time.perf_counter()
+        futures = {executor.submit(timed_invoke, name, question, config): name for name in names}
+        # Results are collected as they complete, stragglers past the timeout are left behind
+        done, not_done = wait(futures, timeout=retriever_timeout)
+        results, errors = {}, []
+        for future in done:
+            if future.exception() is not None:
+                metrics.failed.append(futures[future])
+                errors.append(future.exception())
+            else:
+                results[futures[future]] = future.result()
+        metrics.timed_out = [futures[future] for future in not_done]
+        metrics.elapsed = time.perf_counter() - started_at
+        return assemble(question, results, metrics, errors)
+
+    async def aretrieve(question: str, config: RunnableConfig) -> PromptValue:
+        metrics = RagMetrics()
+        started_at = time.perf_counter()
+        tasks = {asyncio.ensure_future(timed_ainvoke(name, question, config)): name for name in names}
+        done, not_done = await asyncio.wait(tasks, timeout=retriever_timeout)
+        for task in not_done:
+            task.cancel()
+        results, errors = {}, []
+        for task in done:
+            if task.exception() is not None:
+                metrics.failed.append(tasks[task])
+                errors.append(task.exception())
+            else:
+                results[tasks[task]] = task.result()
+        metrics.timed_out = [tasks[task] for task in not_done]
+        metrics.elapsed = time.perf_counter() - started_at
+        return assemble(question, results, metrics, errors)
+
+    return RunnableLambda(retrieve, afunc=aretrieve, name="RetrieveAndFormat") | model
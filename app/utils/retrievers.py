@@ -0,0 +1,216 @@
+"""
+Retrievers
+
+`create_retriever(db, search_type, search_kwargs)` is a drop-in for
+`db.as_retriever(...)` used by the RAG scripts. It accepts the same search
+types, and "mmr" is served by `VectorizedMMRRetriever`, which fetches the
+`fetch_k` nearest candidates with their embeddings in one query and re-ranks
+them with the vectorized MMR from `app.utils.mmr`. That keeps large
+`fetch_k` values (hundreds) cheap.
+
+`create_fast_history_aware_retriever` is a drop-in for LangChain's
+`create_history_aware_retriever` that skips the question-rewriting LLM call
+when the question is already self-contained, and otherwise retrieves for the
+raw question while the rewrite is running.
+
+"hybrid" is served by `HybridRetriever`, which fuses the vector results with
+the BM25 index kept by the ingestion pipeline using reciprocal rank fusion, so
+exact names ("Sangkuriang", "Dayang Sumbi") are found even with a small `k`.
+"""
+
+import re
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+from langchain_core.callbacks import CallbackManagerForRetrieverRun
+from langchain_core.documents import Document
+from langchain_core.language_models import BaseLanguageModel
+from langchain_core.output_parsers import StrOutputParser
+from langchain_core.prompts import BasePromptTemplate
+from langchain_core.retrievers import BaseRetriever
+from langchain_core.runnables import Runnable, RunnableBranch, RunnableConfig, RunnableLambda, RunnableParallel
+from langchain_core.vectorstores import VectorStore
+
+from app.utils.bm25 import BM25Index
+from app.utils.ingestion import hash_document
+from app.utils.mmr import maximal_marginal_relevance
+from app.utils.vector_stores import NumpyVectorStore
+
+
+def fetch_candidates(db: VectorStore, query_embedding: List[float], fetch_k: int,
+                     filter: Optional[Dict[str, Any]] = None) -> Tuple[List[Document], np.ndarray]:
+    """
+    Return the `fetch_k` nearest documents and their embeddings from a Chroma or NumPy store.
+    """
+    if isinstance(db, NumpyVectorStore):
+        return db.candidates_by_vector(query_embedding, fetch_k, filter=filter)
+
+    # Chroma: one query that returns the stored embeddings alongside the documents
+    results = db._collection.query(
+        query_embeddings=[query_embedding],
+        n_results=fetch_k,
+        where=filter,
+        include=["documents", "metadatas", "embeddings"],
+    )
+    docs = [
+        Document(page_content=text, metadata=metadata or {})
+        for text, metadata in zip(results["documents"][0], results["metadatas"][0])
+    ]
+    return docs, np.asarray(results["embeddings"][0], dtype=np.float32)
+
+
+class VectorizedMMRRetriever(BaseRetriever):
+    """
+    MMR retriever that re-ranks `fetch_k` candidates with `app.utils.mmr`.
+    """
+
+    vectorstore: VectorStore
+    k: int = 4
+    fetch_k: int = 20
+    lambda_mult: float = 0.5
+    filter: Optional[Dict[str, Any]] = None
+
+    class Config:
+        arbitrary_types_allowed = True
+
+    def _get_relevant_documents(self, query: str, *, run_manager: CallbackManagerForRetrieverRun) -> List[Document]:
+        query_embedding = self.vectorstore.embeddings.embed_query(query)
+        docs, embeddings = fetch_candidates(self.vectorstore, query_embedding, self.fetch_k, self.filter)
+        selected = maximal_marginal_relevance(query_embedding, embeddings, lambda_mult=self.lambda_mult, k=self.k)
+        return [docs[i] for i in selected]
+
+
+# Words that usually point back into the conversation ("what did she do then?")
+REFERRING_WORDS = frozenset("""
+    it its itself he him his himself she her hers herself they them their theirs themselves
+    this that these those there then former latter above previous earlier same else also too
+    another other others again one ones
+""".split())
+
+MIN_SELF_CONTAINED_WORDS = 4
+
+
+def is_self_contained(question: str) -> bool:
+    """
+    Cheap local check that a question can be understood without the chat history.
+
+    Short questions ("why?") and questions with pronouns or other referring
+    words are assumed to depend on the history.
+    """
+    words = re.findall(r"[a-z']+", question.lower())
+    return len(words) >= MIN_SELF_CONTAINED_WORDS and REFERRING_WORDS.isdisjoint(words)
+
+
+def _normalize_question(question: str) -> str:
+    return re.sub(r"\W+", " ", question).strip().lower()
+
+
+def create_fast_history_aware_retriever(llm: BaseLanguageModel, retriever: Runnable, prompt: BasePromptTemplate,
+                                        is_self_contained: Callable[[str], bool] = is_self_contained) -> Runnable:
+    """
+    Same as `create_history_aware_retriever`, without the rewrite round trip where it is not needed.
+
+    With no history, or a question `is_self_contained` accepts, the raw question
+    is retrieved directly. Otherwise the rewrite and a speculative retrieval
+    for the raw question run in parallel; the speculative documents are used
+    when the rewrite returns the question unchanged.
+    """
+    if "input" not in prompt.input_variables:
+        raise ValueError(f"Expected `input` to be a prompt variable, but got {prompt.input_variables}")
+
+    def retrieve_rewritten(results: Dict[str, Any], config: RunnableConfig) -> List[Document]:
+        if _normalize_question(results["question"]) == _normalize_question(results["input"]):
+            return results["speculative"]
+        return retriever.invoke(results["question"], config)
+
+    async def aretrieve_rewritten(results: Dict[str, Any], config: RunnableConfig) -> List[Document]:
+        if _normalize_question(results["question"]) == _normalize_question(results["input"]):
+            return results["speculative"]
+        return await retriever.ainvoke(results["question"], config)
+
+    rewrite_and_retrieve = RunnableParallel(
+        question=prompt | llm | StrOutputParser(),
+        speculative=(lambda x: x["input"]) | retriever,
+        input=lambda x: x["input"],
+    ) | RunnableLambda(retrieve_rewritten, afunc=aretrieve_rewritten)
+
+    return RunnableBranch(
+        (
+            lambda x: not x.get("chat_history", False) or is_self_contained(x["input"]),
+            (lambda x: x["input"]) | retriever,
+        ),
+        rewrite_and_retrieve,
+    ).with_config(run_name="chat_retriever_chain")
+
+
+def fetch_by_ids(db: VectorStore, ids: List[str]) -> Dict[str, Document]:
+    """
+    Return the stored documents for `ids` from a Chroma or NumPy store, keyed by id.
+    """
+    if not ids:
+        return {}
+    if isinstance(db, NumpyVectorStore):
+        # `get_by_ids` skips missing ids, so drop them first to keep ids and documents paired
+        found = [doc_id for doc_id in ids if doc_id in db._positions]
+        return dict(zip(found, db.get_by_ids(found)))
+
+    results = db.get(ids=ids, include=["documents", "metadatas"])
+    return {
+        doc_id: Document(page_content=text, metadata=metadata or {})
+        for doc_id, text, metadata in zip(results["ids"], results["documents"], results["metadatas"])
+    }
+
+
+def reciprocal_rank_fusion(rankings: List[List[str]], rrf_k: int = 60) -> List[str]:
+    """
+    Fuse several rankings of ids, scoring each id by the sum of 1 / (rrf_k + rank).
+    """
+    scores: Dict[str, float] = {}
+    for ranking in rankings:
+        for rank, doc_id in enumerate(ranking, start=1):
+            scores[doc_id] = scores.get(doc_id, 0.0) + 1.0 / (rrf_k + rank)
+    return sorted(scores, key=lambda doc_id: -scores[doc_id])
+
+
+class HybridRetriever(BaseRetriever):
+    """
+    Fuses `fetch_k` vector results and `fetch_k` BM25 results with reciprocal rank fusion.
+
+    Documents are matched by content hash, which is the id the ingestion
+    pipeline stores them under.
+    """
+
+    vectorstore: VectorStore
+    lexical_index: BM25Index
+    k: int = 4
+    fetch_k: int = 20
+    rrf_k: int = 60
+
+    class Config:
+        arbitrary_types_allowed = True
+
+    def _get_relevant_documents(self, query: str, *, run_manager: CallbackManagerForRetrieverRun) -> List[Document]:
+        docs = {hash_document(doc): doc for doc in self.vectorstore.similarity_search(query, k=self.fetch_k)}
+        lexical_ids = [doc_id for doc_id, _ in self.lexical_index.search(query, self.fetch_k)]
+        fused = reciprocal_rank_fusion([list(docs), lexical_ids], self.rrf_k)[:self.k]
+
+        # Only the lexical hits that the vector search missed need a lookup
+        docs.update(fetch_by_ids(self.vectorstore, [doc_id for doc_id in fused if doc_id not in docs]))
+        return [docs[doc_id] for doc_id in fused if doc_id in docs]
+
+
+def create_retriever(db: VectorStore, search_type: str = "similarity",
+                     search_kwargs: Optional[Dict[str, Any]] = None,
+                     lexical_index: Optional[BM25Index] = None) -> BaseRetriever:
+    """
+    Same as `db.as_retriever(search_type=..., search_kwargs=...)`, with "mmr" served by `VectorizedMMRRetriever`
+    and "hybrid" by `HybridRetriever`, which needs `lexical_index`.
+    """
+    search_kwargs = search_kwargs or {}
+    if search_type == "hybrid":
+        if lexical_index is None:
+            raise ValueError("search_type='hybrid' requires a lexical_index.")
+        return HybridRetriever(vectorstore=db, lexical_index=lexical_index, **search_kwargs)
+    if search_type == "mmr":
+        return VectorizedMMRRetriever(vectorstore=db, **search_kwargs)
+    return db.as_retriever(search_type=search_type, search_kwargs=search_kwargs)
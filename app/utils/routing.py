@@ -0,0 +1,270 @@
+"""
+Routing
+
+`FastPathRouter` picks the label a `RunnableBranch` routes on, e.g. the
+sentiment of a feedback in `3_chains/5_branched_chains.py`, without spending a
+model call on every input:
+
+- local classifiers are tried first, in order: `KeywordClassifier` (keyword
+  rules) and `CentroidClassifier` (cosine similarity to the centroid of a few
+  labelled examples per label); the first one at least `min_confidence` sure
+  decides
+- only when none is confident enough is the LLM classification chain called
+- every decision is cached per normalized input, so a repeated input costs
+  nothing
+- `aroute` classifies with `aclassify`, so the centroid classifier embeds
+  the input with `aembed_query` instead of blocking the event loop
+
+`stats()` reports, per route, how the decisions were made, the hit rate of
+the fast path and the model time it saved, estimated from the average
+latency of the model classifications actually made.
+"""
+
+import asyncio
+import math
+import re
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+from langchain_core.runnables import Runnable, RunnableConfig, RunnableLambda
+
+from app.utils.answer_cache import normalize_question
+
+Classification = Tuple[Optional[str], float]
+
+
+class KeywordClassifier():
+    """
+    Label by keyword rules. Confidence is the label's share of the matches times `1 - 0.5 ** matches`,
+    so a single keyword is never enough on its own and contradicting keywords lower it.
+    """
+
+    def __init__(self, rules: Dict[str, Sequence[str]]) -> None:
+        self.patterns = {
+            label: re.compile(r"\b(?:" + "|".join(re.escape(keyword.lower()) for keyword in keywords) + r")\b")
+            for label, keywords in rules.items()
+        }
+
+    def classify(self, text: str) -> Classification:
+        text = text.lower()
+        matches = {label: len(pattern.findall(text)) for label, pattern in self.patterns.items()}
+        total = sum(matches.values())
+        if total == 0:
+            return None, 0.0
+        label = max(matches, key=matches.get)
+        return label, matches[label] / total * (1 - 0.5 ** matches[label])
+
+    async def aclassify(self, text: str) -> Classification:
+        return self.classify(text)
+
+
+class CentroidClassifier():
+    """
+    Label by cosine similarity to the centroid of each label's example texts.
+
+    Confidence is the softmax of the similarities at `temperature`. The
+    examples are embedded once, on the first classification.
+    """
+
+    def __init__(self, embedding: Embeddings, examples: Dict[str, Sequence[str]], temperature: float = 0.05) -> None:
+        self.embedding = embedding
+        self.examples = examples
+        self.temperature = temperature
+        self.labels = list(examples)
+        self._centroids: Optional[np.ndarray] = None
+        self._lock = threading.Lock()
+
+    def _normalized(self, vectors: Any) -> np.ndarray:
+        vectors = np.asarray(vectors, dtype=np.float32)
+        norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+        return vectors / np.where(norms == 0, 1, norms)
+
+    def centroids(self) -> np.ndarray:
+        with self._lock:
+            if self._centroids is None:
+                texts = [text for label in self.labels for text in self.examples[label]]
+                vectors = self._normalized(self.embedding.embed_documents(texts))
+                centroids, start = [], 0
+                for label in self.labels:
+                    end = start + len(self.examples[label])
+                    centroids.append(vectors[start:end].mean(axis=0))
+                    start = end
+                self._centroids = self._normalized(centroids)
+            return self._centroids
+
+    def _classification(self, centroids: np.ndarray, vector: Any) -> Classification:
+        similarities = centroids @ self._normalized(vector)
+        weights = np.exp((similarities - similarities.max()) / self.temperature)
+        best = int(np.argmax(similarities))
+        return self.labels[best], float(weights[best] / weights.sum())
+
+    def classify(self, text: str) -> Classification:
+        return self._classification(self.centroids(), self.embedding.embed_query(text))
+
+    async def aclassify(self, text: str) -> Classification:
+        # The examples are embedded once, in a worker thread, then queries are embedded asynchronously
+        centroids = self._centroids if self._centroids is not None else await asyncio.to_thread(self.centroids)
+        return self._classification(centroids, await self.embedding.aembed_query(text))
+
+
+class RouteDecision():
+    def __init__(self, label: str, confidence: float, source: str) -> None:
+        self.label = label
+        self.confidence = confidence
+        self.source = source
+
+    def __repr__(self) -> str:
+        return f"RouteDecision(label={self.label!r}, confidence={self.confidence:.2f}, source={self.source!r})"
+
+
+class FastPathRouter():
+    """
+    Route inputs to one of `labels` with local classifiers first and `llm_classifier` as the fallback.
+
+    `llm_classifier` is a runnable taking the text and returning the model's
+    answer; the first label mentioned in it wins, like the substring checks of
+    a `RunnableBranch`, and `default_label` (the last label by default) is used
+    when it mentions none.
+    """
+
+    def __init__(self, labels: Sequence[str], llm_classifier: Runnable, classifiers: Sequence[Any] = (),
+                 min_confidence: float = 0.7, default_label: Optional[str] = None,
+                 max_entries: int = 10000) -> None:
+        self.labels = list(labels)
+        self.llm_classifier = llm_classifier
+        self.classifiers = list(classifiers)
+        self.min_confidence = min_confidence
+        self.default_label = default_label or self.labels[-1]
+        self.max_entries = max_entries
+        self._cache: "OrderedDict[str, RouteDecision]" = OrderedDict()
+        self._counts: Dict[str, Dict[str, int]] = {
+            label: {"cache": 0, "local": 0, "llm": 0} for label in self.labels
+        }
+        self.local_seconds = 0.0
+        self.llm_seconds = 0.0
+        self.llm_calls = 0
+        self._lock = threading.Lock()
+
+    def parse_label(self, answer: str) -> str:
+        answer = answer.lower()
+        positions = {label: answer.find(label.lower()) for label in self.labels}
+        found = {label: position for label, position in positions.items() if position >= 0}
+        return min(found, key=found.get) if found else self.default_label
+
+    def _cached(self, key: str) -> Optional[RouteDecision]:
+        with self._lock:
+            decision = self._cache.get(key)
+            if decision is not None:
+                self._cache.move_to_end(key)
+                self._counts[decision.label]["cache"] += 1
+            return decision
+
+    def _remember(self, key: str, decision: RouteDecision, seconds: float) -> None:
+        with self._lock:
+            self._counts[decision.label][decision.source] += 1
+            if decision.source == "llm":
+                self.llm_calls += 1
+                self.llm_seconds += seconds
+            self._cache[key] = decision
+            self._cache.move_to_end(key)
+            while len(self._cache) > self.max_entries:
+                self._cache.popitem(last=False)
+
+    def _classify_locally(self, text: str) -> Optional[RouteDecision]:
+        started_at = time.perf_counter()
+        try:
+            for classifier in self.classifiers:
+                label, confidence = classifier.classify(text)
+                if label is not None and confidence >= self.min_confidence:
+                    return RouteDecision(label, confidence, "local")
+            return None
+        finally:
+            with self._lock:
+                self.local_seconds += time.perf_counter() - started_at
+
+    async def _aclassify_locally(self, text: str) -> Optional[RouteDecision]:
+        started_at = time.perf_counter()
+        try:
+            for classifier in self.classifiers:
+                if hasattr(classifier, "aclassify"):
+                    label, confidence = await classifier.aclassify(text)
+                else:
+                    label, confidence = await asyncio.to_thread(classifier.classify, text)
+                if label is not None and confidence >= self.min_confidence:
+                    return RouteDecision(label, confidence, "local")
+            return None
+        finally:
+            with self._lock:
+                self.local_seconds += time.perf_counter() - started_at
+
+    def route(self, text: str, config: Optional[RunnableConfig] = None) -> RouteDecision:
+        key = normalize_question(text)
+        decision = self._cached(key)
+        if decision is not None:
+            return decision
+        decision = self._classify_locally(text)
+        if decision is not None:
+            self._remember(key, decision, 0.0)
+            return decision
+        started_at = time.perf_counter()
+        answer = self.llm_classifier.invoke(text, config)
+        decision = RouteDecision(self.parse_label(answer), 1.0, "llm")
+        self._remember(key, decision, time.perf_counter() - started_at)
+        return decision
+
+    async def aroute(self, text: str, config: Optional[RunnableConfig] = None) -> RouteDecision:
+        key = normalize_question(text)
+        decision = self._cached(key)
+        if decision is not None:
+            return decision
+        decision = await self._aclassify_locally(text)
+        if decision is not None:
+            self._remember(key, decision, 0.0)
+            return decision
+        started_at = time.perf_counter()
+        answer = await self.llm_classifier.ainvoke(text, config)
+        decision = RouteDecision(self.parse_label(answer), 1.0, "llm")
+        self._remember(key, decision, time.perf_counter() - started_at)
+        return decision
+
+    def as_runnable(self, input_key: str = "feedback", label_key: str = "label") -> Runnable:
+        """
+        Runnable adding the routed label under `label_key` to its input dict, ahead of a `RunnableBranch`.
+        """
+        def add_label(inputs: Dict[str, Any], config: RunnableConfig) -> Dict[str, Any]:
+            return {**inputs, label_key: self.route(inputs[input_key], config).label}
+
+        async def aadd_label(inputs: Dict[str, Any], config: RunnableConfig) -> Dict[str, Any]:
+            return {**inputs, label_key: (await self.aroute(inputs[input_key], config)).label}
+
+        return RunnableLambda(add_label, afunc=aadd_label, name="FastPathRouter")
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            llm_latency = self.llm_seconds / self.llm_calls if self.llm_calls else math.nan
+            routes = {}
+            for label, counts in self._counts.items():
+                requests = sum(counts.values())
+                fast = counts["cache"] + counts["local"]
+                routes[label] = {
+                    **counts,
+                    "requests": requests,
+                    "hit_rate": fast / requests if requests else 0.0,
+                    "saved_seconds": fast * llm_latency,
+                }
+            requests = sum(route["requests"] for route in routes.values())
+            fast = sum(route["cache"] + route["local"] for route in routes.values())
+            return {
+                "requests": requests,
+                "hit_rate": fast / requests if requests else 0.0,
+                "llm_calls": self.llm_calls,
+                "llm_latency_seconds": llm_latency,
+                "local_seconds": self.local_seconds,
+                # Model time avoided, minus what the local classifiers cost
+                "saved_seconds": fast * llm_latency - self.local_seconds,
+                "routes": routes,
+            }
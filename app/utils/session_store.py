@@ -0,0 +1,235 @@
+"""
+Session Store
+
+A drop-in replacement for the module-level `store` dict used with
+`RunnableWithMessageHistory`: pass `session_store.get_session_history` as the
+history factory. Sessions are evicted least recently used first, when idle
+for longer than `idle_ttl` seconds, and when all histories together exceed
+`max_memory_bytes`. With `spill_path`, evicted sessions are written to a
+SQLite file and reloaded transparently the next time they are used.
+
+The chain only sees a window of each history: the last `max_messages`
+messages and/or as many recent messages as fit in `max_tokens`, so prompt
+size and latency stop growing with the length of the conversation.
+"""
+
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Dict, List, Optional, Sequence
+
+from langchain_core.chat_history import BaseChatMessageHistory
+from langchain_core.messages import AIMessage, BaseMessage, messages_from_dict, messages_to_dict
+
+# Rough per-message overhead of a message object, on top of its content
+MESSAGE_OVERHEAD_BYTES = 200
+
+
+def approximate_token_count(messages: Sequence[BaseMessage]) -> int:
+    """
+    Cheap token estimate of about four characters per token, plus a few tokens of framing per message.
+    """
+    return sum(len(str(message.content)) // 4 + 4 for message in messages)
+
+
+def _message_bytes(messages: Sequence[BaseMessage]) -> int:
+    return sum(len(str(message.content)) + MESSAGE_OVERHEAD_BYTES for message in messages)
+
+
+class SessionHistory(BaseChatMessageHistory):
+    """
+    Chat history of one session. `messages` is the window the chain sees, `all_messages` the full history.
+    """
+
+    def __init__(self, session_id: str, store: "SessionStore",
+                 messages: Optional[List[BaseMessage]] = None) -> None:
+        self.session_id = session_id
+        self.all_messages: List[BaseMessage] = list(messages or [])
+        self.size_bytes = _message_bytes(self.all_messages)
+        self._store = store
+
+    @property
+    def messages(self) -> List[BaseMessage]:
+        return self._store.window(self.all_messages)
+
+    def add_messages(self, messages: Sequence[BaseMessage]) -> None:
+        self._store._add_messages(self, messages)
+
+    def clear(self) -> None:
+        self._store._clear(self)
+
+
+class SessionStore():
+    """
+    Bounded store of `SessionHistory` objects with LRU, idle-TTL and memory-cap eviction.
+    """
+
+    def __init__(self, max_sessions: int = 1000, idle_ttl: Optional[float] = 3600,
+                 max_memory_bytes: Optional[int] = 64 << 20, spill_path: Optional[str] = None,
+                 max_messages: Optional[int] = None, max_tokens: Optional[int] = None,
+                 token_counter: Callable[[Sequence[BaseMessage]], int] = approximate_token_count) -> None:
+        self.max_sessions = max_sessions
+        self.idle_ttl = idle_ttl
+        self.max_memory_bytes = max_memory_bytes
+        self.max_messages = max_messages
+        self.max_tokens = max_tokens
+        self.token_counter = token_counter
+        self.memory_bytes = 0
+        self.evictions = 0
+        self.reloads = 0
+        # Least recently used first
+        self._sessions: "OrderedDict[str, SessionHistory]" = OrderedDict()
+        self._last_used: Dict[str, float] = {}
+        self._lock = threading.RLock()
+        self._conn = None
+        if spill_path is not None:
+            os.makedirs(os.path.dirname(os.path.abspath(spill_path)), exist_ok=True)
+            self._conn = sqlite3.connect(spill_path, check_same_thread=False)
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS sessions (session_id TEXT PRIMARY KEY, messages TEXT NOT NULL)"
+            )
+            self._conn.commit()
+
+    def __len__(self) -> int:
+        return len(self._sessions)
+
+    def __contains__(self, session_id: str) -> bool:
+        return session_id in self._sessions
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "sessions": len(self._sessions),
+            "memory_bytes": self.memory_bytes,
+            "evictions": self.evictions,
+            "reloads": self.reloads,
+        }
+
+    def window(self, messages: List[BaseMessage]) -> List[BaseMessage]:
+        """
+        Return the most recent messages allowed by `max_messages` and `max_tokens`.
+        """
+        if self.max_messages is not None:
+            messages = messages[-self.max_messages:] if self.max_messages > 0 else []
+        if self.max_tokens is not None:
+            budget = self.max_tokens
+            start = len(messages)
+            while start > 0:
+                budget -= self.token_counter([messages[start - 1]])
+                if budget < 0:
+                    break
+                start -= 1
+            messages = messages[start:]
+        # Do not start the window in the middle of a turn
+        while messages and isinstance(messages[0], AIMessage):
+            messages = messages[1:]
+        return messages
+
+    def get_session_history(self, session_id: str) -> SessionHistory:
+        with self._lock:
+            self._evict_idle()
+            history = self._sessions.get(session_id)
+            if history is None:
+                history = SessionHistory(session_id, self, self._load(session_id))
+                self._admit(history)
+            else:
+                self._sessions.move_to_end(session_id)
+                self._last_used[session_id] = time.monotonic()
+            return history
+
+    def _admit(self, history: SessionHistory) -> None:
+        self._sessions[history.session_id] = history
+        self._last_used[history.session_id] = time.monotonic()
+        self.memory_bytes += history.size_bytes
+        self._evict_over_limits(keep=history.session_id)
+
+    def _current(self, history: SessionHistory) -> SessionHistory:
+        """
+        Return the admitted history for `history`'s session, re-admitting it if it was evicted while in use.
+        """
+        current = self._sessions.get(history.session_id)
+        if current is None:
+            self._admit(history)
+            return history
+        self._sessions.move_to_end(history.session_id)
+        self._last_used[history.session_id] = time.monotonic()
+        return current
+
+    def _add_messages(self, history: SessionHistory, messages: Sequence[BaseMessage]) -> None:
+        with self._lock:
+            # A stale object (evicted, then reloaded as a new one) forwards its messages to the current one
+            current = self._current(history)
+            size_bytes = _message_bytes(messages)
+            current.all_messages.extend(messages)
+            current.size_bytes += size_bytes
+            self.memory_bytes += size_bytes
+            self._evict_over_limits(keep=current.session_id)
+
+    def _clear(self, history: SessionHistory) -> None:
+        with self._lock:
+            current = self._current(history)
+            self.memory_bytes -= current.size_bytes
+            current.all_messages = []
+            current.size_bytes = 0
+
+    def _remove(self, session_id: str) -> SessionHistory:
+        history = self._sessions.pop(session_id)
+        del self._last_used[session_id]
+        self.memory_bytes -= history.size_bytes
+        return history
+
+    def _evict(self, session_id: str) -> None:
+        history = self._remove(session_id)
+        self.evictions += 1
+        self._spill(history)
+
+    def _evict_idle(self) -> None:
+        if self.idle_ttl is None:
+            return
+        deadline = time.monotonic() - self.idle_ttl
+        while self._sessions:
+            session_id = next(iter(self._sessions))
+            if self._last_used[session_id] > deadline:
+                break
+            self._evict(session_id)
+
+    def _evict_over_limits(self, keep: str) -> None:
+        while len(self._sessions) > 1 and (
+            len(self._sessions) > self.max_sessions
+            or (self.max_memory_bytes is not None and self.memory_bytes > self.max_memory_bytes)
+        ):
+            session_id = next(iter(self._sessions))
+            if session_id == keep:
+                break
+            self._evict(session_id)
+
+    def _spill(self, history: SessionHistory) -> None:
+        if self._conn is None:
+            return
+        self._conn.execute(
+            "INSERT OR REPLACE INTO sessions (session_id, messages) VALUES (?, ?)",
+            (history.session_id, json.dumps(messages_to_dict(history.all_messages))),
+        )
+        self._conn.commit()
+
+    def _load(self, session_id: str) -> List[BaseMessage]:
+        if self._conn is None:
+            return []
+        row = self._conn.execute("SELECT messages FROM sessions WHERE session_id = ?", (session_id,)).fetchone()
+        if row is None:
+            return []
+        self.reloads += 1
+        return messages_from_dict(json.loads(row[0]))
+
+    def close(self) -> None:
+        """
+        Spill every session still in memory and close the SQLite file.
+        """
+        with self._lock:
+            for history in self._sessions.values():
+                self._spill(history)
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
@@ -0,0 +1,175 @@
+"""
+Streaming
+
+Helpers to show answers token by token instead of after the full completion:
+
+- `render_stream` prints chunks (strings or message chunks) as they arrive
+  and returns the full text with the time to first token and total time
+- `iter_async` consumes an async iterator from synchronous code, e.g. a
+  `Conversation` whose `ask_with_session` returns `chain.astream(...)`. Every
+  call runs on the same event loop, so async clients created on the first
+  turn (e.g. the connection pool of a module-level `ChatOpenAI`) still work
+  on the next ones
+- `astream_agent_answer` streams only the final answer of a ReAct
+  `AgentExecutor`, skipping its thoughts, actions and tool calls
+- `astream_graph_answer` streams what the model of one node of a LangGraph
+  agent writes, skipping tool calls and tool results
+"""
+
+import asyncio
+import queue
+import sys
+import threading
+import time
+from typing import Any, AsyncIterator, Dict, Iterable, Iterator, Optional, Tuple, Union
+
+from langchain_core.messages import BaseMessage
+from langchain_core.runnables import Runnable, RunnableConfig
+
+FINAL_ANSWER_MARKER = "Final Answer:"
+
+_DONE = object()
+
+_loop: Optional[asyncio.AbstractEventLoop] = None
+_loop_lock = threading.Lock()
+
+
+def chunk_text(chunk: Any) -> str:
+    if isinstance(chunk, BaseMessage):
+        return chunk.content if isinstance(chunk.content, str) else ""
+    return chunk if isinstance(chunk, str) else str(chunk)
+
+
+def is_stream(response: Any) -> bool:
+    """
+    Whether `response` is an iterator or async iterator of chunks rather than a complete answer.
+    """
+    if isinstance(response, (str, bytes, dict, BaseMessage)):
+        return False
+    return hasattr(response, "__anext__") or hasattr(response, "__next__")
+
+
+def background_loop() -> asyncio.AbstractEventLoop:
+    """
+    The event loop `iter_async` runs on, started on first use in a daemon thread and never closed.
+    """
+    global _loop
+    with _loop_lock:
+        if _loop is None:
+            _loop = asyncio.new_event_loop()
+            threading.Thread(target=_loop.run_forever, name="iter-async", daemon=True).start()
+        return _loop
+
+
+def iter_async(chunks: AsyncIterator[Any]) -> Iterator[Any]:
+    """
+    Iterate an async iterator from synchronous code, running it on the background event loop.
+
+    A loop per call would close after every turn, breaking the pooled
+    connections of async clients that outlive it ("Event loop is closed").
+    """
+    items: "queue.Queue[Any]" = queue.Queue()
+
+    async def consume() -> None:
+        try:
+            async for chunk in chunks:
+                items.put(chunk)
+        except BaseException as error:
+            items.put(error)
+        finally:
+            items.put(_DONE)
+
+    # The task runs in a copy of the caller's context, so context-bound callbacks such as
+    # `get_openai_callback` still apply
+    asyncio.run_coroutine_threadsafe(consume(), background_loop())
+    while True:
+        item = items.get()
+        if item is _DONE:
+            return
+        if isinstance(item, BaseException):
+            raise item
+        yield item
+
+
+def render_stream(chunks: Union[Iterable[Any], AsyncIterator[Any]], prefix: str = "") -> Tuple[str, float, float]:
+    """
+    Print chunks as they arrive after `prefix`. Returns the full text, seconds to the first chunk and in total.
+
+    `prefix` is written with the first chunk, so whatever the chain prints
+    before generating (e.g. retrieval metrics) does not split the answer.
+    """
+    started_at = time.perf_counter()
+    first_chunk_at = None
+    parts = []
+    for chunk in iter_async(chunks) if hasattr(chunks, "__anext__") else chunks:
+        text = chunk_text(chunk)
+        if not text:
+            continue
+        if first_chunk_at is None:
+            first_chunk_at = time.perf_counter()
+            sys.stdout.write(prefix)
+        parts.append(text)
+        sys.stdout.write(text)
+        sys.stdout.flush()
+    sys.stdout.write(prefix + "\n" if first_chunk_at is None else "\n")
+    sys.stdout.flush()
+    finished_at = time.perf_counter()
+    return "".join(parts), (first_chunk_at or finished_at) - started_at, finished_at - started_at
+
+
+async def astream_agent_answer(agent_executor: Runnable, inputs: Dict[str, Any],
+                               llm_tag: str = "agent_llm", marker: str = FINAL_ANSWER_MARKER,
+                               config: Optional[RunnableConfig] = None) -> AsyncIterator[str]:
+    """
+    Yield the tokens of a ReAct agent's final answer as the model writes them.
+
+    Only chat models tagged with `llm_tag` are followed, so models running
+    inside tools are ignored. Text before `marker` (thoughts and actions) is
+    not yielded. If the answer was never streamed, e.g. after a parsing
+    error, the executor's final output is yielded at the end. `config` (e.g.
+    callbacks) is passed to the executor.
+    """
+    buffer = ""
+    streaming = False
+    streamed = False
+    root_run_id = None
+    async for event in agent_executor.astream_events(inputs, config, version="v2"):
+        if root_run_id is None:
+            root_run_id = event["run_id"]
+        if llm_tag in event.get("tags", []):
+            if event["event"] == "on_chat_model_start":
+                buffer, streaming = "", False
+            elif event["event"] == "on_chat_model_stream":
+                text = chunk_text(event["data"]["chunk"])
+                if not streaming:
+                    buffer += text
+                    if marker not in buffer:
+                        continue
+                    streaming = True
+                    text = buffer.split(marker, 1)[1]
+                if not streamed:
+                    # The marker is usually followed by a space, possibly in a later chunk
+                    text = text.lstrip()
+                if text:
+                    streamed = True
+                    yield text
+        elif event["event"] == "on_chain_end" and event["run_id"] == root_run_id and not streamed:
+            yield event["data"]["output"]["output"]
+
+
+async def astream_graph_answer(graph: Runnable, inputs: Dict[str, Any], config: Optional[RunnableConfig] = None,
+                               node: str = "agent") -> AsyncIterator[str]:
+    """
+    Yield the tokens written by the chat model of `node` of a LangGraph graph, e.g. `create_react_agent`.
+
+    Uses the graph's events rather than `stream_mode="messages"`, which our
+    pinned LangGraph does not have; the node is told apart by the
+    `langgraph_node` metadata LangGraph gives every run inside a node.
+    Chunks without text, such as tool call chunks, are skipped.
+    """
+    async for event in graph.astream_events(inputs, config, version="v2"):
+        if event["event"] != "on_chat_model_stream" or event.get("metadata", {}).get("langgraph_node") != node:
+            continue
+        text = chunk_text(event["data"]["chunk"])
+        if text:
+            yield text
@@ -0,0 +1,147 @@
+"""
+Summary History
+
+`SummarizingChatHistory` keeps the most recent turns of a conversation
+verbatim and folds older turns into a running summary once the history
+crosses `max_tokens`. The summary is updated incrementally (previous summary
++ the turns being folded) on a background thread, so the user never waits
+for it; until it lands the turns stay verbatim. The history sent to the model
+therefore stays around `max_tokens` however long the conversation gets.
+
+It is a `BaseChatMessageHistory`, so it works with `RunnableWithMessageHistory`
+as well as with a plain `chat_history` list passed to a chain.
+"""
+
+import logging
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional, Sequence
+
+from langchain_core.chat_history import BaseChatMessageHistory
+from langchain_core.language_models import BaseChatModel
+from langchain_core.messages import BaseMessage, HumanMessage, SystemMessage, get_buffer_string
+from langchain_core.output_parsers import StrOutputParser
+from langchain_core.prompts import ChatPromptTemplate
+
+from app.utils.session_store import approximate_token_count
+
+logger = logging.getLogger(__name__)
+
+SUMMARY_PROMPT = ChatPromptTemplate.from_messages([
+    ("system", "Progressively summarize the lines of a conversation, adding onto the previous summary "
+               "and returning a new summary. Keep names, facts, decisions and open questions."),
+    ("human", "Current summary:\n{summary}\n\nNew lines of conversation:\n{new_lines}\n\nNew summary:"),
+])
+
+
+class SummarizingChatHistory(BaseChatMessageHistory):
+    """
+    Chat history made of a running summary plus the recent messages verbatim.
+
+    Once the history exceeds `max_tokens`, the oldest turns are folded into the
+    summary until the verbatim part is under `keep_tokens` (half of `max_tokens`
+    by default).
+    """
+
+    def __init__(self, llm: BaseChatModel, max_tokens: int = 1000, keep_tokens: Optional[int] = None,
+                 token_counter: Callable[[Sequence[BaseMessage]], int] = approximate_token_count) -> None:
+        self.max_tokens = max_tokens
+        self.keep_tokens = keep_tokens if keep_tokens is not None else max_tokens // 2
+        self.token_counter = token_counter
+        self.summary = ""
+        self.recent: List[BaseMessage] = []
+        self.summarizations = 0
+        self._summarize_chain = SUMMARY_PROMPT | llm | StrOutputParser()
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="summary-history")
+        self._pending: Optional[Future] = None
+        self._generation = 0
+        self._lock = threading.Lock()
+
+    @property
+    def messages(self) -> List[BaseMessage]:
+        with self._lock:
+            if not self.summary:
+                return list(self.recent)
+            return [SystemMessage(content=f"Summary of the earlier conversation: {self.summary}")] + self.recent
+
+    def token_count(self) -> int:
+        """
+        Tokens of the history as sent to the model, summary included.
+        """
+        return self.token_counter(self.messages)
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "tokens": self.token_count(),
+            "recent_messages": len(self.recent),
+            "summarizations": self.summarizations,
+        }
+
+    def add_messages(self, messages: Sequence[BaseMessage]) -> None:
+        with self._lock:
+            self.recent.extend(messages)
+        self._maybe_summarize()
+
+    def clear(self) -> None:
+        with self._lock:
+            self.summary = ""
+            self.recent = []
+            # Results of a summarization still running are dropped
+            self._generation += 1
+
+    def wait(self) -> None:
+        """
+        Block until the summarization in flight, if any, has been applied.
+        """
+        pending = self._pending
+        if pending is not None:
+            pending.result()
+
+    def _fold_count(self) -> int:
+        """
+        Number of oldest messages to fold so the rest fits in `keep_tokens`, ending before a human message.
+        """
+        tokens = self.token_counter(self.recent)
+        cut = 0
+        while cut < len(self.recent) and tokens > self.keep_tokens:
+            tokens -= self.token_counter([self.recent[cut]])
+            cut += 1
+        # Keep whole turns: the verbatim part starts with a human message
+        while cut < len(self.recent) and not isinstance(self.recent[cut], HumanMessage):
+            cut += 1
+        # Always keep the latest turn verbatim
+        last_human = max((i for i, message in enumerate(self.recent) if isinstance(message, HumanMessage)), default=0)
+        return min(cut, last_human)
+
+    def _maybe_summarize(self) -> None:
+        with self._lock:
+            if self._pending is not None and not self._pending.done():
+                return
+            if self.token_counter(self.recent) <= self.max_tokens:
+                return
+            cut = self._fold_count()
+            if cut == 0:
+                return
+            summary, folded, generation = self.summary, self.recent[:cut], self._generation
+            pending = self._pending = self._executor.submit(self._summarize, summary, folded, generation)
+        # Turns added while summarizing may already be over the threshold again
+        pending.add_done_callback(lambda done: done.result() and self._maybe_summarize())
+
+    def _summarize(self, summary: str, folded: List[BaseMessage], generation: int) -> bool:
+        try:
+            new_summary = self._summarize_chain.invoke({
+                "summary": summary or "(none)",
+                "new_lines": get_buffer_string(folded),
+            })
+        except Exception:
+            # Keep the turns verbatim, the next turn tries again
+            logger.exception("Summarizing the chat history failed")
+            return False
+        with self._lock:
+            if generation != self._generation:
+                return False
+            self.summary = new_summary.strip()
+            # Only appends happened meanwhile, so the folded messages are still the oldest ones
+            self.recent = self.recent[len(folded):]
+            self.summarizations += 1
+        return True
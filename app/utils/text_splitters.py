@@ -0,0 +1,324 @@
+"""
+Text Splitters
+
+`TextLoader(...).load()` followed by `split_documents` holds the whole file
+and all of its chunks in memory. The splitters here read the file in buffered
+windows and yield chunks one at a time, so memory stays flat however large
+the corpus is. For the same parameters they produce exactly the same chunks
+as `CharacterTextSplitter` and `TokenTextSplitter`.
+
+`FastTokenTextSplitter` encodes once, computes every chunk boundary over the
+token array with NumPy and slices the text's bytes instead of decoding each
+chunk, which dominates `TokenTextSplitter` with small chunk sizes.
+"""
+
+import copy
+import logging
+from typing import Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+from langchain.text_splitter import CharacterTextSplitter, TokenTextSplitter
+from langchain_core.documents import Document
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_WINDOW_SIZE = 1 << 16
+# Text held back waiting for a safe token cut is cut anyway past this many windows
+MAX_PENDING_WINDOWS = 4
+
+# Byte length of every token id, built once per tiktoken encoding
+_BYTE_LENGTH_TABLES: Dict[str, np.ndarray] = {}
+
+
+def read_windows(file_path: str, encoding: Optional[str] = None,
+                 window_size: int = DEFAULT_WINDOW_SIZE) -> Iterator[str]:
+    """
+    Yield the decoded text of a file in windows of at most `window_size` characters.
+    """
+    with open(file_path, encoding=encoding) as f:
+        for window in iter(lambda: f.read(window_size), ""):
+            yield window
+
+
+class StreamingCharacterTextSplitter(CharacterTextSplitter):
+    """
+    `CharacterTextSplitter` that splits a file lazily, window by window.
+
+    Only literal separators are supported, separators straddling two windows
+    are found because the text after the last separator is carried over.
+    """
+
+    def __init__(self, separator: str = "\n\n", **kwargs) -> None:
+        if kwargs.get("is_separator_regex") or kwargs.get("keep_separator"):
+            raise ValueError("StreamingCharacterTextSplitter only supports literal, dropped separators.")
+        super().__init__(separator=separator, **kwargs)
+
+    def _lazy_splits(self, windows: Iterator[str]) -> Iterator[str]:
+        tail = ""
+        for window in windows:
+            pieces = (tail + window).split(self._separator)
+            tail = pieces.pop()
+            for piece in pieces:
+                if piece != "":
+                    yield piece
+        if tail != "":
+            yield tail
+
+    def _lazy_merge_splits(self, splits: Iterator[str]) -> Iterator[str]:
+        """
+        Generator version of `TextSplitter._merge_splits`, yielding chunks as soon as they are complete.
+        """
+        separator = self._separator
+        separator_len = self._length_function(separator)
+        current_doc: List[str] = []
+        total = 0
+        for split in splits:
+            split_len = self._length_function(split)
+            if total + split_len + (separator_len if current_doc else 0) > self._chunk_size:
+                if total > self._chunk_size:
+                    logger.warning(
+                        f"Created a chunk of size {total}, "
+                        f"which is longer than the specified {self._chunk_size}"
+                    )
+                if current_doc:
+                    doc = self._join_docs(current_doc, separator)
+                    if doc is not None:
+                        yield doc
+                    while total > self._chunk_overlap or (
+                        total + split_len + (separator_len if current_doc else 0) > self._chunk_size
+                        and total > 0
+                    ):
+                        total -= self._length_function(current_doc[0]) + (
+                            separator_len if len(current_doc) > 1 else 0
+                        )
+                        current_doc = current_doc[1:]
+            current_doc.append(split)
+            total += split_len + (separator_len if len(current_doc) > 1 else 0)
+        doc = self._join_docs(current_doc, separator)
+        if doc is not None:
+            yield doc
+
+    def lazy_split_windows(self, windows: Iterator[str]) -> Iterator[str]:
+        return self._lazy_merge_splits(self._lazy_splits(windows))
+
+    def lazy_split_file(self, file_path: str, encoding: Optional[str] = None,
+                        window_size: int = DEFAULT_WINDOW_SIZE) -> Iterator[Document]:
+        """
+        Yield the chunks of a text file as documents, like `TextLoader` + `split_documents`.
+        """
+        metadata = {"source": str(file_path)}
+        for chunk in self.lazy_split_windows(read_windows(file_path, encoding, window_size)):
+            yield Document(page_content=chunk, metadata=copy.deepcopy(metadata))
+
+
+def _is_ascii_letter(char: str) -> bool:
+    return char.isascii() and char.isalpha()
+
+
+def _safe_token_cut(text: str) -> int:
+    """
+    Return the last index where `text` can be cut without changing its tokenization, or 0.
+
+    A cut between a letter and a space followed by a letter ("word| Word") falls
+    on a pre-tokenization boundary of every tiktoken encoding, so encoding both
+    sides separately yields the same tokens as encoding the whole text.
+    """
+    index = text.rfind(" ", 0, len(text) - 1)
+    while index > 0:
+        if _is_ascii_letter(text[index - 1]) and _is_ascii_letter(text[index + 1]):
+            return index
+        index = text.rfind(" ", 0, index)
+    return 0
+
+
+def _forced_token_cut(text: str) -> int:
+    """
+    Return where to cut `text` when no safe cut was found: before its last whitespace, else at its end.
+
+    Tokens around such a cut may differ from encoding the whole text, which
+    only happens on text without ASCII words, e.g. CJK or long runs without spaces.
+    """
+    index = max(text.rfind(" "), text.rfind("\n"), text.rfind("\t"))
+    return index if index > 0 else len(text)
+
+
+class FastTokenTextSplitter(TokenTextSplitter):
+    """
+    `TokenTextSplitter` that maps chunk boundaries to byte offsets instead of decoding every chunk.
+
+    Chunks are identical to `TokenTextSplitter`. The character offset of each
+    chunk is stored as `start_index` in its metadata (`add_start_index` defaults to True).
+    """
+
+    def __init__(self, add_start_index: bool = True, **kwargs) -> None:
+        super().__init__(add_start_index=add_start_index, **kwargs)
+
+    def _encode(self, text: str) -> List[int]:
+        return self._tokenizer.encode(
+            text,
+            allowed_special=self._allowed_special,
+            disallowed_special=self._disallowed_special,
+        )
+
+    def _token_byte_lengths(self, tokens: np.ndarray) -> np.ndarray:
+        """
+        Return the byte length of every token with one lookup into a per-encoding table.
+        """
+        table = _BYTE_LENGTH_TABLES.get(self._tokenizer.name)
+        if table is None:
+            table = np.zeros(self._tokenizer.n_vocab, dtype=np.int64)
+            for token in range(self._tokenizer.n_vocab):
+                try:
+                    table[token] = len(self._tokenizer.decode_single_token_bytes(token))
+                except KeyError:
+                    # Some encodings leave gaps in their token ids
+                    pass
+            _BYTE_LENGTH_TABLES[self._tokenizer.name] = table
+        return table[tokens]
+
+    def _chunk_starts(self, n_tokens: int) -> np.ndarray:
+        """
+        Token index of every chunk start, following `split_text_on_tokens`.
+        """
+        if n_tokens == 0:
+            return np.zeros(0, dtype=np.int64)
+        step = self._chunk_size - self._chunk_overlap
+        if n_tokens <= self._chunk_size:
+            return np.zeros(1, dtype=np.int64)
+        n_chunks = -(-(n_tokens - self._chunk_size) // step) + 1
+        return np.arange(n_chunks, dtype=np.int64) * step
+
+    def split_text_with_offsets(self, text: str) -> List[Tuple[int, str]]:
+        """
+        Split `text` into `(character offset, chunk)` pairs.
+        """
+        token_list = self._encode(text)
+        if not token_list:
+            return []
+        tokens = np.array(token_list, dtype=np.int64)
+
+        byte_offsets = np.zeros(len(tokens) + 1, dtype=np.int64)
+        np.cumsum(self._token_byte_lengths(tokens), out=byte_offsets[1:])
+        data = text.encode("utf-8", errors="replace")
+        if len(data) != byte_offsets[-1]:
+            # Text that is not valid UTF-8 (e.g. lone surrogates) is encoded lossily by tiktoken
+            data = self._tokenizer.decode_bytes(token_list)
+
+        starts = self._chunk_starts(len(tokens))
+        ends = np.minimum(starts + self._chunk_size, len(tokens))
+        byte_starts = byte_offsets[starts].tolist()
+        byte_ends = byte_offsets[ends].tolist()
+
+        if self._add_start_index:
+            # Characters before a byte offset are the UTF-8 lead bytes before it
+            lead_bytes = (np.frombuffer(data, dtype=np.uint8) & 0xC0) != 0x80
+            char_offsets = np.zeros(len(data) + 1, dtype=np.int64)
+            np.cumsum(lead_bytes, out=char_offsets[1:])
+            char_starts = char_offsets[byte_starts].tolist()
+        else:
+            char_starts = [0] * len(byte_starts)
+
+        return [
+            (char_start, data[byte_start:byte_end].decode("utf-8", errors="replace"))
+            for char_start, byte_start, byte_end in zip(char_starts, byte_starts, byte_ends)
+        ]
+
+    def split_text(self, text: str) -> List[str]:
+        return [chunk for _, chunk in self.split_text_with_offsets(text)]
+
+    def create_documents(self, texts: List[str], metadatas: Optional[List[dict]] = None) -> List[Document]:
+        _metadatas = metadatas or [{}] * len(texts)
+        documents = []
+        for text, metadata in zip(texts, _metadatas):
+            for start_index, chunk in self.split_text_with_offsets(text):
+                chunk_metadata = copy.deepcopy(metadata)
+                if self._add_start_index:
+                    chunk_metadata["start_index"] = start_index
+                documents.append(Document(page_content=chunk, metadata=chunk_metadata))
+        return documents
+
+
+class StreamingTokenTextSplitter(FastTokenTextSplitter):
+    """
+    `TokenTextSplitter` that encodes a file window by window and yields chunks lazily.
+
+    Only the tokens and bytes of the current chunk plus one window are held in
+    memory, and chunks are sliced from bytes like in `FastTokenTextSplitter`.
+    Text without ASCII words, where no cut is known to keep the tokens
+    unchanged, is cut anyway every `MAX_PENDING_WINDOWS` windows.
+    `add_start_index` defaults to False to keep the metadata of `TokenTextSplitter`.
+    """
+
+    def __init__(self, add_start_index: bool = False, **kwargs) -> None:
+        super().__init__(add_start_index=add_start_index, **kwargs)
+
+    def _lazy_token_windows(self, windows: Iterator[str]) -> Iterator[List[int]]:
+        pending = ""
+        window_size = 0
+        for window in windows:
+            pending += window
+            window_size = max(window_size, len(window))
+            cut = _safe_token_cut(pending)
+            if cut == 0 and len(pending) > MAX_PENDING_WINDOWS * window_size:
+                # No ASCII word boundary in sight, don't let the text pile up
+                cut = _forced_token_cut(pending)
+            if cut > 0:
+                yield self._encode(pending[:cut])
+                pending = pending[cut:]
+        if pending:
+            yield self._encode(pending)
+
+    def lazy_split_windows_with_offsets(self, windows: Iterator[str]) -> Iterator[Tuple[int, str]]:
+        """
+        Same chunking as `split_text_on_tokens` over a stream of windows, yielding `(character offset, chunk)`.
+        """
+        step = self._chunk_size - self._chunk_overlap
+        data = bytearray()
+        lengths = np.zeros(0, dtype=np.int64)
+        char_offset = 0
+
+        def emit() -> Tuple[int, str]:
+            end = int(lengths[:self._chunk_size].sum())
+            return char_offset, data[:end].decode("utf-8", errors="replace")
+
+        def advance() -> None:
+            nonlocal lengths, char_offset
+            dropped = int(lengths[:step].sum())
+            if self._add_start_index:
+                char_offset += int(np.count_nonzero(
+                    (np.frombuffer(bytes(data[:dropped]), dtype=np.uint8) & 0xC0) != 0x80
+                ))
+            del data[:dropped]
+            lengths = lengths[step:]
+
+        for tokens in self._lazy_token_windows(windows):
+            if not tokens:
+                continue
+            data += self._tokenizer.decode_bytes(tokens)
+            lengths = np.concatenate((lengths, self._token_byte_lengths(np.asarray(tokens, dtype=np.int64))))
+            # More tokens than one chunk means this chunk is not the last one
+            while len(lengths) > self._chunk_size:
+                yield emit()
+                advance()
+        while len(lengths):
+            yield emit()
+            if len(lengths) <= self._chunk_size:
+                break
+            advance()
+
+    def lazy_split_windows(self, windows: Iterator[str]) -> Iterator[str]:
+        for _, chunk in self.lazy_split_windows_with_offsets(windows):
+            yield chunk
+
+    def lazy_split_file(self, file_path: str, encoding: Optional[str] = None,
+                        window_size: int = DEFAULT_WINDOW_SIZE) -> Iterator[Document]:
+        """
+        Yield the chunks of a text file as documents, like `TextLoader` + `split_documents`.
+        """
+        metadata = {"source": str(file_path)}
+        windows = read_windows(file_path, encoding, window_size)
+        for start_index, chunk in self.lazy_split_windows_with_offsets(windows):
+            chunk_metadata = copy.deepcopy(metadata)
+            if self._add_start_index:
+                chunk_metadata["start_index"] = start_index
+            yield Document(page_content=chunk, metadata=chunk_metadata)
@@ -0,0 +1,300 @@
+"""
+Tool Cache
+
+`ToolCache.wrap(tool)` returns a copy of a `Tool` or `StructuredTool` whose
+results are cached, so an agent looking up the same thing again, in the same
+conversation or another one, does not hit the backend (e.g. Wikipedia) again:
+
+- calls are keyed by tool name and normalized arguments (whitespace collapsed,
+  case folded, keyword order ignored)
+- every tool has its own TTL: `ttls={"Time": 0}` never caches the clock,
+  None never expires, tools without an entry get `default_ttl`
+- concurrent identical calls are coalesced, only the first one runs and the
+  others wait for its result
+- results are kept in memory (LRU) and, with `cache_path`, in a SQLite file,
+  so they survive restarts; errors are never cached
+- hits return a result as it comes back from JSON, from memory as from disk,
+  so e.g. a tuple is a list on every hit; results that are not JSON (e.g. a
+  pydantic model) are kept in memory only, as they are. The call that ran
+  the tool gets its result unchanged
+- if an async call is cancelled (e.g. by the tool node's timeout), the
+  calls waiting for it are not: one of them runs the tool instead
+
+`stats()` reports hits, misses, coalesced calls and the time saved per tool,
+estimated from the tool's average uncached latency.
+"""
+
+import asyncio
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from langchain_core.tools import BaseTool
+
+# Result of a call whose owner was cancelled: the calls waiting for it claim it again
+_RETRY = object()
+
+
+def normalize_argument(value: Any) -> Any:
+    if isinstance(value, str):
+        return re.sub(r"\s+", " ", value).strip().casefold()
+    if isinstance(value, dict):
+        return {key: normalize_argument(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [normalize_argument(item) for item in value]
+    return value
+
+
+class _ToolStats():
+    def __init__(self) -> None:
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.uncached = 0
+        self.miss_seconds = 0.0
+
+    def as_dict(self) -> Dict[str, Any]:
+        hits = self.memory_hits + self.disk_hits + self.coalesced
+        calls = hits + self.misses
+        average = self.miss_seconds / self.misses if self.misses else 0.0
+        return {
+            "memory_hits": self.memory_hits,
+            "disk_hits": self.disk_hits,
+            "coalesced": self.coalesced,
+            "misses": self.misses,
+            "uncached": self.uncached,
+            "hit_rate": hits / calls if calls else 0.0,
+            "saved_seconds": hits * average,
+        }
+
+
+class ToolCache():
+    """
+    Result cache shared by the tools it wraps, in memory and optionally on disk.
+
+    A TTL of 0 disables caching for a tool, a TTL of None keeps its results until they are evicted.
+    """
+
+    def __init__(self, cache_path: Optional[str] = None, default_ttl: Optional[float] = 3600,
+                 ttls: Optional[Dict[str, Optional[float]]] = None, max_memory_items: int = 10_000,
+                 normalize: Callable[[Any], Any] = normalize_argument) -> None:
+        self.default_ttl = default_ttl
+        self.ttls = dict(ttls or {})
+        self.max_memory_items = max_memory_items
+        self.normalize = normalize
+        # key -> (tool name, result, expires at as a time.time() timestamp or None)
+        self._memory: "OrderedDict[str, Tuple[str, Any, Optional[float]]]" = OrderedDict()
+        self._in_flight: Dict[str, Future] = {}
+        self._stats: Dict[str, _ToolStats] = {}
+        self._lock = threading.Lock()
+        self._conn = None
+        if cache_path is not None:
+            os.makedirs(os.path.dirname(os.path.abspath(cache_path)), exist_ok=True)
+            self._conn = sqlite3.connect(cache_path, check_same_thread=False)
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS tool_results ("
+                "key TEXT PRIMARY KEY, tool TEXT NOT NULL, result TEXT NOT NULL, expires_at REAL)"
+            )
+            self._conn.commit()
+
+    def ttl(self, tool_name: str) -> Optional[float]:
+        return self.ttls.get(tool_name, self.default_ttl)
+
+    def stats(self) -> Dict[str, Dict[str, Any]]:
+        with self._lock:
+            return {name: stats.as_dict() for name, stats in self._stats.items()}
+
+    def key(self, tool_name: str, args: Tuple[Any, ...], kwargs: Dict[str, Any]) -> str:
+        arguments = json.dumps(
+            {"args": self.normalize(list(args)), "kwargs": self.normalize(kwargs)}, sort_keys=True, default=str
+        )
+        return hashlib.sha256(f"{tool_name}\0{arguments}".encode("utf-8")).hexdigest()
+
+    def _tool_stats(self, tool_name: str) -> _ToolStats:
+        if tool_name not in self._stats:
+            self._stats[tool_name] = _ToolStats()
+        return self._stats[tool_name]
+
+    def _get(self, tool_name: str, key: str) -> Tuple[bool, Any]:
+        """
+        Return `(found, result)`, checking memory first and then disk. Must be called with the lock held.
+        """
+        now = time.time()
+        entry = self._memory.get(key)
+        if entry is not None:
+            if entry[2] is None or entry[2] > now:
+                self._memory.move_to_end(key)
+                self._tool_stats(tool_name).memory_hits += 1
+                return True, entry[1]
+            del self._memory[key]
+        if self._conn is not None:
+            row = self._conn.execute(
+                "SELECT result, expires_at FROM tool_results WHERE key = ?", (key,)
+            ).fetchone()
+            if row is not None and (row[1] is None or row[1] > now):
+                result = json.loads(row[0])
+                self._remember(key, tool_name, result, row[1])
+                self._tool_stats(tool_name).disk_hits += 1
+                return True, result
+            if row is not None:
+                self._conn.execute("DELETE FROM tool_results WHERE key = ?", (key,))
+                self._conn.commit()
+        return False, None
+
+    def _remember(self, key: str, tool_name: str, result: Any, expires_at: Optional[float]) -> None:
+        self._memory[key] = (tool_name, result, expires_at)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_memory_items:
+            self._memory.popitem(last=False)
+
+    def _put(self, tool_name: str, key: str, result: Any, seconds: float) -> Any:
+        """
+        Cache `result` and return it as hits will see it.
+        """
+        ttl = self.ttl(tool_name)
+        expires_at = None if ttl is None else time.time() + ttl
+        try:
+            serialized = json.dumps(result)
+        except (TypeError, ValueError):
+            # Not JSON, kept in memory only
+            serialized = None
+        else:
+            result = json.loads(serialized)
+        with self._lock:
+            stats = self._tool_stats(tool_name)
+            stats.misses += 1
+            stats.miss_seconds += seconds
+            self._remember(key, tool_name, result, expires_at)
+            if self._conn is not None and serialized is not None:
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO tool_results (key, tool, result, expires_at) VALUES (?, ?, ?, ?)",
+                    (key, tool_name, serialized, expires_at),
+                )
+                self._conn.commit()
+        return result
+
+    def _claim(self, tool_name: str, key: str, retry: bool = False) -> Tuple[bool, Any, Optional[Future], bool]:
+        """
+        Return `(found, result, future, owner)`: a cached result, or the in-flight future and whether we run it.
+
+        `retry` is set when claiming again after the owner was cancelled, so the call is not counted twice.
+        """
+        with self._lock:
+            found, result = self._get(tool_name, key)
+            if found:
+                return True, result, None, False
+            future = self._in_flight.get(key)
+            if future is not None:
+                if not retry:
+                    self._tool_stats(tool_name).coalesced += 1
+                return False, None, future, False
+            future = self._in_flight[key] = Future()
+            return False, None, future, True
+
+    def _settle(self, key: str, future: Future, result: Any = None, error: Optional[BaseException] = None) -> None:
+        with self._lock:
+            self._in_flight.pop(key, None)
+        if future.done():
+            return
+        if error is not None:
+            future.set_exception(error)
+        else:
+            future.set_result(result)
+
+    def cached_call(self, tool_name: str, func: Callable[..., Any], *args: Any, **kwargs: Any) -> Any:
+        if self.ttl(tool_name) == 0:
+            with self._lock:
+                self._tool_stats(tool_name).uncached += 1
+            return func(*args, **kwargs)
+        key = self.key(tool_name, args, kwargs)
+        retry = False
+        while True:
+            found, result, future, owner = self._claim(tool_name, key, retry)
+            if found:
+                return result
+            if owner:
+                break
+            result = future.result()
+            if result is not _RETRY:
+                return result
+            retry = True
+        started_at = time.perf_counter()
+        try:
+            result = func(*args, **kwargs)
+        except BaseException as error:
+            self._settle(key, future, error=error)
+            raise
+        self._settle(key, future, self._put(tool_name, key, result, time.perf_counter() - started_at))
+        return result
+
+    async def acached_call(self, tool_name: str, coroutine: Callable[..., Any], *args: Any, **kwargs: Any) -> Any:
+        if self.ttl(tool_name) == 0:
+            with self._lock:
+                self._tool_stats(tool_name).uncached += 1
+            return await coroutine(*args, **kwargs)
+        key = self.key(tool_name, args, kwargs)
+        retry = False
+        while True:
+            found, result, future, owner = self._claim(tool_name, key, retry)
+            if found:
+                return result
+            if owner:
+                break
+            # Shielded, so a waiter being cancelled does not cancel the call for the owner and the other waiters
+            result = await asyncio.shield(asyncio.wrap_future(future))
+            if result is not _RETRY:
+                return result
+            retry = True
+        started_at = time.perf_counter()
+        try:
+            result = await coroutine(*args, **kwargs)
+        except asyncio.CancelledError:
+            # Only this call was cancelled, the calls waiting for it have their own deadlines: release the
+            # key so one of them runs the tool
+            self._settle(key, future, _RETRY)
+            raise
+        except BaseException as error:
+            self._settle(key, future, error=error)
+            raise
+        self._settle(key, future, self._put(tool_name, key, result, time.perf_counter() - started_at))
+        return result
+
+    def wrap(self, tool: BaseTool, ttl: Any = ...) -> BaseTool:
+        """
+        Return a copy of `tool` (a `Tool` or `StructuredTool`) whose results go through the cache.
+
+        `ttl` overrides the TTL of this tool.
+        """
+        if ttl is not ...:
+            self.ttls[tool.name] = ttl
+        update = {}
+        func = getattr(tool, "func", None)
+        coroutine = getattr(tool, "coroutine", None)
+        if func is not None:
+            def cached_func(*args: Any, **kwargs: Any) -> Any:
+                return self.cached_call(tool.name, func, *args, **kwargs)
+            update["func"] = cached_func
+        if coroutine is not None:
+            async def cached_coroutine(*args: Any, **kwargs: Any) -> Any:
+                return await self.acached_call(tool.name, coroutine, *args, **kwargs)
+            update["coroutine"] = cached_coroutine
+        if not update:
+            raise TypeError(f"Cannot cache {type(tool).__name__} {tool.name!r}, it has neither func nor coroutine")
+        # Not `tool.copy(update=...)`, which drops the fields excluded from serialization such as `callbacks`
+        fields = {name: getattr(tool, name) for name in tool.__fields__}
+        return type(tool)(**{**fields, **update})
+
+    def clear(self) -> None:
+        with self._lock:
+            self._memory.clear()
+            if self._conn is not None:
+                self._conn.execute("DELETE FROM tool_results")
+                self._conn.commit()
@@ -0,0 +1,200 @@
+"""
+Tool Execution
+
+`ConcurrentToolNode` is a `ToolNode` that runs all the tool calls of one
+model turn at the same time, with a deadline per tool and a bounded pool of
+threads for sync tools:
+
+- async tools run on the event loop (when the agent is run with `ainvoke` /
+  `astream`), sync tools on a thread pool of `max_workers` shared by the node;
+  async-only tools also work when the agent is run with `invoke`
+- every call has a deadline, `timeouts[tool name]` or `default_timeout`
+  seconds; a call past it, or failing, gets an error `ToolMessage`, so the
+  model can react instead of the whole step (or a hung lookup) holding up
+  the agent
+- the `ToolMessage`s are returned in the order of the tool calls
+
+A sync tool past its deadline cannot be interrupted, it finishes in the
+background while the agent moves on.
+
+LangGraph's `create_react_agent` builds its own `ToolNode` from a list of
+tools, so `create_concurrent_react_agent` builds the same agent graph around
+a `ConcurrentToolNode`.
+"""
+
+import asyncio
+import contextvars
+import functools
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from typing import Any, Dict, List, Optional, Sequence, Union
+
+from langchain_core.language_models import BaseChatModel
+from langchain_core.messages import AIMessage, ToolCall, ToolMessage
+from langchain_core.runnables import RunnableConfig, RunnableLambda
+from langchain_core.tools import BaseTool
+from langgraph.checkpoint.base import BaseCheckpointSaver
+from langgraph.graph import END, MessagesState, StateGraph
+from langgraph.graph.graph import CompiledGraph
+from langgraph.managed import IsLastStep
+from langgraph.prebuilt import ToolNode, tools_condition
+
+
+def _is_async_only(tool: BaseTool) -> bool:
+    return getattr(tool, "func", True) is None and getattr(tool, "coroutine", None) is not None
+
+
+class ConcurrentToolNode(ToolNode):
+    """
+    `ToolNode` running the tool calls of a step concurrently, with per-tool timeouts.
+    """
+
+    def __init__(self, tools: Sequence[Union[BaseTool, Any]], max_workers: int = 8,
+                 timeouts: Optional[Dict[str, float]] = None, default_timeout: Optional[float] = 30.0,
+                 **kwargs: Any) -> None:
+        super().__init__(tools, **kwargs)
+        self.max_workers = max_workers
+        self.timeouts = dict(timeouts or {})
+        self.default_timeout = default_timeout
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="tool-calls")
+
+    def timeout(self, tool_name: str) -> Optional[float]:
+        return self.timeouts.get(tool_name, self.default_timeout)
+
+    def _tool_calls(self, input: Any, store: Any) -> List[ToolCall]:
+        if isinstance(input, list):
+            message = input[-1]
+        elif isinstance(input, dict):
+            message = input["messages"][-1]
+        else:
+            message = input.messages[-1]
+        if not isinstance(message, AIMessage):
+            raise ValueError("The last message must be an AIMessage with tool calls")
+        tool_calls = message.tool_calls
+        inject = getattr(self, "inject_tool_args", None)
+        if inject is not None:
+            # Tools declaring InjectedState / InjectedStore arguments get them filled in
+            tool_calls = [inject(call, input, store) for call in tool_calls]
+        return tool_calls
+
+    def _error_message(self, call: ToolCall, content: str) -> ToolMessage:
+        return ToolMessage(content=content, name=call["name"], tool_call_id=call["id"], status="error")
+
+    def _invoke_tool(self, call: ToolCall, config: RunnableConfig) -> ToolMessage:
+        tool = self.tools_by_name[call["name"]]
+        tool_input = {**call, "type": "tool_call"}
+        if _is_async_only(tool):
+            # Sync agent run: an async-only tool gets its own event loop in the worker thread
+            return asyncio.run(tool.ainvoke(tool_input, config))
+        return tool.invoke(tool_input, config)
+
+    def _result(self, call: ToolCall, output: Any = None, error: Optional[BaseException] = None,
+                timed_out: bool = False) -> ToolMessage:
+        if timed_out:
+            return self._error_message(
+                call, f"Error: {call['name']} did not answer within {self.timeout(call['name'])}s, try again later."
+            )
+        if error is not None:
+            if not getattr(self, "handle_tool_errors", True):
+                raise error
+            return self._error_message(call, f"Error: {error!r}\n Please fix your mistakes.")
+        if isinstance(output, ToolMessage):
+            return output
+        return ToolMessage(content=str(output), name=call["name"], tool_call_id=call["id"])
+
+    def _func(self, input: Any, config: RunnableConfig, *, store: Any = None, **kwargs: Any) -> Any:
+        tool_calls = self._tool_calls(input, store)
+        started_at = time.monotonic()
+        futures = {}
+        for i, call in enumerate(tool_calls):
+            if call["name"] in self.tools_by_name:
+                # Keep the caller's context (callbacks, tracing) in the worker thread
+                context = contextvars.copy_context()
+                futures[i] = self._executor.submit(context.run, self._invoke_tool, call, config)
+
+        outputs = []
+        for i, call in enumerate(tool_calls):
+            if i not in futures:
+                outputs.append(self._error_message(call, f"Error: {call['name']} is not a valid tool, "
+                                                         f"try one of [{', '.join(self.tools_by_name)}]."))
+                continue
+            timeout = self.timeout(call["name"])
+            # Deadlines count from the dispatch, the calls all run at the same time
+            remaining = None if timeout is None else max(0.0, started_at + timeout - time.monotonic())
+            try:
+                outputs.append(self._result(call, futures[i].result(timeout=remaining)))
+            except FutureTimeoutError:
+                outputs.append(self._result(call, timed_out=True))
+            except Exception as error:
+                outputs.append(self._result(call, error=error))
+        return outputs if isinstance(input, list) else {"messages": outputs}
+
+    async def _arun_call(self, call: ToolCall, config: RunnableConfig) -> ToolMessage:
+        if call["name"] not in self.tools_by_name:
+            return self._error_message(call, f"Error: {call['name']} is not a valid tool, "
+                                             f"try one of [{', '.join(self.tools_by_name)}].")
+        tool = self.tools_by_name[call["name"]]
+        tool_input = {**call, "type": "tool_call"}
+        if getattr(tool, "coroutine", None) is not None or not hasattr(tool, "func"):
+            pending = tool.ainvoke(tool_input, config)
+        else:
+            # Sync tools go to the node's bounded pool rather than the loop's default executor
+            context = contextvars.copy_context()
+            pending = asyncio.get_running_loop().run_in_executor(
+                self._executor, functools.partial(context.run, tool.invoke, tool_input, config)
+            )
+        try:
+            return self._result(call, await asyncio.wait_for(pending, self.timeout(call["name"])))
+        except asyncio.TimeoutError:
+            return self._result(call, timed_out=True)
+        except Exception as error:
+            return self._result(call, error=error)
+
+    async def _afunc(self, input: Any, config: RunnableConfig, *, store: Any = None, **kwargs: Any) -> Any:
+        tool_calls = self._tool_calls(input, store)
+        outputs = await asyncio.gather(*(self._arun_call(call, config) for call in tool_calls))
+        return outputs if isinstance(input, list) else {"messages": list(outputs)}
+
+
+class ReactAgentState(MessagesState):
+    # True on the last step the recursion limit allows, set by LangGraph
+    is_last_step: IsLastStep
+
+
+def create_concurrent_react_agent(model: BaseChatModel, tools: Sequence[Union[BaseTool, Any]],
+                                  checkpointer: Optional[BaseCheckpointSaver] = None,
+                                  **node_kwargs: Any) -> CompiledGraph:
+    """
+    The graph of `create_react_agent(model, tools, checkpointer=...)`, with a `ConcurrentToolNode` as "tools".
+
+    `node_kwargs` (`max_workers`, `timeouts`, `default_timeout`...) go to the
+    node. The model node is named "agent", as in `create_react_agent`, and like
+    there a model still calling tools on the last step the recursion limit
+    allows gets a final "need more steps" answer instead of the run failing.
+    """
+    tool_node = ConcurrentToolNode(tools, **node_kwargs)
+    bound_model = model.bind_tools(list(tool_node.tools_by_name.values()))
+
+    def answer(state: ReactAgentState, config: RunnableConfig, response: AIMessage) -> Dict[str, Any]:
+        # `is_last_step` only catches the model on the last step the limit allows; one step before it, the
+        # tools would still run but the model could not answer their results
+        step = config.get("metadata", {}).get("langgraph_step")
+        out_of_steps = step is not None and step + 2 >= config.get("recursion_limit", 25)
+        if response.tool_calls and (state["is_last_step"] or out_of_steps):
+            response = AIMessage(id=response.id, content="Sorry, need more steps to process this request.")
+        return {"messages": [response]}
+
+    def call_model(state: ReactAgentState, config: RunnableConfig) -> Dict[str, Any]:
+        return answer(state, config, bound_model.invoke(state["messages"], config))
+
+    async def acall_model(state: ReactAgentState, config: RunnableConfig) -> Dict[str, Any]:
+        return answer(state, config, await bound_model.ainvoke(state["messages"], config))
+
+    workflow = StateGraph(ReactAgentState)
+    workflow.add_node("agent", RunnableLambda(call_model, afunc=acall_model))
+    workflow.add_node("tools", tool_node)
+    workflow.set_entry_point("agent")
+    # Tool calls go to the tools, whose results go back to the model; an answer without tool calls ends the run
+    workflow.add_conditional_edges("agent", tools_condition, {"tools": "tools", END: END})
+    workflow.add_edge("tools", "agent")
+    return workflow.compile(checkpointer=checkpointer)
@@ -0,0 +1,450 @@
+"""
+Tracing
+
+`Tracer` is a callback handler recording a span for every run of a chain or
+agent (prompt formatting, retrieval, model calls, parsing, tools, and the
+chains around them), so we can see where the latency of a request goes:
+
+- a span has its parent and request (root run), start time, duration, status,
+  and depending on the run: prompt / completion tokens, time to the first
+  token, number of retrieved documents, and input / output sizes in
+  characters of text
+- finished spans go to a fixed size ring buffer, the oldest are dropped once
+  it is full; recording a span is a dict lookup, a few arithmetic operations
+  and an append
+- `export_jsonl(path)` appends the spans not exported yet to a JSONL file,
+  `prometheus_text()` / `serve_prometheus(port)` expose duration histograms,
+  error, token and document counters per run name in the Prometheus text
+  format
+- `flame()` prints the span tree of a request with total and self time, and
+  `folded()` gives it as collapsed stacks for flame graph tools
+
+Pass it in the config of any runnable: `chain.invoke(inputs, {"callbacks": [tracer]})`.
+"""
+
+import bisect
+import itertools
+import json
+import threading
+import time
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+from uuid import UUID
+
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.documents import Document
+from langchain_core.messages import BaseMessage
+from langchain_core.outputs import ChatGeneration, LLMResult
+
+DURATION_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+def payload_size(value: Any, depth: int = 0) -> int:
+    """
+    Characters of text in a run's inputs or outputs: strings, message contents and document contents.
+    """
+    if isinstance(value, str):
+        return len(value)
+    if isinstance(value, BaseMessage):
+        return payload_size(value.content, depth)
+    if isinstance(value, Document):
+        return len(value.page_content)
+    # Deeply nested payloads are rare, stop early rather than walk them
+    if depth > 4:
+        return 0
+    if isinstance(value, dict):
+        return sum(payload_size(item, depth + 1) for item in value.values())
+    if isinstance(value, (list, tuple)):
+        return sum(payload_size(item, depth + 1) for item in value)
+    return 0
+
+
+class Span():
+    """
+    One run: timings in seconds, `attributes` such as tokens or documents depending on the kind of run.
+    """
+
+    __slots__ = ("seq", "span_id", "parent_id", "trace_id", "name", "kind", "start", "duration",
+                 "status", "error", "attributes", "_started_at")
+
+    def __init__(self, span_id: str, parent_id: Optional[str], trace_id: str, name: str, kind: str) -> None:
+        self.seq = 0
+        self.span_id = span_id
+        self.parent_id = parent_id
+        self.trace_id = trace_id
+        self.name = name
+        self.kind = kind
+        self.start = time.time()
+        self.duration = 0.0
+        self.status = "ok"
+        self.error: Optional[str] = None
+        self.attributes: Dict[str, Any] = {}
+        self._started_at = time.perf_counter()
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "trace_id": self.trace_id,
+            "name": self.name,
+            "kind": self.kind,
+            "start": self.start,
+            "duration": self.duration,
+            "status": self.status,
+            "error": self.error,
+            "attributes": self.attributes,
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "Span":
+        span = cls(data["span_id"], data["parent_id"], data["trace_id"], data["name"], data["kind"])
+        span.start = data["start"]
+        span.duration = data["duration"]
+        span.status = data["status"]
+        span.error = data.get("error")
+        span.attributes = data.get("attributes", {})
+        return span
+
+
+def load_spans(path: str) -> List[Span]:
+    """
+    Read back the spans exported by `Tracer.export_jsonl`, e.g. to print the `format_flame` of an old request.
+    """
+    with open(path, "r", encoding="utf-8") as f:
+        return [Span.from_dict(json.loads(line)) for line in f if line.strip()]
+
+
+def _children(spans: Iterable[Span]) -> Tuple[List[Span], Dict[str, List[Span]]]:
+    ids = {span.span_id for span in spans}
+    roots, children = [], {}
+    for span in sorted(spans, key=lambda span: span.start):
+        if span.parent_id in ids:
+            children.setdefault(span.parent_id, []).append(span)
+        else:
+            roots.append(span)
+    return roots, children
+
+
+def _self_time(span: Span, children: Dict[str, List[Span]]) -> float:
+    # Children running in parallel can add up to more than their parent, self time never goes below zero
+    return max(0.0, span.duration - sum(child.duration for child in children.get(span.span_id, [])))
+
+
+def format_flame(spans: List[Span], width: int = 30) -> str:
+    """
+    Indented span tree of one request with total time, self time and a bar relative to the request.
+    """
+    roots, children = _children(spans)
+    if not roots:
+        return ""
+    total = max(span.duration for span in roots) or 1e-9
+    lines = []
+
+    def visit(span: Span, depth: int) -> None:
+        label = ("  " * depth + span.name)[:48]
+        details = []
+        for key in ("prompt_tokens", "completion_tokens", "documents"):
+            if key in span.attributes:
+                details.append(f"{key}={span.attributes[key]}")
+        if "first_token_s" in span.attributes:
+            details.append(f"first_token={span.attributes['first_token_s'] * 1000:.0f}ms")
+        if span.status == "error":
+            details.append("error")
+        bar = "█" * max(1, round(width * span.duration / total))
+        lines.append(f"{label:<48} {span.duration * 1000:9.1f}ms  self {_self_time(span, children) * 1000:8.1f}ms  "
+                     f"{bar:<{width}} {' '.join(details)}".rstrip())
+        for child in children.get(span.span_id, []):
+            visit(child, depth + 1)
+
+    for root in roots:
+        visit(root, 0)
+    return "\n".join(lines)
+
+
+def format_folded(spans: List[Span]) -> str:
+    """
+    Collapsed stacks, `root;child;grandchild <self microseconds>` per line, for flamegraph.pl or speedscope.
+    """
+    roots, children = _children(spans)
+    lines = []
+
+    def visit(span: Span, stack: str) -> None:
+        stack = f"{stack};{span.name}" if stack else span.name
+        lines.append(f"{stack} {round(_self_time(span, children) * 1e6)}")
+        for child in children.get(span.span_id, []):
+            visit(child, stack)
+
+    for root in roots:
+        visit(root, "")
+    return "\n".join(lines)
+
+
+class _Metrics():
+    def __init__(self) -> None:
+        self.count = 0
+        self.errors = 0
+        self.seconds = 0.0
+        self.buckets = [0] * (len(DURATION_BUCKETS) + 1)
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+        self.documents = 0
+
+    def record(self, span: Span) -> None:
+        self.count += 1
+        self.seconds += span.duration
+        self.buckets[bisect.bisect_left(DURATION_BUCKETS, span.duration)] += 1
+        if span.status == "error":
+            self.errors += 1
+        self.prompt_tokens += span.attributes.get("prompt_tokens", 0)
+        self.completion_tokens += span.attributes.get("completion_tokens", 0)
+        self.documents += span.attributes.get("documents", 0)
+
+
+class Tracer(BaseCallbackHandler):
+    """
+    Callback handler recording the spans of every run into a ring buffer of `capacity` spans.
+
+    With `measure_payloads=False` the input and output sizes are not computed, for the lowest overhead.
+    """
+
+    # Called on the event loop directly, so the timings are not skewed by an executor hop
+    run_inline = True
+
+    def __init__(self, capacity: int = 10_000, measure_payloads: bool = True) -> None:
+        self.capacity = capacity
+        self.measure_payloads = measure_payloads
+        self.spans: "deque[Span]" = deque(maxlen=capacity)
+        self.recorded = 0
+        self._open: Dict[UUID, Span] = {}
+        self._seq = itertools.count(1)
+        self._exported_seq = 0
+        self._metrics: Dict[Tuple[str, str], _Metrics] = {}
+        self._lock = threading.Lock()
+        self._last_trace_id: Optional[str] = None
+
+    @property
+    def dropped(self) -> int:
+        return self.recorded - len(self.spans)
+
+    # Recording
+
+    def _start(self, kind: str, serialized: Optional[Dict[str, Any]], run_id: UUID, parent_run_id: Optional[UUID],
+               kwargs: Dict[str, Any], inputs: Any = None) -> None:
+        serialized = serialized or {}
+        name = kwargs.get("name") or serialized.get("name") or (serialized.get("id") or [kind])[-1]
+        parent = self._open.get(parent_run_id) if parent_run_id is not None else None
+        if parent is not None:
+            trace_id = parent.trace_id
+        else:
+            trace_id = str(parent_run_id or run_id)
+        span = Span(str(run_id), str(parent_run_id) if parent_run_id else None, trace_id, name, kind)
+        if self.measure_payloads and inputs is not None:
+            span.attributes["input_size"] = payload_size(inputs)
+        self._open[run_id] = span
+
+    def _end(self, run_id: UUID, outputs: Any = None, error: Optional[BaseException] = None) -> Optional[Span]:
+        span = self._open.pop(run_id, None)
+        if span is None:
+            return None
+        span.duration = time.perf_counter() - span._started_at
+        if error is not None:
+            span.status = "error"
+            span.error = repr(error)
+        if self.measure_payloads and outputs is not None:
+            span.attributes["output_size"] = payload_size(outputs)
+        return span
+
+    def _finish(self, span: Optional[Span]) -> None:
+        if span is None:
+            return
+        with self._lock:
+            # seq and buffer order must agree for export_jsonl's cursor
+            span.seq = next(self._seq)
+            self.spans.append(span)
+            self.recorded += 1
+            key = (span.kind, span.name)
+            if key not in self._metrics:
+                self._metrics[key] = _Metrics()
+            self._metrics[key].record(span)
+            if span.parent_id is None:
+                self._last_trace_id = span.trace_id
+
+    def on_chain_start(self, serialized, inputs, *, run_id, parent_run_id=None, **kwargs):
+        # Prompts and output parsers report as chains, with their own run type
+        self._start(kwargs.get("run_type") or "chain", serialized, run_id, parent_run_id, kwargs, inputs)
+
+    def on_chain_end(self, outputs, *, run_id, **kwargs):
+        self._finish(self._end(run_id, outputs))
+
+    def on_chain_error(self, error, *, run_id, **kwargs):
+        self._finish(self._end(run_id, error=error))
+
+    def on_chat_model_start(self, serialized, messages, *, run_id, parent_run_id=None, **kwargs):
+        self._start("llm", serialized, run_id, parent_run_id, kwargs, messages)
+
+    def on_llm_start(self, serialized, prompts, *, run_id, parent_run_id=None, **kwargs):
+        self._start("llm", serialized, run_id, parent_run_id, kwargs, prompts)
+
+    def on_llm_new_token(self, token, *, run_id, **kwargs):
+        span = self._open.get(run_id)
+        if span is not None and "first_token_s" not in span.attributes:
+            span.attributes["first_token_s"] = time.perf_counter() - span._started_at
+
+    def on_llm_end(self, response: LLMResult, *, run_id, **kwargs):
+        generations = [generation for batch in response.generations for generation in batch]
+        span = self._end(run_id, [generation.text for generation in generations])
+        if span is None:
+            return
+        usage = (response.llm_output or {}).get("token_usage") or {}
+        prompt_tokens = usage.get("prompt_tokens", 0)
+        completion_tokens = usage.get("completion_tokens", 0)
+        if not usage:
+            for generation in generations:
+                metadata = getattr(generation.message, "usage_metadata", None) \
+                    if isinstance(generation, ChatGeneration) else None
+                if metadata:
+                    prompt_tokens += metadata.get("input_tokens", 0)
+                    completion_tokens += metadata.get("output_tokens", 0)
+        if prompt_tokens or completion_tokens:
+            span.attributes["prompt_tokens"] = prompt_tokens
+            span.attributes["completion_tokens"] = completion_tokens
+        self._finish(span)
+
+    def on_llm_error(self, error, *, run_id, **kwargs):
+        self._finish(self._end(run_id, error=error))
+
+    def on_retriever_start(self, serialized, query, *, run_id, parent_run_id=None, **kwargs):
+        self._start("retriever", serialized, run_id, parent_run_id, kwargs, query)
+
+    def on_retriever_end(self, documents, *, run_id, **kwargs):
+        span = self._end(run_id, documents)
+        if span is not None:
+            span.attributes["documents"] = len(documents)
+        self._finish(span)
+
+    def on_retriever_error(self, error, *, run_id, **kwargs):
+        self._finish(self._end(run_id, error=error))
+
+    def on_tool_start(self, serialized, input_str, *, run_id, parent_run_id=None, **kwargs):
+        self._start("tool", serialized, run_id, parent_run_id, kwargs, input_str)
+
+    def on_tool_end(self, output, *, run_id, **kwargs):
+        self._finish(self._end(run_id, output))
+
+    def on_tool_error(self, error, *, run_id, **kwargs):
+        self._finish(self._end(run_id, error=error))
+
+    # Reading
+
+    def trace(self, trace_id: Optional[str] = None) -> List[Span]:
+        """
+        The buffered spans of one request, by default the last one that finished.
+        """
+        trace_id = trace_id or self._last_trace_id
+        return [span for span in list(self.spans) if span.trace_id == trace_id]
+
+    def flame(self, trace_id: Optional[str] = None, width: int = 30) -> str:
+        return format_flame(self.trace(trace_id), width=width)
+
+    def folded(self, trace_id: Optional[str] = None) -> str:
+        return format_folded(self.trace(trace_id))
+
+    def stats(self) -> Dict[str, Dict[str, Any]]:
+        with self._lock:
+            return {
+                f"{kind}:{name}": {
+                    "count": metrics.count,
+                    "errors": metrics.errors,
+                    "mean_ms": metrics.seconds / metrics.count * 1000 if metrics.count else 0.0,
+                    "total_s": metrics.seconds,
+                }
+                for (kind, name), metrics in self._metrics.items()
+            }
+
+    # Exporting
+
+    def export_jsonl(self, path: str) -> int:
+        """
+        Append the buffered spans not exported yet to `path`, one JSON object per line. Returns how many.
+        """
+        with self._lock:
+            spans = [span for span in self.spans if span.seq > self._exported_seq]
+            if not spans:
+                return 0
+            self._exported_seq = spans[-1].seq
+        with open(path, "a", encoding="utf-8") as f:
+            for span in spans:
+                f.write(json.dumps(span.as_dict(), default=str) + "\n")
+        return len(spans)
+
+    def prometheus_text(self) -> str:
+        """
+        Metrics per run kind and name in the Prometheus text exposition format.
+        """
+        def labels(kind: str, name: str, **extra: str) -> str:
+            pairs = {"kind": kind, "name": name, **extra}
+            escaped = {key: str(value).replace("\\", "\\\\").replace('"', '\\"') for key, value in pairs.items()}
+            return ",".join(f'{key}="{value}"' for key, value in escaped.items())
+
+        with self._lock:
+            items = sorted(self._metrics.items())
+            lines = [
+                "# HELP langchain_span_duration_seconds Duration of chain, model, retriever and tool runs.",
+                "# TYPE langchain_span_duration_seconds histogram",
+            ]
+            for (kind, name), metrics in items:
+                cumulative = 0
+                for bound, count in zip(DURATION_BUCKETS, metrics.buckets):
+                    cumulative += count
+                    lines.append(f"langchain_span_duration_seconds_bucket{{{labels(kind, name, le=str(bound))}}} "
+                                 f"{cumulative}")
+                lines.append(f"langchain_span_duration_seconds_bucket{{{labels(kind, name, le='+Inf')}}} "
+                             f"{metrics.count}")
+                lines.append(f"langchain_span_duration_seconds_sum{{{labels(kind, name)}}} {metrics.seconds}")
+                lines.append(f"langchain_span_duration_seconds_count{{{labels(kind, name)}}} {metrics.count}")
+            lines += ["# HELP langchain_span_errors_total Runs that raised.",
+                      "# TYPE langchain_span_errors_total counter"]
+            lines += [f"langchain_span_errors_total{{{labels(kind, name)}}} {metrics.errors}"
+                      for (kind, name), metrics in items]
+            lines += ["# HELP langchain_tokens_total Model tokens, by direction.",
+                      "# TYPE langchain_tokens_total counter"]
+            for (kind, name), metrics in items:
+                if kind == "llm":
+                    lines.append(f"langchain_tokens_total{{{labels(kind, name, direction='prompt')}}} "
+                                 f"{metrics.prompt_tokens}")
+                    lines.append(f"langchain_tokens_total{{{labels(kind, name, direction='completion')}}} "
+                                 f"{metrics.completion_tokens}")
+            lines += ["# HELP langchain_retrieved_documents_total Documents returned by retrievers.",
+                      "# TYPE langchain_retrieved_documents_total counter"]
+            lines += [f"langchain_retrieved_documents_total{{{labels(kind, name)}}} {metrics.documents}"
+                      for (kind, name), metrics in items if kind == "retriever"]
+            lines += ["# HELP langchain_spans_dropped_total Spans dropped from the full ring buffer.",
+                      "# TYPE langchain_spans_dropped_total counter",
+                      f"langchain_spans_dropped_total {self.recorded - len(self.spans)}"]
+        return "\n".join(lines) + "\n"
+
+    def serve_prometheus(self, port: int = 9464, host: str = "127.0.0.1") -> ThreadingHTTPServer:
+        """
+        Serve `prometheus_text()` at `http://host:port/metrics` from a daemon thread. Call `shutdown()` to stop.
+        """
+        tracer = self
+
+        class MetricsHandler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split("?")[0] != "/metrics":
+                    self.send_error(404)
+                    return
+                body = tracer.prometheus_text().encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        server = ThreadingHTTPServer((host, port), MetricsHandler)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        return server
@@ -0,0 +1,447 @@
+"""
+NumPy Vector Store
+
+For small corpora like the Sangkuriang story, going through the Chroma client
+and SQLite on every query costs more than the search itself. `NumpyVectorStore`
+keeps all embeddings in one contiguous float32 matrix with precomputed norms
+and answers top-k with a single matrix-vector product and `argpartition`.
+
+It implements LangChain's `VectorStore`, so `db.as_retriever(search_type=...)`
+works unchanged with "similarity", "similarity_score_threshold" and "mmr".
+Scores are cosine based: `similarity_search_with_score` returns cosine
+distances, relevance scores are cosine similarities. That is not what our
+Chroma collections use: they are created in Chroma's default L2 space, whose
+scores are squared Euclidean distances, so a `score_threshold` tuned on a
+Chroma store has to be tuned again for a copy made with `from_chroma`.
+
+`IVFVectorStore` is the approximate variant for corpora where a flat scan
+becomes the latency floor (millions of chunks). It clusters the rows into
+inverted lists with k-means and only scans the `n_probe` lists nearest to the
+query. Its index is saved next to the matrix and memory-mapped on load.
+"""
+
+import json
+import os
+import uuid
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+from langchain_core.vectorstores import VectorStore
+
+from app.utils.mmr import maximal_marginal_relevance
+
+EMBEDDINGS_FILE = "embeddings.npy"
+NORMS_FILE = "norms.npy"
+DOCSTORE_FILE = "docstore.json"
+IVF_CENTROIDS_FILE = "ivf_centroids.npy"
+IVF_ASSIGNMENTS_FILE = "ivf_assignments.npy"
+IVF_LIST_OFFSETS_FILE = "ivf_list_offsets.npy"
+IVF_LIST_ROWS_FILE = "ivf_list_rows.npy"
+
+
+class NumpyVectorStore(VectorStore):
+    """
+    Exact in-process vector store backed by a float32 matrix.
+    """
+
+    def __init__(self, embedding: Embeddings) -> None:
+        self.embedding = embedding
+        self._matrix = np.zeros((0, 0), dtype=np.float32)
+        self._norms = np.zeros(0, dtype=np.float32)
+        self._size = 0
+        self._ids: List[str] = []
+        self._texts: List[str] = []
+        self._metadatas: List[dict] = []
+        self._positions: Dict[str, int] = {}
+
+    @property
+    def embeddings(self) -> Embeddings:
+        return self.embedding
+
+    def __len__(self) -> int:
+        return self._size
+
+    def _reserve(self, n_rows: int, dim: int) -> None:
+        """
+        Grow the matrix geometrically so appends stay amortized O(1); also copies a memory-mapped matrix into RAM.
+        """
+        capacity = self._matrix.shape[0]
+        if self._size + n_rows <= capacity and self._matrix.shape[1] == dim and not isinstance(self._matrix, np.memmap):
+            return
+        new_capacity = max(self._size + n_rows, 2 * capacity, 16)
+        matrix = np.zeros((new_capacity, dim), dtype=np.float32)
+        norms = np.zeros(new_capacity, dtype=np.float32)
+        if self._size:
+            matrix[:self._size] = self._matrix[:self._size]
+            norms[:self._size] = self._norms[:self._size]
+        self._matrix, self._norms = matrix, norms
+
+    def add_embeddings(self, texts: List[str], vectors: Sequence[Sequence[float]],
+                       metadatas: Optional[List[dict]] = None, ids: Optional[List[str]] = None) -> List[str]:
+        """
+        Add precomputed embeddings, replacing rows whose id already exists.
+        """
+        if not texts:
+            return []
+        vectors = np.asarray(vectors, dtype=np.float32)
+        metadatas = metadatas or [{} for _ in texts]
+        ids = ids or [str(uuid.uuid4()) for _ in texts]
+
+        existing = [doc_id for doc_id in ids if doc_id in self._positions]
+        if existing:
+            self.delete(existing)
+
+        self._reserve(len(texts), vectors.shape[1])
+        start, end = self._size, self._size + len(texts)
+        self._matrix[start:end] = vectors
+        self._norms[start:end] = np.linalg.norm(vectors, axis=1)
+        for position, doc_id in enumerate(ids, start=start):
+            self._positions[doc_id] = position
+        self._ids.extend(ids)
+        self._texts.extend(texts)
+        self._metadatas.extend(metadatas)
+        self._size = end
+        return ids
+
+    def add_texts(self, texts: Iterable[str], metadatas: Optional[List[dict]] = None,
+                  ids: Optional[List[str]] = None, **kwargs: Any) -> List[str]:
+        texts = list(texts)
+        return self.add_embeddings(texts, self.embedding.embed_documents(texts), metadatas, ids)
+
+    def delete(self, ids: Optional[List[str]] = None, **kwargs: Any) -> Optional[bool]:
+        if not ids:
+            return False
+        drop = {self._positions[doc_id] for doc_id in ids if doc_id in self._positions}
+        if not drop:
+            return False
+        keep = np.array([i for i in range(self._size) if i not in drop], dtype=np.int64)
+        self._matrix = np.ascontiguousarray(self._matrix[keep])
+        self._norms = np.ascontiguousarray(self._norms[keep])
+        self._ids = [self._ids[i] for i in keep]
+        self._texts = [self._texts[i] for i in keep]
+        self._metadatas = [self._metadatas[i] for i in keep]
+        self._positions = {doc_id: position for position, doc_id in enumerate(self._ids)}
+        self._size = len(keep)
+        return True
+
+    def get_by_ids(self, ids: Sequence[str], /) -> List[Document]:
+        return [self._document(self._positions[doc_id]) for doc_id in ids if doc_id in self._positions]
+
+    def _document(self, position: int) -> Document:
+        return Document(page_content=self._texts[position], metadata=dict(self._metadatas[position]))
+
+    def _filter_mask(self, filter: Optional[Dict[str, Any]]) -> Optional[np.ndarray]:
+        if not filter:
+            return None
+        return np.fromiter(
+            (all(metadata.get(key) == value for key, value in filter.items()) for metadata in self._metadatas),
+            dtype=bool,
+            count=self._size,
+        )
+
+    def _scores(self, query: np.ndarray, filter: Optional[Dict[str, Any]] = None) -> np.ndarray:
+        """
+        Cosine similarity of `query` to every row, -inf for rows excluded by `filter`.
+        """
+        query_norm = float(np.linalg.norm(query)) or 1.0
+        norms = self._norms[:self._size]
+        scores = (self._matrix[:self._size] @ query) / (np.where(norms > 0, norms, 1.0) * query_norm)
+        mask = self._filter_mask(filter)
+        if mask is not None:
+            scores[~mask] = -np.inf
+        return scores
+
+    def _top_k(self, scores: np.ndarray, k: int) -> np.ndarray:
+        k = min(k, int(np.isfinite(scores).sum()))
+        if k <= 0:
+            return np.zeros(0, dtype=np.int64)
+        if k < len(scores):
+            candidates = np.argpartition(-scores, k - 1)[:k]
+        else:
+            candidates = np.arange(len(scores))
+        return candidates[np.argsort(-scores[candidates], kind="stable")]
+
+    def _search(self, query: np.ndarray, k: int,
+                filter: Optional[Dict[str, Any]] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Return the rows of the `k` nearest documents and their cosine similarities, best first.
+        """
+        scores = self._scores(query, filter)
+        rows = self._top_k(scores, k)
+        return rows, scores[rows]
+
+    def similarity_search_with_score_by_vector(self, embedding: List[float], k: int = 4,
+                                               filter: Optional[Dict[str, Any]] = None,
+                                               **kwargs: Any) -> List[Tuple[Document, float]]:
+        if self._size == 0:
+            return []
+        rows, scores = self._search(np.asarray(embedding, dtype=np.float32), k, filter)
+        return [(self._document(int(row)), 1.0 - float(score)) for row, score in zip(rows, scores)]
+
+    def similarity_search_with_score(self, query: str, k: int = 4,
+                                     **kwargs: Any) -> List[Tuple[Document, float]]:
+        return self.similarity_search_with_score_by_vector(self.embedding.embed_query(query), k, **kwargs)
+
+    def similarity_search_by_vector(self, embedding: List[float], k: int = 4, **kwargs: Any) -> List[Document]:
+        return [doc for doc, _ in self.similarity_search_with_score_by_vector(embedding, k, **kwargs)]
+
+    def similarity_search(self, query: str, k: int = 4, **kwargs: Any) -> List[Document]:
+        return self.similarity_search_by_vector(self.embedding.embed_query(query), k, **kwargs)
+
+    def _select_relevance_score_fn(self) -> Callable[[float], float]:
+        return self._cosine_relevance_score_fn
+
+    def candidates_by_vector(self, embedding: List[float], fetch_k: int,
+                             filter: Optional[Dict[str, Any]] = None) -> Tuple[List[Document], np.ndarray]:
+        """
+        Return the `fetch_k` nearest documents together with their embedding rows.
+        """
+        if self._size == 0:
+            return [], np.zeros((0, 0), dtype=np.float32)
+        candidates, _ = self._search(np.asarray(embedding, dtype=np.float32), fetch_k, filter)
+        return [self._document(int(i)) for i in candidates], self._matrix[candidates]
+
+    def max_marginal_relevance_search_by_vector(self, embedding: List[float], k: int = 4, fetch_k: int = 20,
+                                                lambda_mult: float = 0.5,
+                                                filter: Optional[Dict[str, Any]] = None,
+                                                **kwargs: Any) -> List[Document]:
+        docs, vectors = self.candidates_by_vector(embedding, fetch_k, filter)
+        selected = maximal_marginal_relevance(embedding, vectors, lambda_mult=lambda_mult, k=k)
+        return [docs[i] for i in selected]
+
+    def max_marginal_relevance_search(self, query: str, k: int = 4, fetch_k: int = 20,
+                                      lambda_mult: float = 0.5, **kwargs: Any) -> List[Document]:
+        return self.max_marginal_relevance_search_by_vector(
+            self.embedding.embed_query(query), k, fetch_k, lambda_mult, **kwargs
+        )
+
+    def save(self, directory: str) -> None:
+        """
+        Write the matrix to `embeddings.npy`, its row norms to `norms.npy` and the documents to `docstore.json`.
+        """
+        os.makedirs(directory, exist_ok=True)
+        np.save(os.path.join(directory, EMBEDDINGS_FILE), self._matrix[:self._size])
+        np.save(os.path.join(directory, NORMS_FILE), self._norms[:self._size])
+        with open(os.path.join(directory, DOCSTORE_FILE), "w", encoding="utf-8") as f:
+            json.dump({"ids": self._ids, "texts": self._texts, "metadatas": self._metadatas}, f)
+
+    @classmethod
+    def load(cls, directory: str, embedding: Embeddings, mmap: bool = True, **kwargs: Any) -> "NumpyVectorStore":
+        """
+        Load a store written by `save`.
+
+        With `mmap` the matrix and its norms are memory-mapped read-only until
+        the store is modified, so loading reads no rows; they are paged in as
+        queries touch them.
+        """
+        store = cls(embedding, **kwargs)
+        mmap_mode = "r" if mmap else None
+        matrix = np.load(os.path.join(directory, EMBEDDINGS_FILE), mmap_mode=mmap_mode)
+        with open(os.path.join(directory, DOCSTORE_FILE), "r", encoding="utf-8") as f:
+            docstore = json.load(f)
+        store._matrix = matrix
+        norms_path = os.path.join(directory, NORMS_FILE)
+        if os.path.exists(norms_path):
+            store._norms = np.load(norms_path, mmap_mode=mmap_mode)
+        else:
+            # Saved before the norms were, computing them reads the whole matrix once
+            store._norms = np.linalg.norm(matrix, axis=1).astype(np.float32) if len(matrix) else np.zeros(0, np.float32)
+        store._size = len(matrix)
+        store._ids = docstore["ids"]
+        store._texts = docstore["texts"]
+        store._metadatas = docstore["metadatas"]
+        store._positions = {doc_id: position for position, doc_id in enumerate(store._ids)}
+        return store
+
+    @classmethod
+    def from_texts(cls, texts: List[str], embedding: Embeddings, metadatas: Optional[List[dict]] = None,
+                   ids: Optional[List[str]] = None, **kwargs: Any) -> "NumpyVectorStore":
+        store = cls(embedding)
+        store.add_texts(texts, metadatas=metadatas, ids=ids)
+        return store
+
+    @classmethod
+    def from_chroma(cls, db: Any, **kwargs: Any) -> "NumpyVectorStore":
+        """
+        Copy the ids, documents and stored embeddings of a Chroma store, without embedding anything again.
+
+        The copy scores by cosine, not by the L2 distance of a default Chroma collection.
+        """
+        store = cls(db.embeddings, **kwargs)
+        data = db.get(include=["embeddings", "documents", "metadatas"])
+        if len(data["ids"]):
+            store.add_embeddings(
+                data["documents"],
+                data["embeddings"],
+                [metadata or {} for metadata in data["metadatas"]],
+                data["ids"],
+            )
+        return store
+
+
+def _normalize_rows(matrix: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    return matrix / np.where(norms > 0, norms, 1.0)
+
+
+class IVFVectorStore(NumpyVectorStore):
+    """
+    Approximate vector store with an inverted file (IVF) index over `NumpyVectorStore`.
+
+    `n_lists` defaults to 4 * sqrt(n) at training time. With `auto_train` the
+    index is trained when rows are first added and trained again each time
+    the store has doubled since, so queries never pay for it; in between,
+    added rows are assigned to their nearest list. Without it, call `train`
+    once the rows are in: until then queries are exact. Raising `n_probe`
+    trades latency for recall, `n_probe >= n_lists` is exact search. A
+    metadata `filter` is applied to the probed rows only, so it can return
+    fewer than `k` documents.
+    """
+
+    def __init__(self, embedding: Embeddings, n_lists: Optional[int] = None, n_probe: int = 8,
+                 train_iterations: int = 10, max_train_size: int = 50_000, seed: int = 0,
+                 auto_train: bool = True) -> None:
+        if n_probe < 1:
+            raise ValueError(f"n_probe must be at least 1, got {n_probe}")
+        if n_lists is not None and n_lists < 1:
+            raise ValueError(f"n_lists must be at least 1, got {n_lists}")
+        super().__init__(embedding)
+        self.n_lists = n_lists
+        self.n_probe = n_probe
+        self.train_iterations = train_iterations
+        self.max_train_size = max_train_size
+        self.seed = seed
+        self.auto_train = auto_train
+        self._fixed_n_lists = n_lists
+        self._trained_size = 0
+        self._centroids: Optional[np.ndarray] = None
+        self._assignments = np.zeros(0, dtype=np.int32)
+        # Inverted lists in CSR form: the rows of list i are _list_rows[_list_offsets[i]:_list_offsets[i + 1]]
+        self._list_offsets = np.zeros(1, dtype=np.int64)
+        self._list_rows = np.zeros(0, dtype=np.int64)
+        self._lists_dirty = False
+
+    def _assign(self, vectors: np.ndarray, block_size: int = 8192) -> np.ndarray:
+        """
+        Return the nearest centroid of every vector, in blocks to bound the score matrix.
+        """
+        assignments = np.empty(len(vectors), dtype=np.int32)
+        for start in range(0, len(vectors), block_size):
+            assignments[start:start + block_size] = np.argmax(vectors[start:start + block_size] @ self._centroids.T, axis=1)
+        return assignments
+
+    def _rebuild_lists(self) -> None:
+        self._list_rows = np.argsort(self._assignments, kind="stable")
+        self._list_offsets = np.zeros(len(self._centroids) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(self._assignments, minlength=len(self._centroids)), out=self._list_offsets[1:])
+        self._lists_dirty = False
+
+    def train(self, n_lists: Optional[int] = None) -> None:
+        """
+        Cluster the rows with spherical k-means on a sample and rebuild the inverted lists.
+        """
+        if self._size == 0:
+            return
+        rng = np.random.default_rng(self.seed)
+        n_lists = n_lists or self._fixed_n_lists or int(round(4 * np.sqrt(self._size)))
+        n_lists = max(1, min(n_lists, self._size))
+        sample_rows = np.sort(rng.choice(self._size, size=min(self._size, self.max_train_size), replace=False))
+        sample = _normalize_rows(self._matrix[sample_rows])
+        centroids = sample[rng.choice(len(sample), size=n_lists, replace=False)]
+
+        for _ in range(self.train_iterations):
+            self._centroids = centroids
+            labels = self._assign(sample)
+            order = np.argsort(labels, kind="stable")
+            counts = np.bincount(labels, minlength=n_lists)
+            non_empty = counts > 0
+            starts = np.concatenate(([0], np.cumsum(counts)[:-1]))[non_empty]
+            sums = np.zeros_like(centroids)
+            sums[non_empty] = np.add.reduceat(sample[order], starts, axis=0)
+            # Reseed empty lists with random sample rows
+            sums[~non_empty] = sample[rng.choice(len(sample), size=int((~non_empty).sum()))]
+            centroids = _normalize_rows(sums).astype(np.float32)
+
+        self._centroids = centroids
+        self.n_lists = n_lists
+        self._trained_size = self._size
+        self._assignments = self._assign(self._matrix[:self._size])
+        self._rebuild_lists()
+
+    def add_embeddings(self, texts: List[str], vectors: Sequence[Sequence[float]],
+                       metadatas: Optional[List[dict]] = None, ids: Optional[List[str]] = None) -> List[str]:
+        ids = super().add_embeddings(texts, vectors, metadatas, ids)
+        if self.auto_train and ids and (self._centroids is None or self._size >= 2 * self._trained_size):
+            self.train()
+        elif self._centroids is not None and ids:
+            new_rows = self._matrix[self._size - len(ids):self._size]
+            self._assignments = np.concatenate((self._assignments, self._assign(new_rows)))
+            self._lists_dirty = True
+        return ids
+
+    def delete(self, ids: Optional[List[str]] = None, **kwargs: Any) -> Optional[bool]:
+        alive = np.ones(self._size, dtype=bool)
+        alive[[self._positions[doc_id] for doc_id in ids or [] if doc_id in self._positions]] = False
+        deleted = super().delete(ids, **kwargs)
+        if deleted and self._centroids is not None:
+            self._assignments = self._assignments[alive]
+            self._lists_dirty = True
+        return deleted
+
+    def _search(self, query: np.ndarray, k: int,
+                filter: Optional[Dict[str, Any]] = None) -> Tuple[np.ndarray, np.ndarray]:
+        if self._centroids is None or self.n_probe >= len(self._centroids):
+            # Not trained yet (`auto_train` off), or probing every list: exact search
+            return super()._search(query, k, filter)
+        if self._lists_dirty:
+            self._rebuild_lists()
+
+        probe = np.argpartition(-(self._centroids @ query), self.n_probe - 1)[:self.n_probe]
+        rows = np.concatenate([self._list_rows[self._list_offsets[i]:self._list_offsets[i + 1]] for i in probe])
+        if filter:
+            rows = rows[np.fromiter(
+                (all(self._metadatas[row].get(key) == value for key, value in filter.items()) for row in rows),
+                dtype=bool,
+                count=len(rows),
+            )]
+        query_norm = float(np.linalg.norm(query)) or 1.0
+        norms = self._norms[rows]
+        scores = (self._matrix[rows] @ query) / (np.where(norms > 0, norms, 1.0) * query_norm)
+        top = self._top_k(scores, k)
+        return rows[top], scores[top]
+
+    def save(self, directory: str) -> None:
+        """
+        Write the store like `NumpyVectorStore.save`, plus the centroids and inverted lists.
+        """
+        super().save(directory)
+        if self._centroids is None:
+            self.train()
+        if self._centroids is None:
+            return
+        if self._lists_dirty:
+            self._rebuild_lists()
+        np.save(os.path.join(directory, IVF_CENTROIDS_FILE), self._centroids)
+        np.save(os.path.join(directory, IVF_ASSIGNMENTS_FILE), self._assignments)
+        np.save(os.path.join(directory, IVF_LIST_OFFSETS_FILE), self._list_offsets)
+        np.save(os.path.join(directory, IVF_LIST_ROWS_FILE), self._list_rows)
+
+    @classmethod
+    def load(cls, directory: str, embedding: Embeddings, mmap: bool = True, **kwargs: Any) -> "IVFVectorStore":
+        """
+        Load a store written by `save`. With `mmap` a query only pages in the centroids, the inverted lists it
+        probes, and the embeddings and norms of their rows.
+        """
+        store = super().load(directory, embedding, mmap=mmap, **kwargs)
+        centroids_path = os.path.join(directory, IVF_CENTROIDS_FILE)
+        if os.path.exists(centroids_path):
+            mmap_mode = "r" if mmap else None
+            store._centroids = np.load(centroids_path, mmap_mode=mmap_mode)
+            store._assignments = np.load(os.path.join(directory, IVF_ASSIGNMENTS_FILE), mmap_mode=mmap_mode)
+            store._list_offsets = np.load(os.path.join(directory, IVF_LIST_OFFSETS_FILE), mmap_mode=mmap_mode)
+            store._list_rows = np.load(os.path.join(directory, IVF_LIST_ROWS_FILE), mmap_mode=mmap_mode)
+            store.n_lists = len(store._centroids)
+            store._trained_size = store._size
+        return store